@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import os
-import shutil
 import datetime as _dt
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -15,6 +14,8 @@ try:
 except Exception:
     # Alternativa por si lo moviste dentro del paquete
     from app.core.db_manager import DatabaseManager  # type: ignore
+from fabrica_modelos import FabricaModelos, MapaIdentidad, ResumenLicitacion
+from respaldos import TareaRespaldo, preparar_restauracion, respaldar
 
 
 def _to_bool(v: Any) -> bool:
@@ -28,25 +29,23 @@ def _to_bool(v: Any) -> bool:
         return str(v).strip().lower() in ("true", "t", "yes", "y", "1")
 
 
-def _to_float(v: Any, default: float = 0.0) -> float:
-    try:
-        return float(v if v is not None else default)
-    except Exception:
-        return default
+# Carga fila -> modelo compartida con la app Tk (ver fabrica_modelos.py)
+FABRICA_MODELOS = FabricaModelos(Licitacion, Lote, Documento, Oferente, Empresa)
 
 
 class DatabaseAdapter:
     """
     Adaptador usado por la UI PyQt6 que envuelve tu DatabaseManager legado.
-    - Provee métodos esperados por la UI actual (open, close, load_all_licitaciones, load_licitacion_by_id,
+    - Provee métodos esperados por la UI actual (open, close, load_dashboard_rows, load_licitacion_by_id,
       load_licitacion_by_numero, save_licitacion, etc.).
-    - Mapea los dicts devueltos por DatabaseManager.get_all_data() a instancias de tus modelos
-      Licitacion/Lote/Documento/Oferente/Empresa para que el Dashboard pueda calcular %Docs, %Dif., etc.
+    - Carga instancias de tus modelos Licitacion/Lote/Documento/Oferente/Empresa (vía FabricaModelos,
+      la misma carga fila -> modelo de la app Tk) para que el Dashboard pueda calcular %Docs, %Dif., etc.
     """
 
     def __init__(self, db_path: Optional[str] = None) -> None:
         self.db_path: Optional[str] = db_path
         self.mgr: Optional[DatabaseManager] = None
+        self.mapa: Optional[MapaIdentidad] = None
 
     # Compatibilidad con código que lee self.path
     @property
@@ -69,6 +68,7 @@ class DatabaseAdapter:
 
         # Instancia y asegura esquema (DatabaseManager ya lo hace en __init__)
         self.mgr = DatabaseManager(self.db_path)
+        self.mapa = MapaIdentidad(self.mgr, FABRICA_MODELOS)
         # Opcional: timeout para locks
         try:
             self.mgr.set_busy_timeout(8)
@@ -81,6 +81,7 @@ class DatabaseAdapter:
                 self.mgr.close()
             finally:
                 self.mgr = None
+                self.mapa = None
 
     @staticmethod
     def create_new_db(path: str) -> None:
@@ -91,45 +92,75 @@ class DatabaseAdapter:
     # ----------------------------
     # Lectura
     # ----------------------------
+    def load_dashboard_rows(self) -> List[ResumenLicitacion]:
+        """
+        Filas del Dashboard: ResumenLicitacion (cabecera, lotes con ganadores y
+        conteos de documentos calculados en SQL) con la bandera 'ganada'. No
+        hidrata documentos ni oferentes; el detalle se abre con load_licitacion_by_id().
+        """
+        if not self.mgr:
+            raise RuntimeError("DB no abierta.")
+        return [self._marcar_ganada(r) for r in self.mgr.cargar_resumenes(FABRICA_MODELOS)]
+
     def load_all_licitaciones(self) -> List[Licitacion]:
         """
-        Carga TODAS las licitaciones con sus relaciones (similar al Tk).
-        Se apoya en DatabaseManager.get_all_data() y mapea a objetos de modelo.
+        Carga TODAS las licitaciones con sus relaciones (reportes/análisis que
+        necesitan ofertas y documentos; para listas usar load_dashboard_rows()).
+        Pasa por el mapa de identidad: si nada cambió desde la última carga cuesta
+        una sola consulta de sondeo y devuelve los mismos objetos.
+        """
+        if not self.mgr:
+            raise RuntimeError("DB no abierta.")
+        return [self._marcar_ganada(lic) for lic in self.mapa.todas()]
+
+    def poll_changes(self) -> set:
+        """
+        Sondeo barato del registro de cambios (también los hechos desde otra
+        máquina). Devuelve los ids de licitación afectados desde el último
+        sondeo (vacío si no hay que refrescar); load_all_licitaciones() y
+        load_licitacion_by_id() recargarán solo esas.
+        """
+        if not self.mapa:
+            return set()
+        return self.mapa.sincronizar()
+
+    def load_licitaciones_resumen(self) -> List[Dict[str, Any]]:
+        """
+        Resumen liviano (cabecera + conteos/totales calculados en SQL) para listas.
+        No hidrata lotes/documentos/oferentes.
         """
         if not self.mgr:
             raise RuntimeError("DB no abierta.")
-        data = self.mgr.get_all_data()  # [licitaciones], empresas_maestras, instituciones_maestras, ...
-        raw_list = data[0] if data else []
-        return [self._map_licitacion_dict_to_model(d) for d in raw_list]
+        return self.mgr.get_licitaciones_resumen()
 
     def list_licitaciones(self) -> List[Licitacion]:
         """
-        Alias por compatibilidad; devuelve lo mismo que load_all_licitaciones.
+        Lista liviana para selectores: solo cabecera (sin hijos), construida desde
+        DatabaseManager.get_licitaciones_resumen(). Para el objeto completo usar
+        load_licitacion_by_id().
         """
-        return self.load_all_licitaciones()
+        return [self._map_resumen_dict_to_model(r) for r in self.load_licitaciones_resumen()]
 
     def load_licitacion_by_id(self, lic_id: int) -> Optional[Licitacion]:
+        """
+        Una sola licitación completa por id (consultas indexadas, sin cargar toda
+        la BD); reutiliza el objeto del mapa de identidad si no cambió.
+        """
         if not self.mgr:
             raise RuntimeError("DB no abierta.")
-        licitaciones = self.load_all_licitaciones()
-        for lic in licitaciones:
-            if int(getattr(lic, "id", 0) or 0) == int(lic_id):
-                return lic
-        return None
+        lic = self.mapa.obtener(int(lic_id))
+        return self._marcar_ganada(lic) if lic else None
 
     def get_licitacion_by_id(self, lic_id: int):
         """Compatibilidad: alias de load_licitacion_by_id para la UI."""
         return self.load_licitacion_by_id(lic_id)
 
     def load_licitacion_by_numero(self, numero: str) -> Optional[Licitacion]:
+        """Carga una sola licitación completa por numero_proceso (sin distinguir mayúsculas)."""
         if not self.mgr:
             raise RuntimeError("DB no abierta.")
-        num_norm = (numero or "").strip().lower()
-        for lic in self.load_all_licitaciones():
-            n = (getattr(lic, "numero_proceso", "") or "").strip().lower()
-            if n == num_norm:
-                return lic
-        return None
+        lic_id = self.mgr.get_licitacion_id_por_numero(numero)
+        return self.load_licitacion_by_id(lic_id) if lic_id is not None else None
 
     # ----------------------------
     # Escritura
@@ -150,10 +181,35 @@ class DatabaseAdapter:
     # Utilitarios
     # ----------------------------
     def create_backup(self, dst_path: str) -> None:
-        if not self.db_path or not os.path.exists(self.db_path):
-            raise FileNotFoundError(self.db_path or "")
-        os.makedirs(os.path.dirname(dst_path) or ".", exist_ok=True)
-        shutil.copy2(self.db_path, dst_path)
+        """Respaldo consistente con la API de backup de SQLite (bloquea hasta terminar)."""
+        tarea = self.create_backup_async(dst_path, en_segundo_plano=False)
+        if tarea.error is not None:
+            raise tarea.error
+
+    def create_backup_async(self, dst_path: str, on_progress=None, on_done=None,
+                            en_segundo_plano: bool = True) -> TareaRespaldo:
+        """
+        Respaldo en caliente en un hilo aparte, sin cerrar la conexión (ver respaldos.py).
+        on_progress(copiadas, total) y on_done(tarea) llegan desde ese hilo: en Qt,
+        reenviarlos con una señal o sondear la tarea con un QTimer.
+        """
+        if not self.mgr:
+            raise RuntimeError("DB no abierta.")
+        return respaldar(self.mgr, dst_path, al_progresar=on_progress, al_terminar=on_done,
+                         en_segundo_plano=en_segundo_plano)
+
+    def restore_backup(self, src_path: str) -> None:
+        """
+        Restaura un respaldo (.db o manifiesto .json del almacén incremental):
+        copia y valida (quick_check + esquema) y recién entonces reemplaza el
+        archivo y reabre en caliente. Si no pasa la validación, la BD no cambia.
+        """
+        if not self.mgr:
+            raise RuntimeError("DB no abierta.")
+        tarea = preparar_restauracion(self.mgr, src_path, en_segundo_plano=False)
+        if tarea.error is not None:
+            raise tarea.error
+        self.mgr.reemplazar_archivo(tarea.destino)
 
     def search_global(self, term: str) -> List[Dict[str, Any]]:
         if not self.mgr:
@@ -197,128 +253,39 @@ class DatabaseAdapter:
             return False, str(e)
 
     # ----------------------------
-    # Mapeadores Dict -> Modelos
+    # Construcción de modelos
     # ----------------------------
-    def _map_licitacion_dict_to_model(self, d: Dict[str, Any]) -> Licitacion:
-        """
-        Construye una instancia de Licitacion (tu modelo) a partir del dict de DatabaseManager.get_all_data().
-        Incluye lotes, documentos, oferentes y empresas_nuestras.
-        """
-        # Cabecera
-        lic = Licitacion(
-            id=d.get("id"),
-            nombre_proceso=d.get("nombre_proceso") or d.get("nombre") or "",
-            numero_proceso=d.get("numero_proceso") or d.get("numero") or "",
-            institucion=d.get("institucion") or "",
-            estado=d.get("estado") or d.get("estatus") or "Iniciada",
-            fase_A_superada=_to_bool(d.get("fase_A_superada")),
-            fase_B_superada=_to_bool(d.get("fase_B_superada")),
-            adjudicada=_to_bool(d.get("adjudicada")),
-            adjudicada_a=d.get("adjudicada_a") or "",
-            motivo_descalificacion=d.get("motivo_descalificacion") or "",
-            fecha_creacion=d.get("fecha_creacion") or str(_dt.date.today()),
-            empresas_nuestras=[],  # se setea abajo
-        )
-
-        # Cronograma y parámetros evaluación
-        lic.cronograma = d.get("cronograma") or {}
-        try:
-            # Algunos dumps ya vienen como dict; si fuera str JSON, intentar parsear
-            if isinstance(lic.cronograma, str):
-                import json
-                lic.cronograma = json.loads(lic.cronograma or "{}")
-        except Exception:
-            lic.cronograma = {}
-
-        try:
-            params = d.get("parametros_evaluacion", {})
-            if isinstance(params, str):
-                import json
-                params = json.loads(params or "{}")
-            # Algunos modelos usan un setter .parametros_evaluacion; si no existe, mantener _parametros_evaluacion
-            if hasattr(lic, "parametros_evaluacion"):
-                setattr(lic, "parametros_evaluacion", params)
-            else:
-                setattr(lic, "_parametros_evaluacion", params)
-        except Exception:
-            pass
-
-        # Empresas nuestras
-        en_list = d.get("empresas_nuestras") or []
-        lic.empresas_nuestras = [Empresa(e["nombre"]) if isinstance(e, dict) else Empresa(str(e)) for e in en_list]
-
-        # Lotes
-        lic.lotes = [self._map_lote_dict_to_model(l) for l in (d.get("lotes") or [])]
-
-        # Oferentes
-        lic.oferentes_participantes = [self._map_oferente_dict_to_model(o) for o in (d.get("oferentes_participantes") or [])]
-
-        # Documentos
-        lic.documentos_solicitados = [self._map_documento_dict_to_model(doc) for doc in (d.get("documentos_solicitados") or [])]
-
-        # Enriquecimiento: bandera ganada (si adjudicada_a coincide o hay lotes ganados_por_nosotros)
+    @staticmethod
+    def _marcar_ganada(lic: Licitacion) -> Licitacion:
+        """Enriquecimiento para el Dashboard: bandera 'ganada' (adjudicada a nuestra empresa o algún lote ganado)."""
         try:
             emp_set = {e.nombre.strip().lower() for e in lic.empresas_nuestras}
-            ganada_por_empresa = _to_bool(lic.adjudicada) and (lic.adjudicada_a or "").strip().lower() in emp_set if lic.adjudicada_a else False
+            ganada_por_empresa = bool(lic.adjudicada) and (lic.adjudicada_a or "").strip().lower() in emp_set if lic.adjudicada_a else False
             ganada_por_lote = any(getattr(l, "ganado_por_nosotros", False) for l in lic.lotes)
             setattr(lic, "ganada", bool(ganada_por_empresa or ganada_por_lote))
         except Exception:
             pass
-
-        # last_modified si viene
-        if "last_modified" in d:
-            setattr(lic, "last_modified", d.get("last_modified"))
-
         return lic
 
-    def _map_lote_dict_to_model(self, l: Dict[str, Any]) -> Lote:
-        return Lote(
-            id=l.get("id"),
-            numero=str(l.get("numero") or ""),
-            nombre=l.get("nombre") or "",
-            monto_base=_to_float(l.get("monto_base"), 0.0),
-            monto_base_personal=_to_float(l.get("monto_base_personal"), 0.0),
-            monto_ofertado=_to_float(l.get("monto_ofertado"), 0.0),
-            participamos=_to_bool(l.get("participamos")),
-            fase_A_superada=_to_bool(l.get("fase_A_superada")),
-            ganador_nombre=l.get("ganador_nombre") or "",
-            empresa_nuestra=l.get("empresa_nuestra") or None,
-            ganado_por_nosotros=_to_bool(l.get("ganado_por_nosotros")),
-        )
-
-    def _map_documento_dict_to_model(self, d: Dict[str, Any]) -> Documento:
-        return Documento(
-            id=d.get("id"),
-            codigo=d.get("codigo") or "",
-            nombre=d.get("nombre") or "",
-            categoria=d.get("categoria") or "",
-            comentario=d.get("comentario") or "",
-            presentado=_to_bool(d.get("presentado")),
-            subsanable=d.get("subsanable") or "Subsanable",
-            ruta_archivo=d.get("ruta_archivo") or "",
-            empresa_nombre=None,  # no se usa aquí
-            responsable=d.get("responsable") or "Sin Asignar",
-            revisado=_to_bool(d.get("revisado")),
-            obligatorio=_to_bool(d.get("obligatorio")),
-            orden_pliego=int(d.get("orden_pliego")) if d.get("orden_pliego") is not None else None,
-            requiere_subsanacion=_to_bool(d.get("requiere_subsanacion")),
+    def _map_resumen_dict_to_model(self, r: Dict[str, Any]) -> Licitacion:
+        """Licitacion de solo cabecera a partir de una fila de get_licitaciones_resumen()."""
+        lic = Licitacion(
+            id=r.get("id"),
+            nombre_proceso=r.get("nombre_proceso") or "",
+            numero_proceso=r.get("numero_proceso") or "",
+            institucion=r.get("institucion") or "",
+            estado=r.get("estado") or "Iniciada",
+            fase_A_superada=_to_bool(r.get("fase_A_superada")),
+            fase_B_superada=_to_bool(r.get("fase_B_superada")),
+            adjudicada=_to_bool(r.get("adjudicada")),
+            adjudicada_a=r.get("adjudicada_a") or "",
+            fecha_creacion=r.get("fecha_creacion") or str(_dt.date.today()),
+            docs_completos_manual=_to_bool(r.get("docs_completos_manual")),
+            last_modified=r.get("last_modified"),
+            empresas_nuestras=[Empresa(e["nombre"]) for e in (r.get("empresas_nuestras") or [])],
         )
-
-    def _map_oferente_dict_to_model(self, o: Dict[str, Any]) -> Oferente:
-        of = Oferente(nombre=o.get("nombre") or "", comentario=o.get("comentario") or "", ofertas_por_lote=[])
-        offers = []
-        for it in (o.get("ofertas_por_lote") or []):
-            offers.append(
-                {
-                    "lote_numero": str(it.get("lote_numero") or ""),
-                    "monto": _to_float(it.get("monto"), 0.0),
-                    "paso_fase_A": _to_bool(it.get("paso_fase_A")),
-                    "plazo_entrega": int(it.get("plazo_entrega") or 0),
-                    "garantia_meses": int(it.get("garantia_meses") or 0),
-                    # el flag 'ganador' lo hidrata db_manager para algunos casos; si existe, lo pasamos
-                    **({"ganador": _to_bool(it.get("ganador"))} if "ganador" in it else {}),
-                }
-            )
-        of.ofertas_por_lote = offers
-        return of
-
+        lic.cronograma = r.get("cronograma") or {}
+        # Con seguimiento activo, guardar este modelo solo toca la cabecera:
+        # las listas vacías no se interpretan como "borrar todos los hijos".
+        lic.marcar_limpio()
+        return lic
@@ -5,10 +5,15 @@ import datetime
 import json
 
 from .utils import as_dict
+from seguimiento_cambios import SeguimientoCambios
+from tabla_ofertas import TablaOfertas
 
 
-@dataclass
-class Lote:
+@dataclass(slots=True)
+class Lote(SeguimientoCambios):
+    CAMPOS_SEGUIDOS = ("numero", "nombre", "monto_base", "monto_base_personal", "monto_ofertado",
+                       "participamos", "fase_A_superada", "empresa_nuestra")
+
     id: Optional[int] = None
     numero: str = ""
     nombre: str = ""
@@ -37,17 +42,25 @@ class Lote:
         }
 
 
-@dataclass
-class Oferente:
+@dataclass(slots=True)
+class Oferente(SeguimientoCambios):
+    CAMPOS_SEGUIDOS = ("nombre", "comentario", "ofertas_por_lote")
+
     nombre: str = ""
     comentario: str = ""
     ofertas_por_lote: List[Dict[str, Any]] = field(default_factory=list)
 
+    def __setattr__(self, nombre: str, valor: Any) -> None:
+        # Las ofertas se guardan siempre en forma columnar (ver tabla_ofertas)
+        if nombre == "ofertas_por_lote" and not isinstance(valor, TablaOfertas):
+            valor = TablaOfertas(valor or ())
+        object.__setattr__(self, nombre, valor)
+
     def to_dict(self) -> Dict[str, Any]:
         return {
             "nombre": self.nombre,
             "comentario": self.comentario,
-            "ofertas_por_lote": self.ofertas_por_lote,
+            "ofertas_por_lote": self.ofertas_por_lote.como_lista(),
         }
 
     def get_monto_total_ofertado(self, solo_habilitados: bool = False) -> float:
@@ -57,8 +70,12 @@ class Oferente:
         return float(sum(o.get("monto", 0) or 0 for o in ofertas))
 
 
-@dataclass
-class Documento:
+@dataclass(slots=True)
+class Documento(SeguimientoCambios):
+    CAMPOS_SEGUIDOS = ("codigo", "nombre", "categoria", "comentario", "presentado", "subsanable",
+                       "ruta_archivo", "responsable", "revisado", "obligatorio", "orden_pliego",
+                       "requiere_subsanacion")
+
     id: Optional[int] = None
     codigo: str = ""
     nombre: str = ""
@@ -113,7 +130,15 @@ class Empresa:
 
 
 @dataclass
-class Licitacion:
+class Licitacion(SeguimientoCambios):
+    # Columnas de cabecera en 'licitaciones' + relaciones guardadas aparte
+    CAMPOS_SEGUIDOS = ("nombre_proceso", "numero_proceso", "institucion", "estado",
+                       "fase_A_superada", "fase_B_superada", "adjudicada", "adjudicada_a",
+                       "motivo_descalificacion", "fecha_creacion", "cronograma",
+                       "docs_completos_manual", "parametros_evaluacion",
+                       "empresas_nuestras", "fallas_fase_a")
+    LISTAS_HIJAS = ("lotes", "documentos_solicitados", "oferentes_participantes")
+
     id: Optional[int] = None
     nombre_proceso: str = ""
     numero_proceso: str = ""
@@ -155,6 +180,11 @@ class Licitacion:
     def parametros_evaluacion(self, value: Any) -> None:
         self._parametros_evaluacion = as_dict(value)
 
+    def _valor_seguido(self, campo: str) -> Any:
+        if campo == "empresas_nuestras":
+            return [str(e) for e in self.empresas_nuestras]
+        return getattr(self, campo, None)
+
     def to_dict(self) -> Dict[str, Any]:
         return {
             "id": self.id,
@@ -41,6 +41,22 @@ class LicitacionesTableModel(QAbstractTableModel):
         self._rows = list(licitaciones or [])
         self.endResetModel()
 
+    def patch_rows(self, licitaciones: Sequence[Any]):
+        """
+        Como set_rows, pero si las filas son las mismas licitaciones (mismos ids
+        en el mismo orden) solo reemplaza los objetos que cambiaron y emite
+        dataChanged para esas filas, sin resetear vista ni selección.
+        """
+        nuevas = list(licitaciones or [])
+        if [getattr(l, "id", None) for l in nuevas] != [getattr(l, "id", None) for l in self._rows]:
+            self.set_rows(nuevas)
+            return
+        ultima_col = self.columnCount() - 1
+        for fila, (vieja, nueva) in enumerate(zip(self._rows, nuevas)):
+            if vieja is not nueva:
+                self._rows[fila] = nueva
+                self.dataChanged.emit(self.index(fila, 0), self.index(fila, ultima_col))
+
     def rowCount(self, parent=QModelIndex()) -> int:
         return 0 if parent.isValid() else len(self._rows)
 
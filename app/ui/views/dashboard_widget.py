@@ -2,10 +2,12 @@ from __future__ import annotations
 
 from typing import Optional, Callable, Any, List
 
-from PyQt6.QtWidgets import QWidget, QVBoxLayout
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QDialog
 
 from app.core.db_adapter import DatabaseAdapter
 from app.ui.windows.dashboard_window import DashboardWindow
+from app.ui.windows.licitation_details_window import VentanaDetallesLicitacion
 from app.ui.models.licitaciones_table_model import LicitacionesTableModel, DOCS_PROGRESS_ROLE, DIFERENCIA_PCT_ROLE
 from app.core.logic.status_engine import DefaultStatusEngine
 
@@ -14,7 +16,12 @@ class DashboardWidget(QWidget):
     """
     Carga datos desde DB, monta el modelo con todas las columnas,
     y presenta el Dashboard (tabs Activas/Finalizadas, filtros, KPIs, panel de vencimiento).
+    Las filas son resúmenes (load_dashboard_rows); la licitación completa solo
+    se carga al abrir su detalle.
     """
+    # Cada cuánto se sondea el registro de cambios de la BD (ms)
+    INTERVALO_SONDEO_MS = 5000
+
     def __init__(self, parent=None, db: Optional[DatabaseAdapter] = None):
         super().__init__(parent)
         self.db = db
@@ -34,8 +41,13 @@ class DashboardWidget(QWidget):
         if self.db:
             self.reload_data()
 
-        # Hook para abrir detalle si lo necesitas
-        # self.view.detailRequested.connect(self._on_detail_requested)
+        # Cambios de otras ventanas/máquinas: solo se refrescan las filas afectadas
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(self.INTERVALO_SONDEO_MS)
+        self._poll_timer.timeout.connect(self._poll_changes)
+        self._poll_timer.start()
+
+        self.view.detailRequested.connect(self._on_detail_requested)
 
     def _resolve_loader(self) -> Callable[[], List[Any]]:
         """
@@ -46,6 +58,7 @@ class DashboardWidget(QWidget):
             raise RuntimeError("No hay adaptador de base de datos asignado.")
 
         candidates = [
+            "load_dashboard_rows",
             "load_all_licitaciones",
             "load_licitaciones",
             "listar_licitaciones",
@@ -93,5 +106,32 @@ class DashboardWidget(QWidget):
         self.view._populate_filter_values()
         self.view._apply_filters_to_both()
 
+    def _poll_changes(self):
+        poll = getattr(self.db, "poll_changes", None)
+        if not callable(poll):
+            return
+        try:
+            if not poll():
+                return
+            licitaciones = self._resolve_loader()()
+        except Exception as e:
+            print(f"[WARN] No se pudo sondear cambios en la BD: {e}")
+            return
+        self.model.patch_rows(licitaciones)
+        self.view._update_row_colors()
+        self.view._populate_filter_values()
+        self.view._apply_filters_to_both()
+
     def _on_detail_requested(self, lic_or_id):
-        pass
\ No newline at end of file
+        """Abre el detalle cargando solo esa licitación (la fila es un resumen)."""
+        if not self.db:
+            return
+        lic_id = getattr(lic_or_id, "id", None)
+        if lic_id is None and isinstance(lic_or_id, str):
+            lic = self.db.load_licitacion_by_numero(lic_or_id)
+            lic_id = getattr(lic, "id", None)
+        if lic_id is None:
+            return
+        dlg = VentanaDetallesLicitacion(self, int(lic_id), db=self.db)
+        if dlg.exec() == QDialog.DialogCode.Accepted:
+            self.reload_data()
\ No newline at end of file
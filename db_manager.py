@@ -2,6 +2,217 @@ import sqlite3
 import json
 import logging
 import datetime
+import hashlib
+import os
+import queue
+import threading
+import sys
+import urllib.request
+from collections import Counter
+from contextlib import contextmanager
+from typing import NamedTuple
+
+
+# Subir este número cuando cambie la definición de las tablas/triggers FTS.
+FTS_SCHEMA_VERSION = 1
+
+# Índices FTS5 de contenido externo (rowid = id de la tabla): (tabla FTS, tabla de contenido, columnas).
+FTS_INDICES = (
+    ("fts_licitaciones", "licitaciones", ("numero_proceso", "nombre_proceso", "institucion", "motivo_descalificacion")),
+    ("fts_documentos", "documentos", ("codigo", "nombre", "comentario")),
+)
+# Filas indexadas por transacción al reconstruir (ver _reconstruir_fts).
+FILAS_POR_TANDA_FTS = 500
+
+# Perfiles de entorno (config_app 'env_profile'; mismos textos que el menú de la app Tk).
+PERFIL_LOCAL = "Local (Rápido)"
+PERFIL_RED = "Red / Dropbox (Seguro)"
+
+# PRAGMAs por perfil, en el orden en que se aplican.
+# - Local: WAL (lectores no bloquean al escritor), fsync solo en checkpoints,
+#   caché de 64 MB, E/S mapeada en memoria y temporales en RAM.
+# - Red/Dropbox: WAL no es seguro sobre carpetas de red/sincronizadas (necesita
+#   memoria compartida y el -wal se sincroniza por separado), así que se usa el
+#   journal clásico con fsync completo y sin mmap.
+PERFILES_CONEXION = {
+    PERFIL_LOCAL: (
+        ("journal_mode", "WAL"),
+        ("synchronous", "NORMAL"),
+        ("cache_size", -65536),
+        ("mmap_size", 268435456),
+        ("temp_store", "MEMORY"),
+    ),
+    PERFIL_RED: (
+        ("journal_mode", "DELETE"),
+        ("synchronous", "FULL"),
+        ("cache_size", -16384),
+        ("mmap_size", 0),
+        ("temp_store", "MEMORY"),
+    ),
+}
+
+
+def _sql_crear_fts(nombre, tabla, cols):
+    return (f"CREATE VIRTUAL TABLE {nombre} USING fts5({', '.join(cols)}, "
+            f"content='{tabla}', content_rowid='id')")
+
+
+def _sql_triggers_fts(nombre, tabla, cols, prefijo, cuando=""):
+    """
+    Triggers que mantienen la tabla FTS 'nombre' al día con 'tabla'. Con
+    contenido externo se borra con el comando 'delete' y los valores viejos.
+    'cuando' es una condición opcional sobre {f} (new/old) para limitar las filas.
+    """
+    lista = ", ".join(cols)
+    nuevos = ", ".join(f"new.{c}" for c in cols)
+    viejos = ", ".join(f"old.{c}" for c in cols)
+    borrar = f"INSERT INTO {nombre}({nombre}, rowid, {lista}) VALUES ('delete', old.id, {viejos});"
+    insertar = f"INSERT INTO {nombre}(rowid, {lista}) VALUES (new.id, {nuevos});"
+
+    def _cuando(f):
+        return f" WHEN {cuando.format(f=f)}" if cuando else ""
+    return (
+        f"CREATE TRIGGER {prefijo}_after_insert AFTER INSERT ON {tabla}{_cuando('new')} BEGIN {insertar} END",
+        # El id no cambia en un UPDATE: basta con mirar old
+        f"CREATE TRIGGER {prefijo}_after_update AFTER UPDATE ON {tabla}{_cuando('old')} BEGIN {borrar} {insertar} END",
+        f"CREATE TRIGGER {prefijo}_after_delete AFTER DELETE ON {tabla}{_cuando('old')} BEGIN {borrar} END",
+    )
+
+
+def _limpiar_reconstruccion_fts(conn):
+    """Descarta una reconstrucción FTS a medias (tablas sombra, sus triggers y cursores)."""
+    for nombre, _, _ in FTS_INDICES:
+        sombra = nombre + "_nuevo"
+        for evento in ("insert", "update", "delete"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {sombra}_after_{evento}")
+        conn.execute(f"DROP TABLE IF EXISTS {sombra}")
+    conn.execute("DELETE FROM config_app WHERE clave LIKE 'fts_cursor_%'")
+
+
+def _reconstruir_fts(conn, version, al_progresar=None) -> int:
+    """
+    Reconstruye los índices FTS sin cortar la búsqueda ni bloquear a los escritores:
+
+    1. Crea una tabla sombra '<fts>_nuevo' por índice, con triggers que la
+       mantienen al día solo para los ids ya copiados (id <= cursor).
+    2. La llena por rangos de id de FILAS_POR_TANDA_FTS filas, una transacción
+       corta por tanda; el cursor queda en config_app ('fts_cursor_<fts>') en
+       la misma transacción, así que si se interrumpe se retoma donde quedó.
+    3. En una última transacción corta cambia las sombras por los índices
+       viejos (que hasta ese momento siguen respondiendo las búsquedas).
+
+    al_progresar(hechas, total) se llama después de cada tanda.
+    Devuelve la cantidad de filas indexadas.
+    """
+    def _cursor(nombre):
+        fila = conn.execute("SELECT valor FROM config_app WHERE clave = ?", (f"fts_cursor_{nombre}",)).fetchone()
+        return None if fila is None else int(fila[0])
+
+    total = sum(conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0] for _, tabla, _ in FTS_INDICES)
+    hechas = 0
+    for nombre, tabla, cols in FTS_INDICES:
+        sombra, clave = nombre + "_nuevo", f"fts_cursor_{nombre}"
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if _cursor(nombre) is None:
+                conn.execute(f"DROP TABLE IF EXISTS {sombra}")
+                conn.execute(_sql_crear_fts(sombra, tabla, cols))
+                cuando = f"{{f}}.id <= (SELECT CAST(valor AS INTEGER) FROM config_app WHERE clave = '{clave}')"
+                for sql in _sql_triggers_fts(sombra, tabla, cols, sombra, cuando):
+                    conn.execute(sql)
+                conn.execute("INSERT INTO config_app (clave, valor) VALUES (?, '0')", (clave,))
+            hechas += conn.execute(f"SELECT COUNT(*) FROM {tabla} WHERE id <= ?", (_cursor(nombre),)).fetchone()[0]
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        insertar = (f"INSERT INTO {sombra}(rowid, {', '.join(cols)}) "
+                    f"SELECT id, {', '.join(cols)} FROM {tabla} WHERE id > ? AND id <= ?")
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                desde = _cursor(nombre)
+                hasta = conn.execute(f"SELECT MAX(id) FROM (SELECT id FROM {tabla} WHERE id > ? ORDER BY id LIMIT ?)",
+                                     (desde, FILAS_POR_TANDA_FTS)).fetchone()[0]
+                if hasta is not None:
+                    hechas += conn.execute(insertar, (desde, hasta)).rowcount
+                    conn.execute("UPDATE config_app SET valor = ? WHERE clave = ?", (str(hasta), clave))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            if hasta is None:
+                break
+            if al_progresar is not None:
+                al_progresar(hechas, total)
+
+    # Intercambio: los índices viejos respondieron hasta aquí
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for nombre, tabla, cols in FTS_INDICES:
+            sombra = nombre + "_nuevo"
+            for evento in ("insert", "update", "delete"):
+                conn.execute(f"DROP TRIGGER IF EXISTS {sombra}_after_{evento}")
+                conn.execute(f"DROP TRIGGER IF EXISTS {tabla}_after_{evento}")
+            conn.execute(f"DROP TABLE IF EXISTS {nombre}")
+            conn.execute(f"ALTER TABLE {sombra} RENAME TO {nombre}")
+            for sql in _sql_triggers_fts(nombre, tabla, cols, tabla):
+                conn.execute(sql)
+        conn.execute("DELETE FROM config_app WHERE clave LIKE 'fts_cursor_%'")
+        conn.execute("INSERT OR REPLACE INTO config_app (clave, valor) VALUES ('fts_schema_version', ?)", (version,))
+        conn.execute("INSERT OR REPLACE INTO config_app (clave, valor) VALUES ('fts_poblado_version', ?)", (version,))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return hechas
+
+
+# Normalización de nombres de empresa: minúsculas, sin tildes/diéresis/ñ y sin el
+# sufijo ' (nuestra oferta)'. Se aplica igual en Python (_normalizar_nombre) y en
+# SQL (columnas generadas *_norm): LOWER de SQLite solo pliega ASCII, así que el
+# pliegue de Python se limita a ASCII más estas letras.
+_LETRAS_PLEGADAS = (("á", "a"), ("é", "e"), ("í", "i"), ("ó", "o"), ("ú", "u"), ("ü", "u"), ("ñ", "n"),
+                    ("Á", "a"), ("É", "e"), ("Í", "i"), ("Ó", "o"), ("Ú", "u"), ("Ü", "u"), ("Ñ", "n"))
+_PLIEGUE_NOMBRE = str.maketrans({**{chr(c): chr(c + 32) for c in range(ord("A"), ord("Z") + 1)},
+                                 **dict(_LETRAS_PLEGADAS)})
+_SUFIJO_NUESTRA_OFERTA = " (nuestra oferta)"
+
+
+# Número de proceso normalizado (columna licitaciones.numero_norm): sin espacios
+# alrededor y en minúsculas, como comparaba la carga anterior con strip().lower().
+# Igual que con los nombres, LOWER de SQLite solo pliega ASCII: se completan las
+# mayúsculas del español y el pliegue de Python se limita a lo mismo.
+_MAYUSCULAS_NUMERO = (("Á", "á"), ("É", "é"), ("Í", "í"), ("Ó", "ó"), ("Ú", "ú"), ("Ü", "ü"), ("Ñ", "ñ"))
+_PLIEGUE_NUMERO = str.maketrans({**{chr(c): chr(c + 32) for c in range(ord("A"), ord("Z") + 1)},
+                                 **dict(_MAYUSCULAS_NUMERO)})
+_ESPACIOS_NUMERO = " \t\r\n"
+
+
+def _sql_normalizar_numero(columna: str) -> str:
+    """Expresión SQL equivalente a _normalizar_numero sobre 'columna'."""
+    expr = f"LOWER(TRIM({columna}, char(32, 9, 13, 10)))"
+    for mayuscula, minuscula in _MAYUSCULAS_NUMERO:
+        expr = f"REPLACE({expr}, '{mayuscula}', '{minuscula}')"
+    return expr
+
+
+def _normalizar_numero(numero: str) -> str:
+    return (numero or "").strip(_ESPACIOS_NUMERO).translate(_PLIEGUE_NUMERO)
+
+
+def _sql_normalizar_nombre(columna: str) -> str:
+    """Expresión SQL equivalente a DatabaseManager._normalizar_nombre sobre 'columna'."""
+    expr = f"LOWER({columna})"
+    for letra, base in _LETRAS_PLEGADAS:
+        expr = f"REPLACE({expr}, '{letra}', '{base}')"
+    return f"TRIM(REPLACE({expr}, '{_SUFIJO_NUESTRA_OFERTA}', ''))"
+
+
+def _frase_fts(texto: str) -> str:
+    """Consulta FTS5 de frase exacta para 'texto' (sin tokens no coincide con nada)."""
+    return '"' + (texto or "").replace('"', '""') + '"'
 
 
 def debug_perfil_empresa(self, nombre_empresa: str):
@@ -17,6 +228,167 @@ def debug_perfil_empresa(self, nombre_empresa: str):
         "historial_count": len(hist)
     }
 
+# Orden de columnas de las filas de lotes y fallas que devuelve _leer_filas_licitaciones().
+COLS_FILA_LOTE = ('id', 'licitacion_id', 'numero', 'nombre', 'monto_base', 'monto_base_personal',
+                  'monto_ofertado', 'participamos', 'fase_A_superada', 'empresa_nuestra')
+COLS_FILA_FALLA = ('id', 'licitacion_id', 'participante_nombre', 'documento_id', 'comentario', 'es_nuestro')
+
+
+class FilasLicitaciones(NamedTuple):
+    """Filas crudas de una carga de licitaciones (ver _leer_filas_licitaciones)."""
+    cols_cabecera: list
+    cabecera: list        # columnas de licitaciones (cols_cabecera)
+    empresas: list        # (licitacion_id, empresa_nombre)
+    lotes: list           # COLS_FILA_LOTE
+    cols_documentos: list
+    documentos: list      # SELECT * FROM documentos
+    cols_bnb: list
+    bnb: list             # SELECT * FROM bnb_evaluaciones
+    fallas: list          # COLS_FILA_FALLA
+    ofertas: list         # (oferente_id, licitacion_id, nombre, comentario, lote_numero, monto, paso_fase_A)
+    ganadores: list       # (licitacion_id, lote_numero, ganador_nombre, empresa_nuestra)
+
+
+# Columnas de cabecera que leen las filas de resumen (las que existan en la BD).
+COLS_CABECERA_RESUMEN = ('id', 'numero_proceso', 'nombre_proceso', 'institucion', 'estado',
+                         'fase_A_superada', 'fase_B_superada', 'adjudicada', 'adjudicada_a',
+                         'motivo_descalificacion', 'fecha_creacion', 'cronograma',
+                         'docs_completos_manual', 'last_modified', 'empresa_nuestra')
+
+
+class FilasResumen(NamedTuple):
+    """Filas crudas de las listas/dashboards (ver _leer_filas_resumen)."""
+    cols_cabecera: list
+    cabecera: list        # columnas de licitaciones (cols_cabecera)
+    empresas: list        # (licitacion_id, empresa_nombre)
+    lotes: list           # COLS_FILA_LOTE
+    documentos: list      # (licitacion_id, total, completados, requieren_subsanacion)
+    ganadores: list       # (licitacion_id, lote_numero, ganador_nombre, empresa_nuestra)
+
+
+# Tamaño de la caché de sentencias preparadas de sqlite3 por conexión (por
+# defecto 128). Cubre las sentencias fijas más las generadas por tabla/columnas.
+CACHE_SENTENCIAS = 256
+
+
+class RegistroSQL:
+    """
+    Registro de sentencias parametrizadas generadas por tabla/columnas.
+    Cada texto se construye una sola vez y se reutiliza idéntico, de modo que
+    la caché de sentencias preparadas de sqlite3 (cached_statements) acierta
+    siempre en lugar de recompilar un f-string nuevo en cada llamada.
+    """
+    def __init__(self):
+        self._sql = {}
+
+    def _obtener(self, clave, construir):
+        sql = self._sql.get(clave)
+        if sql is None:
+            sql = self._sql[clave] = construir()
+        return sql
+
+    def insert(self, tabla, columnas):
+        columnas = tuple(columnas)
+        return self._obtener(("insert", tabla, columnas), lambda: (
+            f"INSERT INTO {tabla} ({','.join(columnas)}) VALUES ({','.join('?' * len(columnas))})"
+        ))
+
+    def upsert(self, tabla, columnas, unicas):
+        columnas, unicas = tuple(columnas), tuple(unicas)
+
+        def construir():
+            update_cols = [c for c in columnas if c not in unicas]
+            accion = ("DO UPDATE SET " + ", ".join(f"{c}=excluded.{c}" for c in update_cols)) if update_cols else "DO NOTHING"
+            return (f"INSERT INTO {tabla} ({','.join(columnas)}) VALUES ({','.join('?' * len(columnas))}) "
+                    f"ON CONFLICT({','.join(unicas)}) {accion}")
+        return self._obtener(("upsert", tabla, columnas, unicas), construir)
+
+    def delete_por_licitacion(self, tabla):
+        return self._obtener(("delete_lic", tabla), lambda: f"DELETE FROM {tabla} WHERE licitacion_id = ?")
+
+    def delete_por_id(self, tabla):
+        return self._obtener(("delete_id", tabla), lambda: f"DELETE FROM {tabla} WHERE id = ?")
+
+    def update_por_id(self, tabla, columnas):
+        columnas = tuple(columnas)
+        return self._obtener(("update_id", tabla, columnas), lambda: (
+            f"UPDATE {tabla} SET {', '.join(f'{c}=?' for c in columnas)} WHERE id = ?"
+        ))
+
+    def delete_todo(self, tabla):
+        return self._obtener(("delete_all", tabla), lambda: f"DELETE FROM {tabla}")
+
+
+class CatalogoEsquema:
+    """
+    Caché de la introspección del esquema (tablas, columnas y lo que se deduce
+    de ellas, como las columnas que eligen los _resolver_*). Se llena a demanda
+    con la conexión que pregunta (sirve también para las del pool de lectura)
+    y solo se vacía con invalidar(): DatabaseManager lo hace cuando aplica una
+    migración o recrea las tablas FTS.
+    """
+    def __init__(self):
+        self._tablas = None
+        self._columnas = {}
+        self._derivados = {}
+
+    def tablas(self, conn) -> frozenset:
+        """Nombres de las tablas de la BD."""
+        tablas = self._tablas
+        if tablas is None:
+            tablas = self._tablas = frozenset(
+                r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'"))
+        return tablas
+
+    def columnas(self, conn, tabla) -> tuple:
+        """Columnas de 'tabla' en el orden de PRAGMA table_info (vacío si no existe)."""
+        cols = self._columnas.get(tabla)
+        if cols is None:
+            cols = self._columnas[tabla] = tuple(r[1] for r in conn.execute(f"PRAGMA table_info({tabla})"))
+        return cols
+
+    def derivado(self, clave, calcular):
+        """Resultado de calcular() memorizado bajo 'clave' (las excepciones no se guardan)."""
+        try:
+            return self._derivados[clave]
+        except KeyError:
+            valor = self._derivados[clave] = calcular()
+            return valor
+
+    def invalidar(self):
+        self._tablas = None
+        self._columnas = {}
+        self._derivados = {}
+
+
+class TareaDiagnostico:
+    """
+    Diagnóstico en curso (ver DatabaseManager.diagnosticar). El hilo que lo
+    corre va agregando líneas a 'mensajes' a medida que termina cada etapa;
+    la interfaz las lee desde 'mensajes[n:]' con un temporizador.
+    """
+    def __init__(self, completo):
+        self.completo = completo
+        self.mensajes = []
+        self.fraccion = 0.0
+        self.resultado = None
+        self.error = None
+        self.desde_cache = False
+        self._cancelada = False
+        self._hecho = threading.Event()
+
+    @property
+    def terminada(self) -> bool:
+        return self._hecho.is_set()
+
+    def cancelar(self):
+        """Interrumpe el chequeo en curso (el resultado queda en None)."""
+        self._cancelada = True
+
+    def esperar(self, timeout=None) -> bool:
+        return self._hecho.wait(timeout)
+
+
 class ConcurrencyException(Exception):
     """Excepción personalizada para errores de concurrencia."""
     pass
@@ -26,18 +398,365 @@ class DatabaseManager:
     Gestiona todas las interacciones con la base de datos SQLite
     utilizando una estructura relacional de múltiples tablas.
     """
+    # Migraciones de esquema integradas: (número, nombre, método). Se registran en
+    # schema_migrations (misma tabla que scripts/migrate.py) con id
+    # ID_MIGRACIONES_INTEGRADAS + número: los ids desde 1000 quedan reservados para
+    # estas y scripts/migrate.py solo acepta archivos 0001-0999. Nunca reordenar ni
+    # reutilizar números: para cambiar el esquema se agrega una entrada nueva al final.
+    ID_MIGRACIONES_INTEGRADAS = 1000
+    MIGRACIONES = [
+        (1, "esquema_base", "_migracion_esquema_base"),
+        (2, "indices_fallas", "asegurar_indices_fallas"),
+        (3, "fts", "setup_fts"),
+        (4, "registro_cambios", "_migracion_registro_cambios"),
+        (5, "indices_compuestos", "_migracion_indices_compuestos"),
+        (6, "orden_lotes", "_migracion_orden_lotes"),
+        (7, "nombres_normalizados", "_migracion_nombres_normalizados"),
+        (8, "numero_normalizado", "_migracion_numero_normalizado"),
+    ]
+
+    # Índices de la migración 5, salidos de EXPLAIN QUERY PLAN sobre las consultas
+    # de este módulo (ver scripts/check_query_plans.py): nombre -> (tabla, columnas).
+    INDICES_COMPUESTOS = {
+        # existe_evento_subsanacion_pendiente, completar_evento_subsanacion, obtener_historial_subsanacion
+        "idx_subsanacion_lic_doc_estado": ("subsanacion_historial", "licitacion_id, documento_id, estado"),
+        # diff de ofertas en _sincronizar_oferentes (reemplaza a idx_ofertas_oferente_id)
+        "idx_ofertas_oferente_lote": ("ofertas_lote_oferentes", "oferente_id, lote_numero"),
+        # documentos por código dentro de la licitación (reemplaza a idx_documentos_licitacion_id)
+        "idx_documentos_lic_codigo": ("documentos", "licitacion_id, codigo"),
+        "idx_expediente_items_exp_orden": ("expediente_items", "expediente_id, orden"),
+        # ON DELETE CASCADE: sin índice en la columna hija, cada documento/expediente
+        # borrado recorre la tabla hija completa.
+        "idx_subsanacion_documento_id": ("subsanacion_historial", "documento_id"),
+        "idx_descalificaciones_documento_id": ("descalificaciones_fase_a", "documento_id"),
+        "idx_expediente_items_doc_version": ("expediente_items", "doc_version_id"),
+        "idx_expedientes_licitacion_id": ("expedientes", "licitacion_id"),
+    }
+    # Índices de una columna que quedan cubiertos por un prefijo de INDICES_COMPUESTOS.
+    INDICES_REEMPLAZADOS = ("idx_ofertas_oferente_id", "idx_documentos_licitacion_id")
+
+    # Clave numérica de orden de los lotes (migración 6): columna generada
+    # numero_orden = número del lote si el texto tiene dígitos ('10' -> 10,
+    # 'Lote 3' -> 0), NULL si no; se ordena por (numero_orden, numero).
+    EXPR_ORDEN_LOTE = "CASE WHEN {col} GLOB '*[0-9]*' THEN CAST({col} AS INTEGER) END"
+    # tabla -> (columna con el número de lote, índice de orden)
+    ORDEN_LOTES = {
+        "lotes": ("numero", "idx_lotes_lic_orden"),
+        "licitacion_ganadores_lote": ("lote_numero", "idx_ganadores_lic_orden"),
+    }
+
+    # Nombres normalizados (migración 7): (tabla, columna generada, columna origen, índice, columnas del índice)
+    NOMBRES_NORMALIZADOS = (
+        ("licitacion_ganadores_lote", "ganador_norm", "ganador_nombre", "idx_ganadores_ganador_norm", "ganador_norm"),
+        ("licitacion_ganadores_lote", "empresa_norm", "empresa_nuestra", "idx_ganadores_empresa_norm", "empresa_norm"),
+        ("licitacion_empresas_nuestras", "empresa_norm", "empresa_nombre", "idx_empresas_nuestras_norm",
+         "empresa_norm, licitacion_id"),
+        ("oferentes", "nombre_norm", "nombre", "idx_oferentes_nombre_norm", "nombre_norm, licitacion_id"),
+    )
+    # Solo se indexan en tokens_ganadores los nombres con algún token (la baja se busca por MATCH).
+    CON_TOKENS = "{f}.ganador_nombre GLOB '*[0-9A-Za-z]*'"
+
+    # Tablas que alimentan registro_cambios -> expresión (sobre NEW/OLD) que da la licitación.
+    TABLAS_REGISTRO_CAMBIOS = {
+        "licitaciones": "{f}.id",
+        "lotes": "{f}.licitacion_id",
+        "documentos": "{f}.licitacion_id",
+        "oferentes": "{f}.licitacion_id",
+        "ofertas_lote_oferentes": "(SELECT licitacion_id FROM oferentes WHERE id = {f}.oferente_id)",
+        "licitacion_empresas_nuestras": "{f}.licitacion_id",
+        "licitacion_ganadores_lote": "{f}.licitacion_id",
+        "descalificaciones_fase_a": "{f}.licitacion_id",
+        "bnb_evaluaciones": "{f}.licitacion_id",
+        "subsanacion_historial": "{f}.licitacion_id",
+    }
+
+    # Conexiones de solo lectura que puede tener abiertas el pool (ver lector()).
+    MAX_LECTORES = 3
+
     def __init__(self, db_path):
-        self.conn = sqlite3.connect(db_path)
-        self.conn.execute("PRAGMA foreign_keys = 1")
+        self.db_path = db_path
+        self._fts_thread = None
+        self.sql = RegistroSQL()
+        self.conteo_sentencias = Counter()
+        # Escrituras a hijos que no pasan por save_licitacion (no cambian last_modified):
+        # contador por licitación y global, para invalidar los MapaIdentidad.
+        self._versiones_locales = Counter()
+        self._version_global = 0
+        # seqs de registro_cambios que escribió save_licitacion desde esta conexión
+        # (changes_since(solo_ajenos=True) los omite) y último seq entregado.
+        self._seqs_propios = set()
+        self._seq_leido = 0
+        # Sube cada vez que se reabre el archivo (ver reemplazar_archivo): quien
+        # guarde estado derivado de la BD (MapaIdentidad) lo descarta al verla cambiar.
+        self.generacion = 0
+        # Último diagnóstico por nivel (completo: bool) -> (clave_datos(), resultado)
+        self._diagnosticos = {}
+        self._abrir()
+
+    def _abrir(self):
+        """Abre la conexión escritora, aplica migraciones y perfil, y prepara el pool de lectura."""
+        # self.conn es la única conexión escritora; se usa desde el hilo de la UI.
+        self.conn = sqlite3.connect(self.db_path, cached_statements=CACHE_SENTENCIAS)
+        self.catalogo = CatalogoEsquema()
+        self.conn.execute("PRAGMA foreign_keys = ON")
         self.cursor = self.conn.cursor()
-        self._actualizar_schema()
+        self._aplicar_migraciones()   # con la BD al día: una sola lectura de schema_migrations
+        self.perfil_conexion = None
+        self._lectores = queue.LifoQueue()
+        self._lectores_abiertos = 0
+        self._lectores_lock = threading.Lock()
+        self.aplicar_perfil_conexion(self.get_setting('env_profile', PERFIL_LOCAL))
+        self._asegurar_fts_poblado()  # población inicial en segundo plano
+
+    def _aplicar_migraciones(self):
+        """
+        Aplica las MIGRACIONES pendientes, cada una en su propia transacción
+        (un solo commit por migración). Una BD al día solo lee schema_migrations.
+        """
+        try:
+            filas = self.conn.execute("SELECT id, name, checksum FROM schema_migrations").fetchall()
+        except sqlite3.OperationalError:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                  id INTEGER PRIMARY KEY,
+                  name TEXT NOT NULL,
+                  applied_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f','now')),
+                  checksum TEXT NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_schema_migrations_id ON schema_migrations(id)")
+            filas = []
+        aplicadas = {mig_id: checksum for mig_id, _, checksum in self._renumerar_migraciones_heredadas(filas)}
+
+        for numero, nombre, metodo in self.MIGRACIONES:
+            mig_id = self.ID_MIGRACIONES_INTEGRADAS + numero
+            checksum = self._checksum_migracion(mig_id, nombre)
+            if mig_id in aplicadas:
+                if aplicadas[mig_id] != checksum:
+                    raise RuntimeError(f"schema_migrations tiene otra migración con el id {mig_id}; los ids desde "
+                                       f"{self.ID_MIGRACIONES_INTEGRADAS} están reservados para la aplicación.")
+                continue
+            logging.info(f"[DB] Aplicando migración {mig_id:04d}_{nombre}...")
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                getattr(self, metodo)()
+                self.conn.execute(
+                    "INSERT INTO schema_migrations (id, name, checksum) VALUES (?, ?, ?)",
+                    (mig_id, nombre, checksum)
+                )
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            finally:
+                self.catalogo.invalidar()
+
+    def _renumerar_migraciones_heredadas(self, filas):
+        """
+        Las BDs de antes del rango reservado guardaron las migraciones integradas
+        con su número como id (1, 2, ...), los mismos ids que usan los archivos de
+        scripts/migrate.py. Se reconocen por el checksum y se pasan a su id
+        reservado; devuelve las filas de schema_migrations ya renumeradas.
+        """
+        base = self.ID_MIGRACIONES_INTEGRADAS
+        conocidas = {numero: nombre for numero, nombre, _ in self.MIGRACIONES}
+        heredadas = [(mig_id, nombre) for mig_id, nombre, checksum in filas
+                     if mig_id < base and conocidas.get(mig_id) == nombre
+                     and checksum == self._checksum_migracion(mig_id, nombre)]
+        if not heredadas:
+            return filas
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for mig_id, nombre in heredadas:
+                self.conn.execute(
+                    "UPDATE schema_migrations SET id = ?, checksum = ? WHERE id = ?",
+                    (base + mig_id, self._checksum_migracion(base + mig_id, nombre), mig_id)
+                )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return self.conn.execute("SELECT id, name, checksum FROM schema_migrations").fetchall()
+
+    @staticmethod
+    def _checksum_migracion(mig_id, nombre):
+        # Las de scripts/migrate.py guardan el hash del archivo, así que no se confunden con estas
+        return hashlib.sha256(f"{mig_id:04d}_{nombre}".encode("utf-8")).hexdigest()
+
+    @classmethod
+    def verificar_esquema(cls, conn):
+        """
+        Comprueba que la BD abierta en 'conn' se pueda abrir con esta versión:
+        que sea una BD de licitaciones y que no tenga migraciones integradas
+        que este código no conoce (vendría de una versión más nueva de la app).
+        Las que falten se aplican al abrirla. Lanza ValueError si no sirve.
+        """
+        tablas = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "licitaciones" not in tablas:
+            raise ValueError("El archivo no es una base de datos de licitaciones.")
+        if "schema_migrations" not in tablas:
+            return  # anterior al sistema de migraciones: la 1 la adapta
+        conocidas = {numero: nombre for numero, nombre, _ in cls.MIGRACIONES}
+        base = cls.ID_MIGRACIONES_INTEGRADAS
+        for mig_id, nombre, checksum in conn.execute("SELECT id, name, checksum FROM schema_migrations"):
+            if checksum != cls._checksum_migracion(mig_id, nombre):
+                continue  # de scripts/migrate.py
+            # Por debajo de la base: BD anterior al rango reservado (se renumera al abrirla)
+            numero = mig_id - base if mig_id >= base else mig_id
+            if conocidas.get(numero) != nombre:
+                raise ValueError(f"La base de datos tiene la migración {mig_id:04d}_{nombre}, "
+                                 f"de una versión más nueva de la aplicación.")
+
+    def _migracion_esquema_base(self):
+        """
+        Migración 1: esquema completo previo al sistema de migraciones.
+        Crea lo que falte y adapta BDs antiguas (columnas nuevas, plantillas, kit_items).
+        """
         self.create_tables()
-        self.setup_fts()  # Inicializa/asegura los índices FTS
-        self.cursor.execute("PRAGMA foreign_keys = ON")  # recomendado
-        self._ensure_ganadores_schema()                  # <- ¡IMPRESCINDIBLE!
+        self._actualizar_schema()
+        self._ensure_ganadores_schema()
+
+    def _migracion_registro_cambios(self):
+        """
+        Migración 4: registro de cambios mantenido por triggers. Cada escritura a
+        una licitación o a sus tablas hijas deja (licitacion_id, tabla) con un
+        seq nuevo (AUTOINCREMENT: nunca retrocede ni se reutiliza). Se guarda una
+        sola fila por par, así que la tabla no crece con cada guardado.
+        Lo consulta changes_since(); al viajar dentro del archivo .db sirve
+        también entre máquinas que comparten la BD por Dropbox/red.
+        """
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS registro_cambios (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                licitacion_id INTEGER NOT NULL,
+                tabla TEXT NOT NULL,
+                operacion TEXT NOT NULL,
+                cambiado_en TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+                UNIQUE (licitacion_id, tabla)
+            )
+        """)
+        for tabla, expr in self.TABLAS_REGISTRO_CAMBIOS.items():
+            for operacion, fila in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+                lic = expr.format(f=fila)
+                nombre = f"rc_{tabla}_{operacion.lower()}"
+                self.cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+                # DELETE + INSERT en vez de INSERT OR REPLACE: el ON CONFLICT de la
+                # sentencia externa (p.ej. INSERT OR IGNORE) anularía el del trigger.
+                self.cursor.execute(f"""
+                    CREATE TRIGGER {nombre} AFTER {operacion} ON {tabla}
+                    WHEN {lic} IS NOT NULL
+                    BEGIN
+                        DELETE FROM registro_cambios WHERE licitacion_id = {lic} AND tabla = '{tabla}';
+                        INSERT INTO registro_cambios (licitacion_id, tabla, operacion)
+                        VALUES ({lic}, '{tabla}', '{operacion}');
+                    END
+                """)
+
+    def _migracion_indices_compuestos(self):
+        """
+        Migración 5: índices compuestos para las consultas calientes y para las
+        columnas hijas de los ON DELETE CASCADE (INDICES_COMPUESTOS). Se borran
+        los índices de una columna que pasan a ser prefijo de uno compuesto:
+        solo encarecían las escrituras.
+        """
+        for nombre, (tabla, columnas) in self.INDICES_COMPUESTOS.items():
+            self.cursor.execute(f"CREATE INDEX IF NOT EXISTS {nombre} ON {tabla}({columnas})")
+        for nombre in self.INDICES_REEMPLAZADOS:
+            self.cursor.execute(f"DROP INDEX IF EXISTS {nombre}")
 
+    def _migracion_orden_lotes(self):
+        """
+        Migración 6: columna generada numero_orden en lotes y en
+        licitacion_ganadores_lote (VIRTUAL: es la única que admite ALTER TABLE;
+        el valor se guarda en el índice) e índice (licitacion_id, numero_orden,
+        número), así las lecturas ordenadas por lote son un recorrido de rango
+        del índice en lugar de un CAST/GLOB por fila más un ordenamiento.
+        Reemplaza a idx_lotes_licitacion_id y al índice por expresión de la migración 5.
+        """
+        for tabla, (col, indice) in self.ORDEN_LOTES.items():
+            columnas = {r[1] for r in self.cursor.execute(f"PRAGMA table_xinfo({tabla})")}
+            if "numero_orden" not in columnas:
+                self.cursor.execute(
+                    f"ALTER TABLE {tabla} ADD COLUMN numero_orden INTEGER "
+                    f"GENERATED ALWAYS AS ({self.EXPR_ORDEN_LOTE.format(col=col)}) VIRTUAL"
+                )
+            self.cursor.execute(f"CREATE INDEX IF NOT EXISTS {indice} ON {tabla}(licitacion_id, numero_orden, {col})")
+        self.cursor.execute("DROP INDEX IF EXISTS idx_lotes_licitacion_id")
+        self.cursor.execute("DROP INDEX IF EXISTS idx_ganadores_lic_lote_num")
+
+    def _migracion_numero_normalizado(self):
+        """
+        Migración 8: columna generada numero_norm en licitaciones (ver
+        _sql_normalizar_numero) con su índice, para buscar por número sin
+        distinguir mayúsculas ni espacios sobrantes de datos legados.
+        Reemplaza a idx_licitaciones_numero_nocase.
+        """
+        columnas = {r[1] for r in self.cursor.execute("PRAGMA table_xinfo(licitaciones)")}
+        if "numero_norm" not in columnas:
+            self.cursor.execute(
+                "ALTER TABLE licitaciones ADD COLUMN numero_norm TEXT "
+                f"GENERATED ALWAYS AS ({_sql_normalizar_numero('numero_proceso')}) VIRTUAL"
+            )
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_licitaciones_numero_norm ON licitaciones(numero_norm)")
+        self.cursor.execute("DROP INDEX IF EXISTS idx_licitaciones_numero_nocase")
 
-        
+    def _migracion_nombres_normalizados(self):
+        """
+        Migración 7: nombres de empresa normalizados para los perfiles y el
+        backfill de ganadores (NOMBRES_NORMALIZADOS). Son columnas generadas
+        con la misma normalización que _normalizar_nombre e indexadas, así la
+        comparación deja de hacer LOWER/TRIM/REPLACE fila por fila.
+
+        La búsqueda "contiene" usa tokens_ganadores: una tabla FTS5 con los
+        nombres de ganadores tokenizados (sin mayúsculas ni tildes) que
+        mantienen los triggers tg_tokens_ganadores_*; sustituye a INSTR.
+        """
+        cols_g = {r[1] for r in self.cursor.execute("PRAGMA table_xinfo(licitacion_ganadores_lote)")}
+        if "empresa_nuestra" not in cols_g:
+            self.cursor.execute("ALTER TABLE licitacion_ganadores_lote ADD COLUMN empresa_nuestra TEXT")
+        for tabla, columna, origen, indice, columnas_indice in self.NOMBRES_NORMALIZADOS:
+            existentes = {r[1] for r in self.cursor.execute(f"PRAGMA table_xinfo({tabla})")}
+            if columna not in existentes:
+                self.cursor.execute(
+                    f"ALTER TABLE {tabla} ADD COLUMN {columna} TEXT "
+                    f"GENERATED ALWAYS AS ({_sql_normalizar_nombre(origen)}) VIRTUAL"
+                )
+            self.cursor.execute(f"CREATE INDEX IF NOT EXISTS {indice} ON {tabla}({columnas_indice})")
+
+        self.cursor.execute("DROP TABLE IF EXISTS tokens_ganadores")
+        self.cursor.execute("""
+            CREATE VIRTUAL TABLE tokens_ganadores USING fts5(
+                ganador_nombre,
+                licitacion_id UNINDEXED,
+                lote_numero UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        """)
+        alta = """
+            INSERT INTO tokens_ganadores (ganador_nombre, licitacion_id, lote_numero)
+            SELECT NEW.ganador_nombre, NEW.licitacion_id, NEW.lote_numero WHERE {con_tokens};
+        """.format(con_tokens=self.CON_TOKENS.format(f="NEW"))
+        baja = """
+            DELETE FROM tokens_ganadores WHERE rowid IN (
+                SELECT rowid FROM tokens_ganadores
+                WHERE tokens_ganadores MATCH '"' || REPLACE(OLD.ganador_nombre, '"', '""') || '"'
+                  AND licitacion_id = OLD.licitacion_id AND lote_numero = OLD.lote_numero
+                  AND ganador_nombre = OLD.ganador_nombre
+            ) AND {con_tokens};
+        """.format(con_tokens=self.CON_TOKENS.format(f="OLD"))
+        for operacion, cuerpo in (("INSERT", alta), ("DELETE", baja),
+                                  ("UPDATE OF licitacion_id, lote_numero, ganador_nombre", baja + alta)):
+            nombre = f"tg_tokens_ganadores_{operacion.split()[0].lower()}"
+            self.cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+            self.cursor.execute(f"""
+                CREATE TRIGGER {nombre} AFTER {operacion} ON licitacion_ganadores_lote
+                BEGIN {cuerpo} END
+            """)
+        self.cursor.execute(f"""
+            INSERT INTO tokens_ganadores (ganador_nombre, licitacion_id, lote_numero)
+            SELECT ganador_nombre, licitacion_id, lote_numero FROM licitacion_ganadores_lote
+            WHERE {self.CON_TOKENS.format(f="licitacion_ganadores_lote")}
+        """)
 
     def _ensure_ganadores_schema(self):
         # Esta función ahora solo crea la tabla con la clave primaria correcta y completa.
@@ -55,7 +774,6 @@ class DatabaseManager:
         ''')
         self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_ganadores_licitacion ON licitacion_ganadores_lote(licitacion_id)")
         self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_ganadores_nombre ON licitacion_ganadores_lote(ganador_nombre)")
-        self.conn.commit()
 
     def _table_exists(self, name: str) -> bool:
         cur = self.conn.execute(
@@ -67,7 +785,8 @@ class DatabaseManager:
     def _actualizar_schema(self):
         """
         Añade columnas, repara tablas y migra la estructura de la BD de forma robusta.
-        Se ejecuta una vez al iniciar la aplicación.
+        Forma parte de la migración 1 (ver _migracion_esquema_base): corre dentro de
+        la transacción de la migración, así que aquí no se hace commit.
         """
         cursor = self.conn.cursor()
 
@@ -75,7 +794,6 @@ class DatabaseManager:
             try:
                 print(f"Verificando schema: {descripcion}...")
                 cursor.execute(sql_alter)
-                self.conn.commit()
                 print(f" -> OK: {descripcion} aplicado.")
             except sqlite3.OperationalError as e:
                 if "duplicate column name" in str(e) or "already exists" in str(e):
@@ -84,7 +802,6 @@ class DatabaseManager:
                     raise e
             except Exception as e:
                 print(f"Error aplicando '{descripcion}': {e}")
-                self.conn.rollback()
                 raise e
 
         # --- INICIO DE CORRECCIÓN DEFINITIVA ---
@@ -96,8 +813,8 @@ class DatabaseManager:
             if 'empresa_nombre' in columnas_maestros:
                 print("Detectada estructura antigua de plantillas. Iniciando migración a modelo global...")
                 
-                # La transacción ahora envuelve todo el bloque de forma segura
-                self.conn.execute('BEGIN IMMEDIATE TRANSACTION')
+                # SAVEPOINT: si falla, se revierte solo este bloque
+                cursor.execute('SAVEPOINT migracion_plantillas')
                 try:
                     cursor.execute("DROP TRIGGER IF EXISTS documentos_maestros_after_insert;")
                     cursor.execute("DROP TRIGGER IF EXISTS documentos_maestros_after_update;")
@@ -118,11 +835,12 @@ class DatabaseManager:
                         ) WHERE rn = 1
                     ''')
                     cursor.execute("DROP TABLE documentos_maestros_old")
-                    self.conn.commit()
+                    cursor.execute('RELEASE SAVEPOINT migracion_plantillas')
                     print(" -> MIGRACIÓN COMPLETADA CON ÉXITO.")
                 except Exception as migration_error:
                     print(f" -> ERROR DURANTE MIGRACIÓN: {migration_error}. Revirtiendo cambios...")
-                    self.conn.rollback()
+                    cursor.execute('ROLLBACK TO SAVEPOINT migracion_plantillas')
+                    cursor.execute('RELEASE SAVEPOINT migracion_plantillas')
                     raise migration_error
 
         except Exception as e:
@@ -151,35 +869,27 @@ class DatabaseManager:
         ejecutar_cambio("Añadir representante a competidores", 'ALTER TABLE competidores_maestros ADD COLUMN representante TEXT')
 
         # --- 3. REPARACIÓN DE LA TABLA 'kit_items' (sin cambios) ---
-        try:
-            cursor.execute("PRAGMA table_info(kit_items)")
-            columnas_kit_items = cursor.fetchall()
-            if columnas_kit_items and not any(col[5] for col in columnas_kit_items):
-                print("Reparando la tabla 'kit_items' para añadir Primary Key y eliminar duplicados...")
-                self.conn.execute('BEGIN TRANSACTION')
-                cursor.execute("ALTER TABLE kit_items RENAME TO kit_items_old")
-                cursor.execute('''
-                    CREATE TABLE kit_items (
-                        kit_id INTEGER, documento_maestro_id INTEGER,
-                        PRIMARY KEY (kit_id, documento_maestro_id),
-                        FOREIGN KEY (kit_id) REFERENCES kits_de_requisitos (id) ON DELETE CASCADE,
-                        FOREIGN KEY (documento_maestro_id) REFERENCES documentos_maestros (id) ON DELETE CASCADE
-                    )
-                ''')
-                cursor.execute("INSERT OR IGNORE INTO kit_items (kit_id, documento_maestro_id) SELECT DISTINCT kit_id, documento_maestro_id FROM kit_items_old")
-                cursor.execute("DROP TABLE kit_items_old")
-                self.conn.commit()
-        except sqlite3.OperationalError as e:
-            if "no such table" not in str(e):
-                self.conn.rollback()
-                raise e
-        except Exception as e:
-            print(f"Error reparando 'kit_items': {e}")
-            self.conn.rollback()
-            raise
+        cursor.execute("PRAGMA table_info(kit_items)")
+        columnas_kit_items = cursor.fetchall()
+        if columnas_kit_items and not any(col[5] for col in columnas_kit_items):
+            print("Reparando la tabla 'kit_items' para añadir Primary Key y eliminar duplicados...")
+            cursor.execute("ALTER TABLE kit_items RENAME TO kit_items_old")
+            cursor.execute('''
+                CREATE TABLE kit_items (
+                    kit_id INTEGER, documento_maestro_id INTEGER,
+                    PRIMARY KEY (kit_id, documento_maestro_id),
+                    FOREIGN KEY (kit_id) REFERENCES kits_de_requisitos (id) ON DELETE CASCADE,
+                    FOREIGN KEY (documento_maestro_id) REFERENCES documentos_maestros (id) ON DELETE CASCADE
+                )
+            ''')
+            cursor.execute("INSERT OR IGNORE INTO kit_items (kit_id, documento_maestro_id) SELECT DISTINCT kit_id, documento_maestro_id FROM kit_items_old")
+            cursor.execute("DROP TABLE kit_items_old")
  
     def create_tables(self):
-        """Crea/migra todas las tablas necesarias de forma segura (idempotente)."""
+        """
+        Crea todas las tablas necesarias de forma segura (idempotente).
+        Se ejecuta dentro de la migración 1; el commit lo hace _aplicar_migraciones().
+        """
 
         # === BASE ===
         self.cursor.execute('''
@@ -399,14 +1109,20 @@ class DatabaseManager:
                 FOREIGN KEY (documento_id) REFERENCES documentos (id) ON DELETE CASCADE
             )
         ''')
-        self.conn.commit()
 
         self.cursor.execute("""
             CREATE UNIQUE INDEX IF NOT EXISTS uniq_subsanacion_pendiente
             ON subsanacion_historial(licitacion_id, documento_id)
             WHERE UPPER(TRIM(estado)) = 'PENDIENTE'
         """)
-        self.conn.commit()
+
+        # Índices por licitacion_id para la carga por licitación (load_licitacion_full).
+        # Los nombres coinciden con los que espera run_sanity_checks().
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_lotes_licitacion_id ON lotes(licitacion_id)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_documentos_licitacion_id ON documentos(licitacion_id)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_oferentes_licitacion_id ON oferentes(licitacion_id)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_ofertas_oferente_id ON ofertas_lote_oferentes(oferente_id)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_descalificaciones_licitacion_id ON descalificaciones_fase_a(licitacion_id)")
 
 
 
@@ -417,6 +1133,7 @@ class DatabaseManager:
             WHERE licitacion_id = ? AND CAST(numero AS TEXT) = CAST(? AS TEXT)
         """, (empresa_nuestra or None, licitacion_id, str(lote_numero)))
         self.conn.commit()
+        self._tocar_licitacion(licitacion_id)
 
     def update_lote_flags(self, licitacion_id: int, lote_numero: str, participamos: bool, fase_a_ok: bool, monto_ofertado: float | None):
         self.cursor.execute("""
@@ -425,6 +1142,7 @@ class DatabaseManager:
             WHERE licitacion_id = ? AND CAST(numero AS TEXT) = CAST(? AS TEXT)
         """, (1 if participamos else 0, 1 if fase_a_ok else 0, float(monto_ofertado or 0.0), licitacion_id, str(lote_numero)))
         self.conn.commit()
+        self._tocar_licitacion(licitacion_id)
 
 
     def obtener_todas_las_fallas(self):
@@ -479,49 +1197,56 @@ class DatabaseManager:
         return cur.rowcount
 
 
+    # Columnas de 'documentos' que se escriben desde el modelo Documento.
+    COLS_DOCUMENTOS = ('codigo', 'nombre', 'categoria', 'comentario', 'presentado', 'subsanable',
+                       'ruta_archivo', 'responsable', 'revisado', 'obligatorio', 'orden_pliego',
+                       'requiere_subsanacion')
+
+    @staticmethod
+    def _huella_fila(valores):
+        """Huella comparable de una fila: bool -> int para que True y el 1 leído de SQLite coincidan."""
+        return tuple(int(v) if isinstance(v, bool) else v for v in valores)
+
     def _update_or_insert_documentos(self, licitacion_id, documentos_en_memoria):
         """
         Actualiza, inserta o elimina documentos de forma inteligente para no romper
-        las claves foráneas que dependen de ellos.
+        las claves foráneas que dependen de ellos. Solo se reescriben las filas cuya
+        huella cambió (menos trabajo para los triggers de fts_documentos) y las
+        escrituras se agrupan con executemany.
         """
-        # Obtenemos los IDs de los documentos que existen en la BD para esta licitación
-        self.cursor.execute("SELECT id FROM documentos WHERE licitacion_id = ?", (licitacion_id,))
-        ids_en_db = {row[0] for row in self.cursor.fetchall()}
+        cols = self.COLS_DOCUMENTOS
+        # Estado actual en BD: id -> huella de las columnas guardadas
+        huellas_db = {
+            row[0]: self._huella_fila(row[1:])
+            for row in self._ejecutar(
+                f"SELECT id, {', '.join(cols)} FROM documentos WHERE licitacion_id = ?", (licitacion_id,)
+            )
+        }
         
         ids_en_memoria = {doc.id for doc in documentos_en_memoria if doc.id is not None}
 
         # 1. Documentos para BORRAR
-        ids_para_borrar = ids_en_db - ids_en_memoria
+        ids_para_borrar = huellas_db.keys() - ids_en_memoria
         if ids_para_borrar:
             placeholders = ",".join("?" * len(ids_para_borrar))
             # Importante: Borramos primero las fallas dependientes para evitar errores.
             self.cursor.execute(f"DELETE FROM descalificaciones_fase_a WHERE documento_id IN ({placeholders})", list(ids_para_borrar))
             self.cursor.execute(f"DELETE FROM documentos WHERE id IN ({placeholders})", list(ids_para_borrar))
 
-        # 2. Documentos para ACTUALIZAR o INSERTAR
-        
-        # --- INICIO DE LA CORRECCIÓN ---
-        # Añadimos 'requiere_subsanacion' a la lista de columnas que se guardan.
-        cols = ['codigo', 'nombre', 'categoria', 'comentario', 'presentado', 'subsanable',  
-                'ruta_archivo', 'responsable', 'revisado', 'obligatorio', 'orden_pliego',
-                'requiere_subsanacion']
-        # --- FIN DE LA CORRECCIÓN ---
-        
+        # 2. Documentos para ACTUALIZAR (solo si cambiaron) o INSERTAR
+        updates = []
+        sql_insert = self.sql.insert('documentos', ('licitacion_id',) + cols)
         for doc in documentos_en_memoria:
-            if doc.id in ids_en_db:
-                # Si el ID ya existe, es un UPDATE
-                update_sql = f"UPDATE documentos SET {', '.join(f'{c}=?' for c in cols)} WHERE id=?"
-                values = [getattr(doc, c, None) for c in cols] + [doc.id]
-                self.cursor.execute(update_sql, values)
+            values = [getattr(doc, c, None) for c in cols]
+            if doc.id in huellas_db:
+                if self._huella_fila(values) != huellas_db[doc.id]:
+                    updates.append(values + [doc.id])
             else:
-                # Si el ID es nuevo o no existe, es un INSERT
-                insert_cols = ['licitacion_id'] + cols
-                placeholders = ",".join("?" * len(insert_cols))
-                insert_sql = f"INSERT INTO documentos ({', '.join(insert_cols)}) VALUES ({placeholders})"
-                values = [licitacion_id] + [getattr(doc, c, None) for c in cols]
-                self.cursor.execute(insert_sql, values)
+                # Si el ID es nuevo o no existe, es un INSERT.
                 # Actualizamos el objeto en memoria con el nuevo ID generado por la BD.
-                doc.id = self.cursor.lastrowid
+                doc.id = self._ejecutar(sql_insert, [licitacion_id] + values).lastrowid
+        if updates:
+            self._ejecutar_muchos(self.sql.update_por_id('documentos', cols), updates)
 
 
     def get_empresas_maestras(self):
@@ -591,6 +1316,7 @@ class DatabaseManager:
                 rows
             )
             self.conn.commit()
+            self._tocar_licitacion(licitacion_id)
             return True
         except Exception as e:
             self.conn.rollback()
@@ -633,6 +1359,7 @@ class DatabaseManager:
                 empresa_nuestra = excluded.empresa_nuestra
         """, (licitacion_id, str(lote_numero), (ganador_nombre or ""), (empresa_nuestra or None)))
         self.conn.commit()
+        self._tocar_licitacion(licitacion_id)
         return True
 
 
@@ -643,6 +1370,7 @@ class DatabaseManager:
             (licitacion_id, str(lote_numero))
         )
         self.conn.commit()
+        self._tocar_licitacion(licitacion_id)
         return True
 
 
@@ -654,6 +1382,8 @@ class DatabaseManager:
         de que cada empresa exista en el catálogo 'empresas_maestras'
         para no violar la FK.
         """
+        manage_transaction = not self.conn.in_transaction
+
         # 1) normalizamos nombres
         empresas_norm = [(e or "").strip() for e in empresas if (e or "").strip()]
 
@@ -664,17 +1394,24 @@ class DatabaseManager:
                 (nombre,)
             )
 
-        # 3) borramos vínculos anteriores y creamos los nuevos
-        self.cursor.execute(
-            "DELETE FROM licitacion_empresas_nuestras WHERE licitacion_id = ?",
+        # 3) solo tocamos los vínculos que cambiaron
+        actuales = {r[0] for r in self.cursor.execute(
+            "SELECT empresa_nombre FROM licitacion_empresas_nuestras WHERE licitacion_id = ?",
             (licitacion_id,)
+        ).fetchall()}
+        deseadas = set(empresas_norm)
+        self.cursor.executemany(
+            "DELETE FROM licitacion_empresas_nuestras WHERE licitacion_id = ? AND empresa_nombre = ?",
+            [(licitacion_id, n) for n in actuales - deseadas]
         )
-        for nombre in empresas_norm:
-            self.cursor.execute(
-                "INSERT OR IGNORE INTO licitacion_empresas_nuestras (licitacion_id, empresa_nombre) VALUES (?, ?)",
-                (licitacion_id, nombre)
-            )
-        self.conn.commit()
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO licitacion_empresas_nuestras (licitacion_id, empresa_nombre) VALUES (?, ?)",
+            [(licitacion_id, n) for n in empresas_norm if n not in actuales]
+        )
+        # Dentro de save_licitacion el commit lo hace la transacción externa
+        if manage_transaction:
+            self.conn.commit()
+            self._tocar_licitacion(licitacion_id)
 
 
     def agregar_empresa_maestra(self, nombre: str):
@@ -698,14 +1435,259 @@ class DatabaseManager:
         """
         Recupera todas las licitaciones y TODAS sus entidades relacionadas,
         incluyendo las fallas de fase A.
+        Para listas/dashboards usar cargar_resumenes() o get_licitaciones_resumen(); para abrir
+        una sola licitación usar load_licitacion_full(id).
+        """
+        licitaciones = self._hidratar_licitaciones()
+        if not licitaciones:
+            return [], [], [], [], [], []
+        return licitaciones, *self.get_datos_maestros()
+
+    def get_datos_maestros(self):
+        """
+        Tablas maestras en el orden de get_all_data(): empresas, instituciones,
+        documentos, competidores y responsables (listas de dicts).
+        """
+        master_tables = ["empresas_maestras", "instituciones_maestras", "documentos_maestros", "competidores_maestros", "responsables_maestros"]
+        return [self._get_master_table(tbl) for tbl in master_tables]
+
+    def load_licitacion_full(self, licitacion_id: int):
+        """
+        Hidrata UNA licitación (lotes, documentos, oferentes, ganadores, fallas...)
+        con consultas indexadas por licitacion_id. Devuelve el mismo dict que
+        get_all_data() produce para esa licitación, o None si no existe.
+        """
+        licitaciones = self._hidratar_licitaciones(licitacion_id)
+        return licitaciones[0] if licitaciones else None
+
+    def get_licitacion_id_por_numero(self, numero_proceso: str):
+        """
+        Resuelve el id de una licitación por numero_proceso sin distinguir
+        mayúsculas ni espacios alrededor (columna numero_norm, indexada).
+        None si no existe.
+        """
+        numero = _normalizar_numero(numero_proceso)
+        if not numero:
+            return None
+        row = self._ejecutar("SELECT id FROM licitaciones WHERE numero_norm = ? LIMIT 1", (numero,)).fetchone()
+        return row[0] if row else None
+
+    def load_licitacion_full_por_numero(self, numero_proceso: str):
+        """Igual que load_licitacion_full() pero buscando por numero_proceso."""
+        lic_id = self.get_licitacion_id_por_numero(numero_proceso)
+        return self.load_licitacion_full(lic_id) if lic_id is not None else None
+
+    def get_licitaciones_resumen(self):
+        """
+        Resumen liviano para listas y dashboards: columnas de cabecera más
+        conteos y totales de lotes/documentos calculados en SQL, sin cargar
+        los hijos en memoria. Usa una conexión del pool de lectura, así que
+        puede llamarse desde un hilo de fondo.
+        """
+        with self.lector() as conn:
+            return self._leer_licitaciones_resumen(conn.cursor())
+
+    def _leer_licitaciones_resumen(self, cursor):
+        cursor.execute("""
+            SELECT
+                l.id, l.numero_proceso, l.nombre_proceso, l.institucion, l.estado,
+                l.fase_A_superada, l.fase_B_superada, l.adjudicada, l.adjudicada_a,
+                l.fecha_creacion, l.cronograma, l.docs_completos_manual, l.last_modified,
+                l.empresa_nuestra,
+                COALESCE(lo.cantidad_lotes, 0)            AS cantidad_lotes,
+                COALESCE(lo.monto_base_total, 0.0)        AS monto_base_total,
+                COALESCE(lo.monto_base_personal_total, 0.0) AS monto_base_personal_total,
+                COALESCE(lo.monto_ofertado_total, 0.0)    AS monto_ofertado_total,
+                COALESCE(d.cantidad_documentos, 0)        AS cantidad_documentos,
+                COALESCE(d.documentos_completados, 0)     AS documentos_completados,
+                COALESCE(g.lotes_ganados, 0)              AS lotes_ganados
+            FROM licitaciones l
+            LEFT JOIN (
+                SELECT licitacion_id,
+                       COUNT(*) AS cantidad_lotes,
+                       SUM(COALESCE(monto_base, 0.0)) AS monto_base_total,
+                       SUM(CASE WHEN COALESCE(monto_base_personal, 0.0) > 0
+                                THEN monto_base_personal ELSE COALESCE(monto_base, 0.0) END) AS monto_base_personal_total,
+                       SUM(COALESCE(monto_ofertado, 0.0)) AS monto_ofertado_total
+                FROM lotes GROUP BY licitacion_id
+            ) lo ON lo.licitacion_id = l.id
+            LEFT JOIN (
+                SELECT licitacion_id,
+                       COUNT(*) AS cantidad_documentos,
+                       SUM(CASE WHEN presentado AND NOT COALESCE(requiere_subsanacion, 0)
+                                THEN 1 ELSE 0 END) AS documentos_completados
+                FROM documentos GROUP BY licitacion_id
+            ) d ON d.licitacion_id = l.id
+            LEFT JOIN (
+                SELECT licitacion_id, COUNT(DISTINCT lote_numero) AS lotes_ganados
+                FROM licitacion_ganadores_lote
+                WHERE COALESCE(empresa_nuestra, '') <> ''
+                GROUP BY licitacion_id
+            ) g ON g.licitacion_id = l.id
+            ORDER BY l.id
+        """)
+        cols = [d[0] for d in cursor.description]
+        resumen = []
+        for row in cursor.fetchall():
+            r = dict(zip(cols, row))
+            try:
+                r["cronograma"] = json.loads(r.get("cronograma") or "{}")
+            except Exception:
+                r["cronograma"] = {}
+            r["empresas_nuestras"] = []
+            resumen.append(r)
+
+        # Empresas nuestras (tabla relacional, con fallback a la columna legada)
+        cursor.execute("SELECT licitacion_id, empresa_nombre FROM licitacion_empresas_nuestras")
+        emp_por_lic = {}
+        for lic_id, nombre in cursor.fetchall():
+            if nombre:
+                emp_por_lic.setdefault(lic_id, set()).add(nombre.strip())
+        for r in resumen:
+            nombres = emp_por_lic.get(r["id"], set())
+            legacy = r.pop("empresa_nuestra", None)
+            if not nombres and isinstance(legacy, str) and legacy:
+                nombres = {legacy}
+            r["empresas_nuestras"] = [{"nombre": n} for n in sorted(nombres)]
+        return resumen
+
+    def _leer_filas_licitaciones(self, licitacion_id=None):
+        """
+        Lee las filas crudas (tuplas) de las licitaciones y sus entidades
+        relacionadas. Sin argumento lee todas; con licitacion_id filtra cada
+        consulta con WHERE licitacion_id = ? (índices idx_*_licitacion_id).
+        Es la única lectura que usan _hidratar_licitaciones() (dicts) y
+        cargar_licitaciones() (modelos, vía FabricaModelos).
+        """
+        if licitacion_id is None:
+            where_lic, where_hijo, params = "", "", ()
+        else:
+            where_lic, where_hijo, params = " WHERE id = ?", " WHERE licitacion_id = ?", (licitacion_id,)
+        cur = self.conn.cursor()
+
+        # Columnas de table_info: deja fuera las generadas (numero_norm)
+        cols_cabecera = list(self.catalogo.columnas(cur, "licitaciones"))
+        cur.execute(f"SELECT {', '.join(cols_cabecera)} FROM licitaciones" + where_lic, params)
+        cabecera = cur.fetchall()
+        if not cabecera:
+            return None
+
+        cur.execute("SELECT licitacion_id, empresa_nombre FROM licitacion_empresas_nuestras" + where_hijo, params)
+        empresas = cur.fetchall()
+
+        lotes = self._leer_filas_lotes(cur, where_hijo, params)
+
+        cur.execute("SELECT * FROM documentos" + where_hijo, params)
+        cols_documentos = [d[0] for d in cur.description]
+        documentos = cur.fetchall()
+
+        cur.execute("SELECT * FROM bnb_evaluaciones" + where_hijo, params)
+        cols_bnb = [d[0] for d in cur.description]
+        bnb = cur.fetchall()
+
+        try:
+            cur.execute("SELECT id, licitacion_id, participante_nombre, documento_id, comentario, es_nuestro FROM descalificaciones_fase_a" + where_hijo, params)
+            fallas = cur.fetchall()
+        except sqlite3.OperationalError:
+            print("Advertencia: Tabla 'descalificaciones_fase_a' no encontrada durante la carga.")
+            fallas = []
+
+        cur.execute("SELECT o.id, o.licitacion_id, o.nombre, o.comentario, ol.lote_numero, ol.monto, ol.paso_fase_A FROM oferentes o LEFT JOIN ofertas_lote_oferentes ol ON o.id = ol.oferente_id" + where_hijo.replace("licitacion_id", "o.licitacion_id"), params)
+        ofertas = cur.fetchall()
+
+        ganadores = self._leer_filas_ganadores(cur, where_hijo, params)
+
+        return FilasLicitaciones(cols_cabecera, cabecera, empresas, lotes, cols_documentos, documentos,
+                                 cols_bnb, bnb, fallas, ofertas, ganadores)
+
+    def _leer_filas_lotes(self, cur, where_hijo="", params=()):
+        """Filas de lotes en el orden de COLS_FILA_LOTE (y de numero_orden dentro de cada licitación)."""
+        cols_lotes = self.catalogo.columnas(cur, "lotes")
+        cur.execute(
+            "SELECT id, licitacion_id, numero, nombre, monto_base, monto_base_personal, monto_ofertado, "
+            f"participamos, fase_A_superada, {'empresa_nuestra' if 'empresa_nuestra' in cols_lotes else 'NULL'} "
+            f"FROM lotes{where_hijo} ORDER BY licitacion_id, numero_orden, numero",
+            params
+        )
+        return cur.fetchall()
+
+    def _leer_filas_ganadores(self, cur, where_hijo="", params=()):
+        """Ganadores por lote: (licitacion_id, lote_numero, ganador_nombre, empresa_nuestra)."""
+        try:
+            cols_g = self.catalogo.columnas(cur, "licitacion_ganadores_lote")
+            if "empresa_nuestra" in cols_g:
+                cur.execute("SELECT licitacion_id, lote_numero, ganador_nombre, empresa_nuestra FROM licitacion_ganadores_lote" + where_hijo, params)
+                return cur.fetchall()
+            # Esquema viejo: es_nuestro (bool) -> empresa_nuestra = ganador_nombre
+            cur.execute("SELECT licitacion_id, lote_numero, ganador_nombre, es_nuestro FROM licitacion_ganadores_lote" + where_hijo, params)
+            return [(lic_id, lote, nombre, nombre if es_nuestro else None)
+                    for lic_id, lote, nombre, es_nuestro in cur.fetchall()]
+        except Exception:
+            return []
+
+    def _leer_filas_resumen(self, cur):
         """
+        Filas para las listas y dashboards: cabecera liviana, empresas, lotes
+        (sin ofertas) y ganadores, más los conteos de documentos calculados en
+        SQL. No lee documentos, oferentes, ofertas ni fallas.
+        """
+        cols_cabecera = [c for c in self.catalogo.columnas(cur, "licitaciones") if c in COLS_CABECERA_RESUMEN]
+        cur.execute(f"SELECT {', '.join(cols_cabecera)} FROM licitaciones ORDER BY id")
+        cabecera = cur.fetchall()
+        if not cabecera:
+            return None
+        cur.execute("SELECT licitacion_id, empresa_nombre FROM licitacion_empresas_nuestras")
+        empresas = cur.fetchall()
+        cur.execute("""
+            SELECT licitacion_id,
+                   COUNT(*),
+                   SUM(CASE WHEN presentado AND NOT COALESCE(requiere_subsanacion, 0) THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN COALESCE(requiere_subsanacion, 0) THEN 1 ELSE 0 END)
+            FROM documentos GROUP BY licitacion_id
+        """)
+        documentos = cur.fetchall()
+        return FilasResumen(cols_cabecera, cabecera, empresas, self._leer_filas_lotes(cur),
+                            documentos, self._leer_filas_ganadores(cur))
+
+    def cargar_resumenes(self, fabrica):
+        """
+        Filas de resumen (fabrica.resumen, ver fabrica_modelos.ResumenLicitacion)
+        de todas las licitaciones, en orden de id: lo que necesitan la lista
+        principal y los dashboards sin hidratar documentos ni oferentes. Usa
+        una conexión del pool de lectura.
+        """
+        with self.lector() as conn:
+            filas = self._leer_filas_resumen(conn.cursor())
+        return fabrica.construir_resumen(filas) if filas else []
+
+    def cargar_licitaciones(self, fabrica, licitacion_id=None):
+        """
+        Construye los modelos de licitación directamente desde las filas, sin
+        pasar por los dicts de get_all_data(). 'fabrica' es una FabricaModelos
+        con las clases de la interfaz que llama (Tk o PyQt). Sin licitacion_id
+        carga todas; los modelos vuelven con el seguimiento de cambios activo.
+        """
+        filas = self._leer_filas_licitaciones(licitacion_id)
+        return fabrica.construir(filas) if filas else []
+
+    def cargar_licitacion(self, fabrica, licitacion_id: int):
+        """Igual que cargar_licitaciones() para una sola licitación; None si no existe."""
+        modelos = self.cargar_licitaciones(fabrica, licitacion_id)
+        return modelos[0] if modelos else None
+
+    def _hidratar_licitaciones(self, licitacion_id=None):
+        """
+        Construye los dicts de licitación con todas sus entidades relacionadas
+        a partir de _leer_filas_licitaciones().
+        """
+        filas = self._leer_filas_licitaciones(licitacion_id)
+        if filas is None:
+            return []
+
         # === LICITACIONES ===
-        self.cursor.execute("SELECT * FROM licitaciones")
-        lic_cols = [d[0] for d in self.cursor.description]
         licitaciones_dict = {}
-
-        for row in self.cursor.fetchall():
-            lic = dict(zip(lic_cols, row)) 
+        for row in filas.cabecera:
+            lic = dict(zip(filas.cols_cabecera, row))
             lic_id = lic.get("id")
 
             legacy_company_name = None
@@ -727,13 +1709,9 @@ class DatabaseManager:
             })
             licitaciones_dict[lic_id] = lic
 
-        if not licitaciones_dict:
-            return [], [], [], [], [], []
-
         # === EMPRESAS NUESTRAS (Tabla nueva) ===
-        self.cursor.execute("SELECT licitacion_id, empresa_nombre FROM licitacion_empresas_nuestras")
         emp_por_lic = {}
-        for lic_id, nombre in self.cursor.fetchall():
+        for lic_id, nombre in filas.empresas:
             if nombre:
                 emp_por_lic.setdefault(lic_id, set()).add(nombre.strip())
 
@@ -747,49 +1725,35 @@ class DatabaseManager:
                 del lic["_legacy_company"]
         
         # === LOTES ===
-        cols_lotes = {r[1] for r in self.cursor.execute("PRAGMA table_info(lotes)").fetchall()}
-        tiene_emp_lote = "empresa_nuestra" in cols_lotes
-        self.cursor.execute(f"SELECT id, licitacion_id, numero, nombre, monto_base, monto_base_personal, monto_ofertado, participamos, fase_A_superada{', empresa_nuestra' if tiene_emp_lote else ''} FROM lotes ORDER BY CASE WHEN numero GLOB '*[0-9]*' THEN CAST(numero AS INTEGER) ELSE NULL END, numero")
-        lot_cols = [d[0] for d in self.cursor.description]
-        for row in self.cursor.fetchall():
-            l = dict(zip(lot_cols, row)); lic_id = l.get("licitacion_id")
+        for row in filas.lotes:
+            l = dict(zip(COLS_FILA_LOTE, row)); lic_id = l.get("licitacion_id")
             if lic_id not in licitaciones_dict: continue
             l["monto_base"] = float(l.get("monto_base") or 0.0); l["monto_base_personal"] = float(l.get("monto_base_personal") or 0.0); l["monto_ofertado"] = float(l.get("monto_ofertado") or 0.0)
             l["participamos"] = bool(l.get("participamos")); l["fase_A_superada"] = bool(l.get("fase_A_superada"))
-            if tiene_emp_lote: l["empresa_nuestra"] = (l.get("empresa_nuestra") or "").strip() or None
-            else: l["empresa_nuestra"] = None
+            l["empresa_nuestra"] = (l.get("empresa_nuestra") or "").strip() or None
             l.setdefault("ganador_nombre", ""); l.setdefault("ganado_por_nosotros", False)
             licitaciones_dict[lic_id]["lotes"].append(l)
 
         # === DOCUMENTOS ===
-        self.cursor.execute("SELECT * FROM documentos"); doc_cols = [d[0] for d in self.cursor.description]
-        for row in self.cursor.fetchall():
-            d = dict(zip(doc_cols, row)); lic_id = d.get("licitacion_id")
+        for row in filas.documentos:
+            d = dict(zip(filas.cols_documentos, row)); lic_id = d.get("licitacion_id")
             if lic_id in licitaciones_dict: licitaciones_dict[lic_id]["documentos_solicitados"].append(d)
 
         # === BNB EVALUACIONES ===
-        self.cursor.execute("SELECT * FROM bnb_evaluaciones"); bnb_cols = [d[0] for d in self.cursor.description]
-        for row in self.cursor.fetchall():
-            b = dict(zip(bnb_cols, row)); lic_id = b.get("licitacion_id")
+        for row in filas.bnb:
+            b = dict(zip(filas.cols_bnb, row)); lic_id = b.get("licitacion_id")
             if lic_id in licitaciones_dict: licitaciones_dict[lic_id]["bnb_evaluacion"].append(b)
 
-        # === FALLAS FASE A (BLOQUE CORREGIDO) ===
-        try:
-            self.cursor.execute("SELECT id, licitacion_id, participante_nombre, documento_id, comentario, es_nuestro FROM descalificaciones_fase_a")
-            dfa_cols = ['id', 'licitacion_id', 'participante_nombre', 'documento_id', 'comentario', 'es_nuestro']
-            for row in self.cursor.fetchall():
-                dfa = dict(zip(dfa_cols, row))
-                lic_id = dfa.get("licitacion_id")
-                if lic_id in licitaciones_dict:
-                    licitaciones_dict[lic_id]["fallas_fase_a"].append(dfa)
-        except sqlite3.OperationalError:
-            print("Advertencia: Tabla 'descalificaciones_fase_a' no encontrada durante la carga.")
-            pass
+        # === FALLAS FASE A ===
+        for row in filas.fallas:
+            dfa = dict(zip(COLS_FILA_FALLA, row))
+            lic_id = dfa.get("licitacion_id")
+            if lic_id in licitaciones_dict:
+                licitaciones_dict[lic_id]["fallas_fase_a"].append(dfa)
         
         # === OFERENTES Y OFERTAS ===
-        self.cursor.execute("SELECT o.id, o.licitacion_id, o.nombre, o.comentario, ol.lote_numero, ol.monto, ol.paso_fase_A FROM oferentes o LEFT JOIN ofertas_lote_oferentes ol ON o.id = ol.oferente_id")
         oferentes_temp = {}
-        for oferente_id, lic_id, nombre, comentario, lote_num, monto, paso_a in self.cursor.fetchall():
+        for oferente_id, lic_id, nombre, comentario, lote_num, monto, paso_a in filas.ofertas:
             if lic_id not in licitaciones_dict: continue
             if oferente_id not in oferentes_temp: oferentes_temp[oferente_id] = {"licitacion_id": lic_id, "nombre": nombre, "comentario": comentario, "ofertas_por_lote": []}
             if lote_num is not None: oferentes_temp[oferente_id]["ofertas_por_lote"].append({"lote_numero": lote_num, "monto": float(monto or 0.0), "paso_fase_A": bool(paso_a), "ganador": False})
@@ -798,109 +1762,121 @@ class DatabaseManager:
             if lic_id in licitaciones_dict: licitaciones_dict[lic_id]["oferentes_participantes"].append(ofr)
         
         # === GANADORES POR LOTE ===
-        try:
-            cols_g = {r[1] for r in self.cursor.execute("PRAGMA table_info(licitacion_ganadores_lote)").fetchall()}
-            if "empresa_nuestra" in cols_g: self.cursor.execute("SELECT licitacion_id, lote_numero, ganador_nombre, empresa_nuestra FROM licitacion_ganadores_lote"); ganador_rows = self.cursor.fetchall(); esquema = "nuevo"
-            else: self.cursor.execute("SELECT licitacion_id, lote_numero, ganador_nombre, es_nuestro FROM licitacion_ganadores_lote"); ganador_rows = self.cursor.fetchall(); esquema = "viejo"
-        except Exception: ganador_rows = []; esquema = "ninguno"
-        gan_por_lic = {}
-        if esquema == "nuevo":
-            for lic_id, lote_num, ganador_nombre, empresa_nuestra in ganador_rows:
-                gan_por_lic.setdefault(lic_id, []).append({
-                    "lote_numero": lote_num,
-                    "ganador_nombre": (ganador_nombre or "").strip(),
-                    "empresa_nuestra": (empresa_nuestra or "").strip()
-                })
+        self._propagar_ganadores(licitaciones_dict, filas.ganadores)
+
+        return list(licitaciones_dict.values())
+
+    @staticmethod
+    def _propagar_ganadores(licitaciones_dict, ganador_rows):
+        """
+        Vuelca licitacion_ganadores_lote sobre los dicts ya hidratados:
+        lote['ganador_nombre'], lote['ganado_por_nosotros'] y oferta['ganador'].
+        Los índices (licitacion_id, lote_numero) y (licitacion_id, oferente) se
+        construyen una sola vez, así que el costo es lineal en filas leídas.
+        ganador_rows: iterable de (licitacion_id, lote_numero, ganador_nombre, empresa_nuestra).
+        """
+        lotes_idx = {}
+        ofertas_idx = {}
         for lic_id, lic in licitaciones_dict.items():
-            if lic_id not in gan_por_lic: continue
-            for g in gan_por_lic[lic_id]:
-                loteno  = str(g.get("lote_numero"))
-                ganador = (g.get("ganador_nombre") or "").strip()
-                for L in lic["lotes"]:
-                    if str(L.get("numero")) != loteno: continue
-                    L["ganador_nombre"] = ganador
-                    if esquema == "nuevo":
-                        emp_n_row = (g.get("empresa_nuestra") or "").strip()
-                        emp_lote  = (L.get("empresa_nuestra") or "").strip()
-                        L["ganado_por_nosotros"] = bool(emp_n_row) or (emp_lote and ganador and ganador == emp_lote)
-                    else:
-                        es_nuestro = bool(g.get("es_nuestro"))
-                        if es_nuestro:
-                            L["ganado_por_nosotros"] = True
-                        else:
-                            emp_lote = (L.get("empresa_nuestra") or "").strip()
-                            L["ganado_por_nosotros"] = bool(emp_lote and ganador and ganador == emp_lote)
-                    break
-
-            for g in gan_por_lic[lic_id]:
-                loteno = str(g.get("lote_numero")); ganador = (g.get("ganador_nombre") or "").strip()
-                for comp in lic["oferentes_participantes"]:
-                    if comp.get("nombre") == ganador:
-                        for o in comp.get("ofertas_por_lote", []):
-                            if str(o.get("lote_numero")) == loteno: o["ganador"] = True
-                    else:
-                        for o in comp.get("ofertas_por_lote", []): o.setdefault("ganador", False)
-        
-        # === DATOS MAESTROS ===
-        master_tables = ["empresas_maestras", "instituciones_maestras", "documentos_maestros", "competidores_maestros", "responsables_maestros"]
-        master_data = [self._get_master_table(tbl) for tbl in master_tables]
-        return list(licitaciones_dict.values()), *master_data
+            for L in lic["lotes"]:
+                lotes_idx.setdefault((lic_id, str(L.get("numero"))), L)
+            for comp in lic["oferentes_participantes"]:
+                por_lote = ofertas_idx.setdefault((lic_id, (comp.get("nombre") or "").strip()), {})
+                for o in comp.get("ofertas_por_lote", []):
+                    o.setdefault("ganador", False)
+                    por_lote.setdefault(str(o.get("lote_numero")), []).append(o)
+
+        nuestras_por_lic = {}
+        for lic_id, lote_num, ganador_nombre, empresa_nuestra in ganador_rows:
+            lic = licitaciones_dict.get(lic_id)
+            if lic is None:
+                continue
+            loteno = str(lote_num)
+            ganador = (ganador_nombre or "").strip()
+
+            L = lotes_idx.get((lic_id, loteno))
+            if L is not None:
+                nuestras = nuestras_por_lic.get(lic_id)
+                if nuestras is None:
+                    nuestras = nuestras_por_lic[lic_id] = {e["nombre"] for e in lic["empresas_nuestras"]}
+                emp_n_row = (empresa_nuestra or "").strip()
+                emp_lote = (L.get("empresa_nuestra") or "").strip()
+                L["ganador_nombre"] = ganador
+                # Nuestro si la fila trae empresa_nuestra, si coincide con la empresa del
+                # lote o si el ganador es una de nuestras empresas en la licitación.
+                L["ganado_por_nosotros"] = bool(emp_n_row) or bool(emp_lote and ganador and ganador == emp_lote) or (ganador in nuestras)
+
+            for o in ofertas_idx.get((lic_id, ganador), {}).get(loteno, ()):
+                o["ganador"] = True
+
     def _get_master_table(self, table_name):
         self.cursor.execute(f'SELECT * FROM {table_name}')
         cols = [d[0] for d in self.cursor.description]
         return [dict(zip(cols, row)) for row in self.cursor.fetchall()]
 
+    # Columnas de cabecera de 'licitaciones' que escribe save_licitacion (sin last_modified).
+    COLS_CABECERA = ('nombre_proceso', 'numero_proceso', 'institucion', 'estado',
+                     'fase_A_superada', 'fase_B_superada', 'adjudicada', 'adjudicada_a',
+                     'motivo_descalificacion', 'fecha_creacion', 'cronograma',
+                     'docs_completos_manual', 'parametros_evaluacion')
+
+    @staticmethod
+    def _valor_cabecera(licitacion, col):
+        if col in ('cronograma', 'parametros_evaluacion'):
+            return json.dumps(getattr(licitacion, col, {}))
+        if col == 'fecha_creacion':
+            return str(licitacion.fecha_creacion)
+        return getattr(licitacion, col, None)
+
     def save_licitacion(self, licitacion):
             """
             Guarda una licitación y todos sus datos relacionados, con control
             de concurrencia 'suave' (un reintento si el timestamp cambió).
+
+            Si el modelo tiene el seguimiento de cambios activo (ver
+            seguimiento_cambios.SeguimientoCambios), solo se escriben las columnas
+            de cabecera y las listas hijas modificadas; sin cambios no se escribe nada.
             """
             is_new = not hasattr(licitacion, 'id') or not licitacion.id
             manage_transaction = not self.conn.in_transaction
 
+            # Qué hay que escribir: todo, salvo que el modelo sepa qué cambió
+            if not is_new and getattr(licitacion, 'seguimiento_activo', False):
+                sucios = licitacion.campos_sucios()
+                listas_sucias = {n for n in licitacion.LISTAS_HIJAS if licitacion.lista_sucia(n)}
+                if not sucios and not listas_sucias:
+                    return True
+            else:
+                sucios = set(self.COLS_CABECERA) | {'empresas_nuestras', 'fallas_fase_a'}
+                listas_sucias = {'lotes', 'documentos_solicitados', 'oferentes_participantes'}
+
             def _do_update():
                 new_timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%f')
                 
-                # Usamos el método to_dict() de la licitación para obtener todos los datos
-                lic_data_full = licitacion.to_dict()
-                print(f"DEBUG [Paso 2 - BD]: Guardando Parámetros -> {lic_data_full.get('parametros_evaluacion')}")
-
-                lic_data = {
-                    'nombre_proceso': lic_data_full.get('nombre_proceso'),
-                    'numero_proceso': lic_data_full.get('numero_proceso'),
-                    'institucion': lic_data_full.get('institucion'),
-                    'estado': lic_data_full.get('estado'),
-                    'fase_A_superada': lic_data_full.get('fase_A_superada'),
-                    'fase_B_superada': lic_data_full.get('fase_B_superada'),
-                    'adjudicada': lic_data_full.get('adjudicada'),
-                    'adjudicada_a': lic_data_full.get('adjudicada_a'),
-                    'motivo_descalificacion': lic_data_full.get('motivo_descalificacion'),
-                    'fecha_creacion': lic_data_full.get('fecha_creacion'),
-                    'cronograma': json.dumps(lic_data_full.get('cronograma', {})),
-                    'docs_completos_manual': lic_data_full.get('docs_completos_manual'),
-                    'last_modified': new_timestamp,
-                    # --- LÍNEA CORREGIDA ---
-                    # Toma los parámetros del objeto licitacion, no de self (DatabaseManager)
-                    "parametros_evaluacion": json.dumps(lic_data_full.get('parametros_evaluacion', {}))
-                }
+                if 'parametros_evaluacion' in sucios:
+                    print(f"DEBUG [Paso 2 - BD]: Guardando Parámetros -> {getattr(licitacion, 'parametros_evaluacion', None)}")
+
+                cols = [c for c in self.COLS_CABECERA if c in sucios] + ['last_modified']
+                valores = [self._valor_cabecera(licitacion, c) for c in cols[:-1]] + [new_timestamp]
 
                 if not is_new:
-                    licitacion_id = licitacion.id
-                    columns_to_update = ', '.join(f'{k}=?' for k in lic_data)
-                    self.cursor.execute(
-                        f"UPDATE licitaciones SET {columns_to_update} WHERE id=?",
-                        list(lic_data.values()) + [licitacion_id]
-                    )
+                    self._ejecutar(self.sql.update_por_id('licitaciones', cols), valores + [licitacion.id])
                 else:
-                    insert_query = f"INSERT INTO licitaciones ({', '.join(lic_data.keys())}) VALUES ({','.join('?'*len(lic_data))})"
-                    self.cursor.execute(insert_query, list(lic_data.values()))
-                    licitacion.id = self.cursor.lastrowid
+                    licitacion.id = self._ejecutar(self.sql.insert('licitaciones', cols), valores).lastrowid
 
                 licitacion.last_modified = new_timestamp
 
             try:
                 if manage_transaction:
                     self.cursor.execute('BEGIN IMMEDIATE TRANSACTION')
+                    seq_antes = self._ejecutar("SELECT COALESCE(MAX(seq), 0) FROM registro_cambios").fetchone()[0]
+                    # Un cambio de otra máquina aún no leído sobre esta licitación se perdería
+                    # del registro si pisamos su fila (una por tabla): entonces el guardado
+                    # no se anota como propio y el mapa de identidad la recarga.
+                    ajenos_sin_leer = not is_new and any(
+                        s not in self._seqs_propios for s, in self._ejecutar(
+                            "SELECT seq FROM registro_cambios WHERE licitacion_id = ? AND seq > ?",
+                            (licitacion.id, self._seq_leido)))
 
                 if not is_new:
                     # Control de concurrencia
@@ -915,38 +1891,31 @@ class DatabaseManager:
                 _do_update()
 
                 # ==== RELACIONADOS ====
-                self.save_empresas_nuestras(licitacion.id, [str(e) for e in licitacion.empresas_nuestras])
+                if 'empresas_nuestras' in sucios:
+                    self.save_empresas_nuestras(licitacion.id, [str(e) for e in licitacion.empresas_nuestras])
                 
-                self._save_related_data('lotes', licitacion.id, licitacion.lotes,
-                                        ['licitacion_id','numero','nombre','monto_base','monto_base_personal',
-                                        'monto_ofertado','participamos','fase_A_superada','empresa_nuestra'])
+                # Hijos: solo se escriben las filas que cambiaron (ver _sincronizar_filas)
+                if 'lotes' in listas_sucias:
+                    self._sincronizar_lotes(licitacion.id, licitacion.lotes)
                 
-                self._update_or_insert_documentos(licitacion.id, licitacion.documentos_solicitados)
+                if 'documentos_solicitados' in listas_sucias:
+                    self._update_or_insert_documentos(licitacion.id, licitacion.documentos_solicitados)
                 
-                self._save_related_data('descalificaciones_fase_a', licitacion.id, getattr(licitacion, 'fallas_fase_a', []),
-                                        ['licitacion_id','participante_nombre','documento_id','comentario','es_nuestro'])
+                if 'fallas_fase_a' in sucios:
+                    self._sincronizar_fallas_fase_a(licitacion.id, getattr(licitacion, 'fallas_fase_a', []))
 
-                self.cursor.execute('DELETE FROM oferentes WHERE licitacion_id = ?', (licitacion.id,))
-                if licitacion.oferentes_participantes:
-                    for oferente in licitacion.oferentes_participantes:
-                        self.cursor.execute(
-                            'INSERT INTO oferentes (licitacion_id, nombre, comentario) VALUES (?,?,?)',
-                            (licitacion.id, oferente.nombre, oferente.comentario)
-                        )
-                        oferente_id = self.cursor.lastrowid
-                        if getattr(oferente, 'ofertas_por_lote', None):
-                            ofertas_to_save = [
-                                (oferente_id, o['lote_numero'], o['monto'], o.get('paso_fase_A', True),
-                                o.get('plazo_entrega', 0), o.get('garantia_meses', 0))
-                                for o in oferente.ofertas_por_lote
-                            ]
-                            self.cursor.executemany(
-                                'INSERT INTO ofertas_lote_oferentes (oferente_id, lote_numero, monto, paso_fase_A, plazo_entrega, garantia_meses) VALUES (?,?,?,?,?,?)',
-                                ofertas_to_save
-                            )
+                if 'oferentes_participantes' in listas_sucias:
+                    self._sincronizar_oferentes(licitacion.id, licitacion.oferentes_participantes)
 
                 if manage_transaction:
+                    propios = [s for s, in self._ejecutar(
+                        "SELECT seq FROM registro_cambios WHERE seq > ?", (seq_antes,))]
                     self.conn.commit()
+                    if not ajenos_sin_leer:
+                        self._seqs_propios.update(propios)
+                    # Lo guardado pasa a ser el nuevo estado "limpio" (no si la transacción es ajena)
+                    if hasattr(licitacion, 'marcar_limpio'):
+                        licitacion.marcar_limpio()
 
                 return True
 
@@ -956,11 +1925,161 @@ class DatabaseManager:
                 raise e
 
 
+    # ---------- Diff de filas hijas (save_licitacion) ----------
+    @staticmethod
+    def _clave_diff(valores):
+        return tuple("" if v is None else str(v).strip() for v in valores)
+
+    def _sincronizar_filas(self, tabla, columnas, n_clave, existentes, nuevas, fijas, devolver_ids=False):
+        """
+        Lleva `tabla` al estado de `nuevas` emitiendo solo los INSERT/UPDATE/DELETE
+        necesarios, emparejando filas por su clave estable (las primeras `n_clave`
+        columnas; claves repetidas se emparejan en orden).
+
+        - columnas: columnas comparadas/escritas, clave primero.
+        - existentes: [(id, *valores)] leídos de la BD en el orden de `columnas`.
+        - nuevas: [tuple(valores)] desde memoria, mismo orden.
+        - fijas: {columna: valor} que se agregan en los INSERT (p.ej. licitacion_id).
+        Devuelve la lista de ids en el orden de `nuevas` (None para insertadas
+        salvo devolver_ids=True) y el conteo (insertadas, actualizadas, borradas).
+        """
+        por_clave = {}
+        for fila in existentes:
+            por_clave.setdefault(self._clave_diff(fila[1:1 + n_clave]), []).append(fila)
+
+        ids, inserts, updates = [], [], []
+        for valores in nuevas:
+            candidatos = por_clave.get(self._clave_diff(valores[:n_clave]))
+            if candidatos:
+                fila = candidatos.pop(0)
+                ids.append(fila[0])
+                if tuple(fila[1:]) != tuple(valores):
+                    updates.append(tuple(valores) + (fila[0],))
+            else:
+                ids.append(None)
+                inserts.append((len(ids) - 1, tuple(fijas.values()) + tuple(valores)))
+        borrar = [(fila[0],) for filas in por_clave.values() for fila in filas]
+
+        if borrar:
+            self._ejecutar_muchos(self.sql.delete_por_id(tabla), borrar)
+        if updates:
+            self._ejecutar_muchos(self.sql.update_por_id(tabla, columnas), updates)
+        if inserts:
+            sql_insert = self.sql.insert(tabla, tuple(fijas) + tuple(columnas))
+            if devolver_ids:
+                for pos, fila in inserts:
+                    ids[pos] = self._ejecutar(sql_insert, fila).lastrowid
+            else:
+                self._ejecutar_muchos(sql_insert, [fila for _, fila in inserts])
+        return ids, (len(inserts), len(updates), len(borrar))
+
+    @staticmethod
+    def _valor_item(item, col, default=None):
+        return item.get(col, default) if isinstance(item, dict) else getattr(item, col, default)
+
+    def _sincronizar_lotes(self, licitacion_id, lotes):
+        cols = ('numero', 'nombre', 'monto_base', 'monto_base_personal',
+                'monto_ofertado', 'participamos', 'fase_A_superada', 'empresa_nuestra')
+        existentes = self._ejecutar(
+            f"SELECT id, {', '.join(cols)} FROM lotes WHERE licitacion_id = ?", (licitacion_id,)
+        ).fetchall()
+        nuevas = [tuple(self._valor_item(l, c) for c in cols) for l in (lotes or [])]
+        return self._sincronizar_filas('lotes', cols, 1, existentes, nuevas, {'licitacion_id': licitacion_id})
+
+    def _sincronizar_fallas_fase_a(self, licitacion_id, fallas):
+        cols = ('participante_nombre', 'documento_id', 'comentario', 'es_nuestro')
+        existentes = self._ejecutar(
+            f"SELECT id, {', '.join(cols)} FROM descalificaciones_fase_a WHERE licitacion_id = ?", (licitacion_id,)
+        ).fetchall()
+        nuevas = [tuple(self._valor_item(f, c) for c in cols) for f in (fallas or [])]
+        return self._sincronizar_filas('descalificaciones_fase_a', cols, 2, existentes, nuevas,
+                                       {'licitacion_id': licitacion_id})
+
+    def _sincronizar_oferentes(self, licitacion_id, oferentes):
+        """Oferentes por nombre y sus ofertas por lote_numero; borrar un oferente borra sus ofertas (FK)."""
+        oferentes = oferentes or []
+        existentes = self._ejecutar(
+            "SELECT id, nombre, comentario FROM oferentes WHERE licitacion_id = ?", (licitacion_id,)
+        ).fetchall()
+        nuevas = [(self._valor_item(o, 'nombre'), self._valor_item(o, 'comentario')) for o in oferentes]
+        ids, conteo = self._sincronizar_filas('oferentes', ('nombre', 'comentario'), 1, existentes, nuevas,
+                                              {'licitacion_id': licitacion_id}, devolver_ids=True)
+
+        cols = ('lote_numero', 'monto', 'paso_fase_A', 'plazo_entrega', 'garantia_meses')
+        ofertas_db = {}
+        for fila in self._ejecutar("""
+            SELECT ol.oferente_id, ol.id, ol.lote_numero, ol.monto, ol.paso_fase_A, ol.plazo_entrega, ol.garantia_meses
+            FROM ofertas_lote_oferentes ol
+            JOIN oferentes o ON o.id = ol.oferente_id
+            WHERE o.licitacion_id = ?
+        """, (licitacion_id,)):
+            ofertas_db.setdefault(fila[0], []).append(fila[1:])
+
+        for oferente, oferente_id in zip(oferentes, ids):
+            ofertas = self._valor_item(oferente, 'ofertas_por_lote') or []
+            nuevas = [(o['lote_numero'], o['monto'], o.get('paso_fase_A', True),
+                       o.get('plazo_entrega', 0), o.get('garantia_meses', 0)) for o in ofertas]
+            self._sincronizar_filas('ofertas_lote_oferentes', cols, 1, ofertas_db.get(oferente_id, []), nuevas,
+                                    {'oferente_id': oferente_id})
+        return conteo
+
     def get_last_modified(self, licitacion_id: int):
-        self.cursor.execute('SELECT last_modified FROM licitaciones WHERE id=?', (licitacion_id,))
-        row = self.cursor.fetchone()
+        row = self._ejecutar('SELECT last_modified FROM licitaciones WHERE id=?', (licitacion_id,)).fetchone()
         return row[0] if row else None
 
+    def sondear_licitaciones(self, licitacion_id=None):
+        """
+        Sondeo barato para los mapas de identidad: [(id, last_modified)] de todas
+        las licitaciones (ordenadas por id) o solo de licitacion_id.
+        """
+        if licitacion_id is None:
+            return self._ejecutar('SELECT id, last_modified FROM licitaciones ORDER BY id').fetchall()
+        return self._ejecutar('SELECT id, last_modified FROM licitaciones WHERE id=?', (licitacion_id,)).fetchall()
+
+    def changes_since(self, seq: int = 0, solo_ajenos: bool = False):
+        """
+        Cambios registrados con seq > 'seq' (ver registro_cambios), hechos por
+        esta u otra máquina. Devuelve (ultimo_seq, {licitacion_id: {tabla: operacion}})
+        con la última operación por tabla; guardar ultimo_seq para el próximo
+        sondeo. Con seq=None no devuelve cambios, solo el seq actual.
+
+        Con solo_ajenos=True omite las filas escritas por save_licitacion desde
+        esta conexión (y las olvida: pensado para un único consumidor, el
+        MapaIdentidad de este manager).
+        """
+        if seq is None:
+            row = self._ejecutar("SELECT COALESCE(MAX(seq), 0) FROM registro_cambios").fetchone()
+            self._seq_leido = max(self._seq_leido, row[0])
+            return row[0], {}
+        cambios = {}
+        ultimo = seq
+        for s, lic_id, tabla, operacion in self._ejecutar(
+                "SELECT seq, licitacion_id, tabla, operacion FROM registro_cambios WHERE seq > ? ORDER BY seq", (seq,)):
+            ultimo = s
+            if solo_ajenos and s in self._seqs_propios:
+                continue
+            cambios.setdefault(lic_id, {})[tabla] = operacion
+        self._seq_leido = max(self._seq_leido, ultimo)
+        if solo_ajenos:
+            self._seqs_propios = {s for s in self._seqs_propios if s > ultimo}
+        return ultimo, cambios
+
+    def version_local(self, licitacion_id):
+        """Versión de las escrituras locales que no tocan last_modified (ver _tocar_licitacion)."""
+        return self._version_global, self._versiones_locales[licitacion_id]
+
+    def _tocar_licitacion(self, licitacion_id=None):
+        """
+        Registra que se modificaron filas de la licitación sin pasar por
+        save_licitacion (lotes, ganadores, orden de documentos...). Sin id,
+        invalida todas. No cambia last_modified para no disparar la
+        ConcurrencyException de quien tenga el modelo abierto.
+        """
+        if licitacion_id is None:
+            self._version_global += 1
+        else:
+            self._versiones_locales[licitacion_id] += 1
+
 
     def save_single_institucion(self, institucion_data):
         """Guarda o actualiza una sola institución en la tabla maestra."""
@@ -985,13 +2104,12 @@ class DatabaseManager:
 
     # ===== Helpers para ganadores por lote =====
     def get_ganadores_por_lote(self, licitacion_id: int):
-        self.cursor.execute("""
+        rows = self._ejecutar("""
             SELECT lote_numero, ganador_nombre, empresa_nuestra
             FROM licitacion_ganadores_lote
             WHERE licitacion_id = ?
-            ORDER BY CAST(lote_numero AS INTEGER)
-        """, (licitacion_id,))
-        rows = self.cursor.fetchall()
+            ORDER BY numero_orden, lote_numero
+        """, (licitacion_id,)).fetchall()
         return [
             {
                 "lote_numero": r[0],
@@ -1004,21 +2122,19 @@ class DatabaseManager:
 
 
     def ganador_de_competidor_en_licitacion(self, licitacion_id: int, competidor_nombre: str) -> bool:
-        self.cursor.execute("""
+        return self._ejecutar("""
             SELECT 1
             FROM licitacion_ganadores_lote
             WHERE licitacion_id = ? AND ganador_nombre = ?
             LIMIT 1
-        """, (licitacion_id, competidor_nombre))
-        return self.cursor.fetchone() is not None
+        """, (licitacion_id, competidor_nombre)).fetchone() is not None
 
     def cantidad_lotes_ganados_por_competidor(self, licitacion_id: int, competidor_nombre: str) -> int:
-        self.cursor.execute("""
+        row = self._ejecutar("""
             SELECT COUNT(*)
             FROM licitacion_ganadores_lote
             WHERE licitacion_id = ? AND ganador_nombre = ?
-        """, (licitacion_id, competidor_nombre))
-        row = self.cursor.fetchone()
+        """, (licitacion_id, competidor_nombre)).fetchone()
         return int(row[0]) if row else 0
 
 
@@ -1028,18 +2144,14 @@ class DatabaseManager:
 
     def _save_related_data(self, table_name, licitacion_id, data_list, columns):
         """Borra e inserta datos en tablas relacionadas."""
-        self.cursor.execute(f'DELETE FROM {table_name} WHERE licitacion_id = ?', (licitacion_id,))
+        self._ejecutar(self.sql.delete_por_licitacion(table_name), (licitacion_id,))
         if data_list:
             to_save = [
                 tuple(item.get(col) if isinstance(item, dict) else getattr(item, col) for col in columns[1:])
                 for item in data_list
             ]
             to_save_with_id = [(licitacion_id,) + row for row in to_save]
-            placeholders = ','.join('?' * len(columns))
-            self.cursor.executemany(
-                f'INSERT INTO {table_name} ({",".join(columns)}) VALUES ({placeholders})',
-                to_save_with_id
-            )
+            self._ejecutar_muchos(self.sql.insert(table_name, columns), to_save_with_id)
 
 
     def _save_master_table(self, table_name, data_list, columns, unique_cols, replace=False):
@@ -1051,7 +2163,7 @@ class DatabaseManager:
         - unique_cols: columnas que definen la clave única para ON CONFLICT.
         """
         if replace:
-            self.cursor.execute(f"DELETE FROM {table_name}")
+            self._ejecutar(self.sql.delete_todo(table_name))
 
         if not data_list:
             return
@@ -1065,26 +2177,7 @@ class DatabaseManager:
                     item = getattr(item, "__dict__", {})
             filas.append(tuple(item.get(c) for c in columns))
 
-        placeholders = ",".join("?" * len(columns))
-        cols_joined = ",".join(columns)
-        conflict_target = ",".join(unique_cols)
-
-        update_cols = [c for c in columns if c not in unique_cols]
-        if update_cols:
-            set_clause = ", ".join([f"{c}=excluded.{c}" for c in update_cols])
-            sql = f"""
-                INSERT INTO {table_name} ({cols_joined})
-                VALUES ({placeholders})
-                ON CONFLICT({conflict_target}) DO UPDATE SET
-                {set_clause}
-            """
-        else:
-            sql = f"""
-                INSERT INTO {table_name} ({cols_joined})
-                VALUES ({placeholders})
-                ON CONFLICT({conflict_target}) DO NOTHING
-            """
-        self.cursor.executemany(sql, filas)
+        self._ejecutar_muchos(self.sql.upsert(table_name, columns, unique_cols), filas)
 
 
     def save_master_lists(self, empresas, instituciones, documentos_maestros,
@@ -1207,6 +2300,7 @@ class DatabaseManager:
                 [(orden, doc_id, licitacion_id) for (doc_id, orden) in pares_docid_orden]
             )
             self.conn.commit()
+            self._tocar_licitacion(licitacion_id)
             return True
         except Exception as e:
             print("[ERROR] guardar_orden_documentos:", e)
@@ -1240,44 +2334,131 @@ class DatabaseManager:
             self.conn.rollback()
             return False
 
+    # ======================== DIAGNÓSTICO ========================
     def run_sanity_checks(self):
-        """Ejecuta chequeos de integridad en la base de datos."""
-        issues = {'orphans': {}, 'missing_indexes': []}
-        # 1. Huérfanos
-        orphan_checks = {
-            'lotes': ('id', 'licitacion_id', 'licitaciones'),
-            'documentos': ('id', 'licitacion_id', 'licitaciones'),
-            'oferentes': ('id', 'licitacion_id', 'licitaciones'),
-            'riesgos': ('id', 'licitacion_id', 'licitaciones'),
-            'ofertas_lote_oferentes': ('id', 'oferente_id', 'oferentes'),
-            # Caso especial para tablas sin columna 'id'
-            'kit_items': (['kit_id', 'documento_maestro_id'], 'kit_id', 'kits_de_requisitos')
-        }
-        for table, config in orphan_checks.items():
-            pk_column, fk_column, parent_table = config
-            select_col = "id" if isinstance(pk_column, str) else fk_column
-            query = f"""
-                SELECT t1.{select_col} FROM {table} AS t1
-                LEFT JOIN {parent_table} AS t2 ON t1.{fk_column} = t2.id
-                WHERE t2.id IS NULL
-            """
-            self.cursor.execute(query)
-            orphans = [row[0] for row in self.cursor.fetchall()]
-            if orphans:
-                issues['orphans'][table] = orphans
-
-        # 2. Índices faltantes
-        expected_indexes = {
-            'idx_lotes_licitacion_id': ('lotes', 'licitacion_id'),
-            'idx_documentos_licitacion_id': ('documentos', 'licitacion_id'),
+        """Chequeos rápidos de integridad (ver diagnosticar); bloquea hasta terminar."""
+        tarea = self.diagnosticar(en_segundo_plano=False)
+        if tarea.error is not None:
+            raise tarea.error
+        return tarea.resultado
+
+    def indices_esperados(self) -> dict:
+        """Índices que la app necesita: nombre -> (tabla, columnas)."""
+        return {
             'idx_oferentes_licitacion_id': ('oferentes', 'licitacion_id'),
-            'idx_riesgos_licitacion_id': ('riesgos', 'licitacion_id'),
-            'idx_ofertas_oferente_id': ('ofertas_lote_oferentes', 'oferente_id'),
+            **self.INDICES_COMPUESTOS,
+            **{indice: (tabla, f"licitacion_id, numero_orden, {col}")
+               for tabla, (col, indice) in self.ORDEN_LOTES.items()},
         }
-        for index_name, (table, column) in expected_indexes.items():
-            self.cursor.execute(f"PRAGMA index_list('{table}')")
-            if not any(index_name in idx for idx in self.cursor.fetchall()):
+
+    def clave_datos(self):
+        """
+        Identifica el contenido actual de la BD: cambia con cualquier commit
+        (PRAGMA data_version, para los de otras conexiones y procesos;
+        total_changes, para los de la escritora), con cambios de esquema
+        (schema_version) y al reabrir el archivo. Solo desde el hilo de la UI.
+        """
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        schema_version = self.conn.execute("PRAGMA schema_version").fetchone()[0]
+        return self.generacion, data_version, self.conn.total_changes, schema_version
+
+    def diagnosticar(self, completo=False, forzar=False, al_terminar=None, en_segundo_plano=True) -> TareaDiagnostico:
+        """
+        Diagnóstico por niveles en un lector del pool (no bloquea a la UI):
+
+        - rápido: PRAGMA quick_check, PRAGMA foreign_key_check tabla por tabla
+          (huérfanos de todas las FK declaradas, en una pasada por tabla) e
+          índices esperados en una sola lectura de sqlite_master.
+        - completo: igual pero con PRAGMA integrity_check (también verifica
+          que los índices coincidan con las tablas); es el que tarda.
+
+        El resultado se guarda contra clave_datos(): si la BD no cambió desde
+        el último diagnóstico del mismo nivel (o de uno completo), se devuelve
+        el guardado sin volver a leer la BD, salvo con forzar=True.
+        El resultado tiene el formato de siempre ('orphans' tabla -> rowids,
+        'missing_indexes'), más 'integridad' (líneas distintas de 'ok'),
+        'referencias_rotas' (FK sin CASCADE: se informan pero no se borran)
+        y 'nivel'.
+        """
+        tarea = TareaDiagnostico(completo)
+        clave = self.clave_datos()
+        for nivel in ((True,) if completo else (False, True)):
+            guardado = self._diagnosticos.get(nivel)
+            if not forzar and guardado is not None and guardado[0] == clave:
+                tarea.resultado, tarea.desde_cache, tarea.fraccion = guardado[1], True, 1.0
+                tarea.mensajes.append("Sin cambios en la BD desde el último diagnóstico: se muestra el anterior.")
+                tarea._hecho.set()
+                if al_terminar is not None:
+                    al_terminar(tarea)
+                return tarea
+
+        def _ejecutar():
+            try:
+                with self.lector() as conn:
+                    conn.set_progress_handler(lambda: tarea._cancelada, 10000)
+                    try:
+                        tarea.resultado = self._diagnosticar_en(conn, tarea)
+                    finally:
+                        conn.set_progress_handler(None, 0)
+                self._diagnosticos[completo] = (clave, tarea.resultado)
+            except Exception as e:
+                tarea.resultado = None
+                if tarea._cancelada:
+                    tarea.mensajes.append("Diagnóstico cancelado.")
+                else:
+                    tarea.error = e
+                    logging.warning(f"[DB] Falló el diagnóstico: {e}")
+            finally:
+                tarea._hecho.set()
+                if al_terminar is not None:
+                    al_terminar(tarea)
+
+        # Con ':memory:' el lector es la propia escritora: no se puede usar desde otro hilo
+        if en_segundo_plano and self.db_path != ":memory:":
+            threading.Thread(target=_ejecutar, name="db-diagnostico", daemon=True).start()
+        else:
+            _ejecutar()
+        return tarea
+
+    def _diagnosticar_en(self, conn, tarea):
+        issues = {'orphans': {}, 'missing_indexes': [], 'integridad': [], 'referencias_rotas': {},
+                  'nivel': 'completo' if tarea.completo else 'rapido'}
+
+        # 1. Integridad física
+        pragma = "integrity_check" if tarea.completo else "quick_check"
+        tarea.mensajes.append(f"Ejecutando PRAGMA {pragma}...")
+        issues['integridad'] = [r[0] for r in conn.execute(f"PRAGMA {pragma}(100)") if r[0] != "ok"]
+        tarea.mensajes.append(f"  {pragma}: " + ("ok" if not issues['integridad']
+                                                 else f"{len(issues['integridad'])} problema(s)"))
+        base = tarea.fraccion = 0.6 if tarea.completo else 0.4
+
+        # 2. Huérfanos: PRAGMA foreign_key_check en cada tabla con FK declaradas
+        tablas = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND sql LIKE '%REFERENCES%' ORDER BY name")]
+        for i, tabla in enumerate(tablas, 1):
+            cascada = {r[0] for r in conn.execute(f"PRAGMA foreign_key_list('{tabla}')") if r[6] == "CASCADE"}
+            huerfanos, rotas = [], 0
+            for _, rowid, _, fkid in conn.execute(f"PRAGMA foreign_key_check('{tabla}')"):
+                if fkid in cascada and rowid is not None:
+                    huerfanos.append(rowid)
+                else:
+                    rotas += 1
+            if huerfanos:
+                # Una fila puede violar más de una FK
+                issues['orphans'][tabla] = sorted(set(huerfanos))
+                tarea.mensajes.append(f"  {tabla}: {len(issues['orphans'][tabla])} registro(s) huérfano(s)")
+            if rotas:
+                issues['referencias_rotas'][tabla] = rotas
+            tarea.fraccion = base + (0.95 - base) * i / len(tablas)
+        tarea.mensajes.append(f"Claves foráneas revisadas en {len(tablas)} tablas.")
+
+        # 3. Índices faltantes, en una sola lectura del catálogo
+        existentes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        for index_name, (table, column) in self.indices_esperados().items():
+            if index_name not in existentes:
                 issues['missing_indexes'].append({'name': index_name, 'table': table, 'column': column})
+        tarea.mensajes.append("Índices revisados.")
+        tarea.fraccion = 1.0
         return issues
 
     def begin_transaction(self):
@@ -1297,10 +2478,12 @@ class DatabaseManager:
         try:
             # 1. Reparar huérfanos
             if issues.get('orphans'):
+                # ids = rowids que devolvió PRAGMA foreign_key_check (sirve también para kit_items)
                 for table, ids in issues['orphans'].items():
-                    delete_column = 'kit_id' if table == 'kit_items' else 'id'
-                    placeholders = ','.join('?' for _ in ids)
-                    self.cursor.execute(f"DELETE FROM {table} WHERE {delete_column} IN ({placeholders})", ids)
+                    for i in range(0, len(ids), 500):
+                        bloque = ids[i:i + 500]
+                        self.cursor.execute(
+                            f"DELETE FROM {table} WHERE rowid IN ({','.join('?' * len(bloque))})", bloque)
                     report.append(f"  - Se eliminaron {len(ids)} registros huérfanos de la tabla '{table}'.")
             # 2. Crear índices faltantes
             if issues.get('missing_indexes'):
@@ -1316,93 +2499,305 @@ class DatabaseManager:
 
     def get_setting(self, clave, default=None):
         """Obtiene un valor de la tabla de configuración."""
-        self.cursor.execute("SELECT valor FROM config_app WHERE clave = ?", (clave,))
-        result = self.cursor.fetchone()
+        result = self._ejecutar("SELECT valor FROM config_app WHERE clave = ?", (clave,)).fetchone()
         return result[0] if result else default
 
     def set_setting(self, clave, valor):
         """Guarda o actualiza un valor en la tabla de configuración."""
-        self.cursor.execute("INSERT OR REPLACE INTO config_app (clave, valor) VALUES (?, ?)", (clave, valor))
+        self._ejecutar("INSERT OR REPLACE INTO config_app (clave, valor) VALUES (?, ?)", (clave, valor))
         self.conn.commit()
 
     def close(self):
+        self._cerrar_lectores()
         if self.conn:
+            self.checkpoint()
             self.conn.close()
 
+    def reemplazar_archivo(self, candidato):
+        """
+        Pone 'candidato' (una copia ya validada, en la misma carpeta que la BD)
+        en lugar del archivo de la BD y reabre en caliente: cierra la escritora
+        y el pool de lectura, borra -wal/-shm (un WAL viejo aplicado sobre el
+        archivo nuevo lo corrompería), renombra de forma atómica y vuelve a
+        abrir con migraciones y perfil. El objeto sigue siendo el mismo, así
+        que las ventanas que guardan 'db' no necesitan reconectarse; sube
+        self.generacion y todas las versiones locales.
+        """
+        if self.db_path == ":memory:":
+            raise ValueError("Una BD en memoria no se puede reemplazar por un archivo.")
+        if self._fts_thread is not None:
+            self._fts_thread.join(timeout=30)
+            if self._fts_thread.is_alive():
+                raise RuntimeError("El índice FTS todavía se está poblando; reintente en unos segundos.")
+        self.close()
+        try:
+            for sufijo in ("-wal", "-shm"):
+                if os.path.exists(self.db_path + sufijo):
+                    os.remove(self.db_path + sufijo)
+            os.replace(candidato, self.db_path)
+        finally:
+            # Con el archivo nuevo o, si el renombre falló, con el original
+            self._abrir()
+            self.generacion += 1
+            self._version_global += 1
+            self._versiones_locales.clear()
+            self._seqs_propios.clear()
+            self._seq_leido = 0
+
+    # ======================== POOL DE LECTURA ========================
+    @contextmanager
+    def lector(self):
+        """
+        Presta una conexión de solo lectura (URI mode=ro) del pool, utilizable
+        desde cualquier hilo: dashboards, reportes y búsquedas pueden correr en
+        un worker sin pisar self.cursor ni bloquear la conexión escritora.
+
+            with db.lector() as conn:
+                filas = conn.execute("SELECT ...").fetchall()
+
+        Si ya hay MAX_LECTORES prestados, espera a que se libere uno.
+        Con ':memory:' no hay archivo que compartir y se presta self.conn.
+        """
+        if self.db_path == ":memory:":
+            yield self.conn
+            return
+        pool = self._lectores
+        conn = self._tomar_lector()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if pool is self._lectores:
+                pool.put(conn)
+            else:
+                conn.close()  # la BD se reabrió mientras estaba prestado (ver reemplazar_archivo)
+
+    def _tomar_lector(self):
+        try:
+            return self._lectores.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lectores_lock:
+            abrir = self._lectores_abiertos < self.MAX_LECTORES
+            if abrir:
+                self._lectores_abiertos += 1
+        if not abrir:
+            return self._lectores.get()
+        try:
+            return self._abrir_lector()
+        except Exception:
+            with self._lectores_lock:
+                self._lectores_abiertos -= 1
+            raise
+
+    def _abrir_lector(self):
+        ruta = urllib.request.pathname2url(os.path.abspath(self.db_path))
+        conn = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True, timeout=30,
+                               check_same_thread=False, cached_statements=CACHE_SENTENCIAS)
+        # Mismos ajustes de memoria que la escritora; journal_mode/synchronous son de escritura
+        for pragma, valor in PERFILES_CONEXION.get(self.perfil_conexion, ()):
+            if pragma in ("cache_size", "mmap_size", "temp_store"):
+                conn.execute(f"PRAGMA {pragma} = {valor}")
+        return conn
+
+    def _cerrar_lectores(self):
+        """Cierra los lectores libres; uno prestado vuelve al pool al salir de su bloque with."""
+        while True:
+            try:
+                conn = self._lectores.get_nowait()
+            except queue.Empty:
+                break
+            with self._lectores_lock:
+                self._lectores_abiertos -= 1
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    # ======================== SENTENCIAS E INSTRUMENTACIÓN ========================
+    def _ejecutar(self, sql, params=()):
+        """Ejecuta en la conexión escritora y devuelve un cursor nuevo (no comparte self.cursor)."""
+        return self.conn.execute(sql, params)
+
+    def _ejecutar_muchos(self, sql, filas):
+        return self.conn.executemany(sql, filas)
+
+    def instrumentar(self, activo: bool = True):
+        """
+        Activa/desactiva el conteo de sentencias ejecutadas por método público
+        (ver conteo_sentencias). Usa el trace callback de sqlite3, así que cuenta
+        también las llamadas que aún usan self.cursor; las sentencias internas
+        de los triggers no se cuentan. Pensado para diagnóstico: tiene costo.
+        """
+        self.conn.set_trace_callback(self._contar_sentencia if activo else None)
+
+    def _contar_sentencia(self, sql):
+        if sql.startswith("--"):  # sentencia de un trigger
+            return
+        # Atribuye la sentencia al método público más externo de este manager
+        metodo = "<directo>"
+        frame = sys._getframe(1)
+        while frame is not None:
+            if frame.f_locals.get("self") is self and not frame.f_code.co_name.startswith("_"):
+                metodo = frame.f_code.co_name
+            frame = frame.f_back
+        self.conteo_sentencias[metodo] += 1
+
+    def estadisticas_sentencias(self, reiniciar: bool = False):
+        """Devuelve [(método, ejecuciones), ...] de mayor a menor."""
+        datos = self.conteo_sentencias.most_common()
+        if reiniciar:
+            self.conteo_sentencias.clear()
+        return datos
+
+    # ======================== PERFIL DE CONEXIÓN ========================
+    def aplicar_perfil_conexion(self, perfil: str) -> str:
+        """
+        Aplica los PRAGMAs del perfil de entorno (ver PERFILES_CONEXION) a la
+        conexión abierta. Un perfil desconocido cae en PERFIL_LOCAL.
+        Devuelve el perfil efectivamente aplicado.
+        """
+        if perfil not in PERFILES_CONEXION:
+            perfil = PERFIL_LOCAL
+        if self.db_path == ":memory:":
+            self.perfil_conexion = perfil
+            return perfil
+
+        for pragma, valor in PERFILES_CONEXION[perfil]:
+            try:
+                if pragma == "journal_mode":
+                    if valor != "WAL":
+                        # Vaciar el WAL antes de salir de él: el .db queda autocontenido
+                        self.checkpoint()
+                    modo = self.conn.execute(f"PRAGMA journal_mode = {valor}").fetchone()[0]
+                    if modo.upper() != valor:
+                        logging.warning(f"[DB] journal_mode solicitado {valor}, vigente {modo}.")
+                else:
+                    self.conn.execute(f"PRAGMA {pragma} = {valor}")
+            except sqlite3.Error as e:
+                # p.ej. otra conexión tiene la BD abierta y no se puede cambiar journal_mode
+                logging.warning(f"[DB] No se pudo aplicar PRAGMA {pragma} = {valor}: {e}")
+        self.perfil_conexion = perfil
+        self._cerrar_lectores()  # los próximos lectores se abren con el perfil nuevo
+        return perfil
+
+    def checkpoint(self) -> bool:
+        """
+        Vuelca el WAL al archivo principal y lo trunca (sin efecto fuera de WAL).
+        Llamar antes de copiar el .db o de que una carpeta sincronizada lo suba.
+        """
+        try:
+            busy, _, _ = self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            return busy == 0
+        except sqlite3.Error as e:
+            logging.warning(f"[DB] No se pudo hacer checkpoint del WAL: {e}")
+            return False
+
     # ======================== FTS ========================
-    def setup_fts(self):
-        # 1) Limpia triggers antiguos
-        for trigger_name in [
-            'licitaciones_after_insert', 'licitaciones_after_delete', 'licitaciones_after_update',
-            'documentos_after_insert', 'documentos_after_delete', 'documentos_after_update'
-        ]:
-            self.cursor.execute(f"DROP TRIGGER IF EXISTS {trigger_name};")
-
-        # 2) Asegura el esquema correcto del FTS
-        self.cursor.execute("DROP TABLE IF EXISTS fts_licitaciones;")
-        self.cursor.execute("DROP TABLE IF EXISTS fts_documentos;")
-
-        # 3) FTS licitaciones (usa rowid = id)
-        self.cursor.execute('''
-            CREATE VIRTUAL TABLE fts_licitaciones USING fts5(
-                numero_proceso,
-                nombre_proceso,
-                institucion,
-                motivo_descalificacion,
-                content='licitaciones',
-                content_rowid='id'
-            );
-        ''')
+    def setup_fts(self, force: bool = False) -> bool:
+        """
+        Crea las tablas FTS5 y sus triggers solo cuando la versión guardada en
+        config_app ('fts_schema_version') no coincide con FTS_SCHEMA_VERSION,
+        o si force=True. Devuelve True si (re)creó el esquema; en ese caso el
+        índice queda vacío hasta que se pueble (ver _asegurar_fts_poblado).
+        """
+        version = str(FTS_SCHEMA_VERSION)
+        manage_transaction = not self.conn.in_transaction
+        if (not force
+                and self.get_setting('fts_schema_version') == version
+                and self._table_exists('fts_licitaciones')
+                and self._table_exists('fts_documentos')):
+            return False
 
-        # Triggers licitaciones
-        self.cursor.execute('''
-            CREATE TRIGGER licitaciones_after_insert AFTER INSERT ON licitaciones BEGIN
-                INSERT OR IGNORE INTO fts_licitaciones(rowid, numero_proceso, nombre_proceso, institucion, motivo_descalificacion)
-                VALUES (new.id, new.numero_proceso, new.nombre_proceso, new.institucion, new.motivo_descalificacion);
-            END;
-        ''')
-        self.cursor.execute('''
-            CREATE TRIGGER licitaciones_after_update AFTER UPDATE ON licitaciones BEGIN
-                INSERT OR REPLACE INTO fts_licitaciones(rowid, numero_proceso, nombre_proceso, institucion, motivo_descalificacion)
-                VALUES (new.id, new.numero_proceso, new.nombre_proceso, new.institucion, new.motivo_descalificacion);
-            END;
-        ''')
-        self.cursor.execute('''
-            CREATE TRIGGER licitaciones_after_delete AFTER DELETE ON licitaciones BEGIN
-                DELETE FROM fts_licitaciones WHERE rowid = old.id;
-            END;
-        ''')
+        # 1) Limpia triggers antiguos y una reconstrucción que hubiera quedado a medias
+        for _, tabla, _ in FTS_INDICES:
+            for evento in ("insert", "update", "delete"):
+                self.cursor.execute(f"DROP TRIGGER IF EXISTS {tabla}_after_{evento};")
+        _limpiar_reconstruccion_fts(self.conn)
 
-        # 4) FTS documentos (sin columnas inexistentes; usaremos JOIN para IDs)
-        self.cursor.execute('''
-            CREATE VIRTUAL TABLE fts_documentos USING fts5(
-                codigo,
-                nombre,
-                comentario,
-                content='documentos',
-                content_rowid='id'
-            );
-        ''')
+        # 2) Tablas FTS (rowid = id de licitaciones/documentos; en documentos
+        #    los ids reales se obtienen con JOIN) y sus triggers
+        for nombre, tabla, cols in FTS_INDICES:
+            self.cursor.execute(f"DROP TABLE IF EXISTS {nombre};")
+            self.cursor.execute(_sql_crear_fts(nombre, tabla, cols))
+            for sql in _sql_triggers_fts(nombre, tabla, cols, tabla):
+                self.cursor.execute(sql)
 
-        # Triggers documentos
-        self.cursor.execute('''
-            CREATE TRIGGER documentos_after_insert AFTER INSERT ON documentos BEGIN
-                INSERT OR IGNORE INTO fts_documentos(rowid, codigo, nombre, comentario)
-                VALUES (new.id, new.codigo, new.nombre, COALESCE(new.comentario, ''));
-            END;
-        ''')
-        self.cursor.execute('''
-            CREATE TRIGGER documentos_after_update AFTER UPDATE ON documentos BEGIN
-                INSERT OR REPLACE INTO fts_documentos(rowid, codigo, nombre, comentario)
-                VALUES (new.id, new.codigo, new.nombre, COALESCE(new.comentario, ''));
-            END;
-        ''')
-        self.cursor.execute('''
-            CREATE TRIGGER documentos_after_delete AFTER DELETE ON documentos BEGIN
-                DELETE FROM fts_documentos WHERE rowid = old.id;
-            END;
-        ''')
-        self.conn.commit()
+        self.catalogo.invalidar()
+
+        # 3) Versión del esquema FTS; el índice nuevo todavía no está poblado
+        self.cursor.execute(
+            "INSERT OR REPLACE INTO config_app (clave, valor) VALUES ('fts_schema_version', ?)", (version,)
+        )
+        self.cursor.execute("DELETE FROM config_app WHERE clave = 'fts_poblado_version'")
+        if manage_transaction:
+            self.conn.commit()
+        return True
+
+    def _asegurar_fts_poblado(self, en_segundo_plano: bool = True):
+        """
+        Si el índice FTS de la versión actual no se ha poblado (primera creación)
+        o quedó una reconstrucción a medias, la lanza o la retoma (ver
+        reconstruir_fts). Por defecto en segundo plano para no frenar el
+        arranque; a partir de ahí los triggers lo mantienen al día.
+        """
+        pendiente = self._ejecutar(
+            "SELECT 1 FROM config_app WHERE clave LIKE 'fts_cursor_%' LIMIT 1").fetchone() is not None
+        if self.get_setting('fts_poblado_version') == str(FTS_SCHEMA_VERSION) and not pendiente:
+            return
+        self.reconstruir_fts(en_segundo_plano=en_segundo_plano)
+
+    @property
+    def reconstruyendo_fts(self) -> bool:
+        """True mientras hay una reconstrucción FTS en segundo plano."""
+        return self._fts_thread is not None and self._fts_thread.is_alive()
+
+    def reconstruir_fts(self, al_progresar=None, al_terminar=None, en_segundo_plano: bool = True):
+        """
+        Reconstruye fts_licitaciones y fts_documentos por tandas de ids en
+        tablas sombra y las intercambia al final (ver _reconstruir_fts): la
+        búsqueda sigue usando el índice viejo y los escritores solo esperan
+        lo que dura una tanda. Si se interrumpe, el próximo arranque la retoma.
+
+        - al_progresar(hechas, total) y al_terminar(ok, detalle) se llaman desde
+          el hilo que reconstruye (detalle: filas indexadas o el mensaje de error).
+        - En segundo plano usa su propia conexión y devuelve el hilo (el mismo
+          si ya había una reconstrucción en curso); si no, devuelve (ok, detalle).
+        """
+        version = str(FTS_SCHEMA_VERSION)
+
+        def _ejecutar(conn):
+            try:
+                ok, detalle = True, _reconstruir_fts(conn, version, al_progresar)
+            except Exception as e:
+                ok, detalle = False, str(e)
+                logging.warning(f"[DB] No se pudo reconstruir el índice FTS: {e}")
+            self.catalogo.invalidar()
+            if al_terminar is not None:
+                al_terminar(ok, detalle)
+            return ok, detalle
+
+        if not en_segundo_plano or self.db_path == ":memory:":
+            return _ejecutar(self.conn)
+        if self._fts_thread is not None and self._fts_thread.is_alive():
+            return self._fts_thread
+
+        def _worker(db_path):
+            try:
+                conn = sqlite3.connect(db_path, timeout=30)
+            except sqlite3.Error as e:
+                logging.warning(f"[DB] No se pudo abrir la conexión para reconstruir el índice FTS: {e}")
+                return
+            try:
+                _ejecutar(conn)
+            finally:
+                conn.close()
+
+        self._fts_thread = threading.Thread(target=_worker, args=(self.db_path,), name="fts-reconstruccion",
+                                            daemon=True)
+        self._fts_thread.start()
+        return self._fts_thread
 
 
     def set_busy_timeout(self, seconds: int):
@@ -1454,58 +2849,25 @@ class DatabaseManager:
             ORDER BY rank
         """
 
-        self.cursor.execute(final_query, (query_term, query_term))
+        with self.lector() as conn:
+            filas = conn.execute(final_query, (query_term, query_term)).fetchall()
         cols = ['tipo', 'contexto', 'referencia', 'licitacion_id', 'documento_id']
-        return [dict(zip(cols, row)) for row in self.cursor.fetchall()]
+        return [dict(zip(cols, row)) for row in filas]
 
 
     def integrity_check(self):
-        """Ejecuta PRAGMA integrity_check y devuelve (ok: bool, mensaje: str)."""
-        try:
-            self.cursor.execute("PRAGMA integrity_check;")
-            res = self.cursor.fetchone()
-            msg = res[0] if res else "sin respuesta"
-            return (msg == "ok"), msg
-        except Exception as e:
-            return False, f"Error en integrity_check: {e}"
+        """Diagnóstico completo (ver diagnosticar) y devuelve (ok: bool, mensaje: str)."""
+        tarea = self.diagnosticar(completo=True, en_segundo_plano=False)
+        if tarea.error is not None:
+            return False, f"Error en integrity_check: {tarea.error}"
+        problemas = tarea.resultado['integridad']
+        return not problemas, "ok" if not problemas else "\n".join(problemas)
 
     def rebuild_fts_index(self):
-        """Reconstruye FTS evitando tocar estructuras dañadas."""
-        try:
-            # Transacción
-            self.cursor.execute("BEGIN IMMEDIATE TRANSACTION;")
-
-            # Elimina por completo las tablas FTS y recrea todo el esquema/trigger
-            self.cursor.execute("DROP TABLE IF EXISTS fts_licitaciones;")
-            self.cursor.execute("DROP TABLE IF EXISTS fts_documentos;")
-            self.setup_fts()
-
-            # Relleno vía comando especial 'rebuild' (si falla, fallback manual)
-            try:
-                self.cursor.execute("INSERT INTO fts_licitaciones(fts_licitaciones) VALUES('rebuild');")
-                self.cursor.execute("INSERT INTO fts_documentos(fts_documentos) VALUES('rebuild');")
-            except Exception:
-                self.cursor.execute('''
-                    INSERT INTO fts_licitaciones(rowid, numero_proceso, nombre_proceso, institucion, motivo_descalificacion)
-                    SELECT id, numero_proceso, nombre_proceso, institucion, COALESCE(motivo_descalificacion,'')
-                    FROM licitaciones;
-                ''')
-                self.cursor.execute('''
-                    INSERT INTO fts_documentos(rowid, codigo, nombre, comentario)
-                    SELECT id, COALESCE(codigo,''), COALESCE(nombre,''), COALESCE(comentario,'')
-                    FROM documentos;
-                ''')
-
-            self.conn.commit()
-            # Conteo
-            self.cursor.execute("SELECT count(*) FROM fts_licitaciones;")
-            c1 = self.cursor.fetchone()[0]
-            self.cursor.execute("SELECT count(*) FROM fts_documentos;")
-            c2 = self.cursor.fetchone()[0]
-            return True, c1 + c2
-        except Exception as e:
-            self.conn.rollback()
-            return False, str(e)
+        """Reconstruye FTS (ver reconstruir_fts) esperando a que termine; devuelve (ok, filas | error)."""
+        if self._fts_thread is not None and self._fts_thread.is_alive():
+            self._fts_thread.join()
+        return self.reconstruir_fts(en_segundo_plano=False)
 
     def eliminar_falla_por_campos(self, institucion, participante, documento):
         """
@@ -1528,6 +2890,7 @@ class DatabaseManager:
         """
         cur = self.conn.execute(sql, (institucion, participante, documento, institucion))
         self.conn.commit()
+        self._tocar_licitacion()  # puede afectar varias licitaciones de la institución
         return cur.rowcount
 
 
@@ -1572,7 +2935,8 @@ class DatabaseManager:
             CREATE INDEX IF NOT EXISTS idx_fallas_by_lic_doc_part
             ON descalificaciones_fase_a(licitacion_id, documento_id, participante_nombre)
         """)
-        self.conn.commit()
+        if not self.conn.in_transaction:
+            self.conn.commit()
 
 
     # ===== FIN BLOQUE =====
@@ -1660,84 +3024,105 @@ class DatabaseManager:
     def existe_evento_subsanacion_pendiente(self, licitacion_id, documento_id):
         """Verifica si ya existe un evento de subsanación pendiente para un documento específico."""
         sql = "SELECT 1 FROM subsanacion_historial WHERE licitacion_id = ? AND documento_id = ? AND estado = 'Pendiente' LIMIT 1"
-        self.cursor.execute(sql, (licitacion_id, documento_id))
-        return self.cursor.fetchone() is not None
+        return self._ejecutar(sql, (licitacion_id, documento_id)).fetchone() is not None
     
 
     def backfill_empresa_nuestra_en_ganadores(self):
         """
-        Completa empresa_nuestra en licitacion_ganadores_lote cuando esté NULL,
-        normaliza 'ganador_nombre' y usa la tabla/columna REAL de empresas_nuestras.
+        Completa empresa_nuestra en licitacion_ganadores_lote cuando esté NULL
+        y normaliza 'ganador_nombre', comparando contra licitacion_empresas_nuestras.
         Retorna tupla: (normalizados, exactos, por_coincidencia)
         """
-        # 0) Normalizar strings comunes en ganador_nombre
+        # 0) Normalizar strings comunes en ganador_nombre (candidatos por tokens_ganadores)
         cur1 = self.conn.execute("""
             UPDATE licitacion_ganadores_lote
             SET ganador_nombre = TRIM(REPLACE(ganador_nombre, ' (Nuestra Oferta)', ''))
-            WHERE ganador_nombre LIKE '%(Nuestra Oferta)%'
+            WHERE (licitacion_id, lote_numero, ganador_nombre) IN (
+                SELECT licitacion_id, lote_numero, ganador_nombre FROM tokens_ganadores
+                WHERE tokens_ganadores MATCH '"nuestra oferta"'
+            )
+            AND ganador_nombre LIKE '%(Nuestra Oferta)%'
         """)
         normalizados = cur1.rowcount if cur1.rowcount is not None else 0
 
-        # 1) Resolver tabla y columna de empresas_nuestras
-        tabla_en, col_nombre = self._resolver_tabla_y_columna_empresas_nuestras()
-
-        # 2) Asignación EXACTA: ganador_nombre == una de nuestras empresas participantes
-        sql_exacta = f"""
+        # 1) Asignación EXACTA: nombre normalizado del ganador == una de nuestras
+        #    empresas participantes (índices de la migración 7)
+        cur2 = self.conn.execute("""
             UPDATE licitacion_ganadores_lote AS g
             SET empresa_nuestra = (
-                SELECT en.{col_nombre}
-                FROM {tabla_en} en
+                SELECT en.empresa_nombre
+                FROM licitacion_empresas_nuestras en
                 WHERE en.licitacion_id = g.licitacion_id
-                AND LOWER(TRIM(en.{col_nombre})) = LOWER(TRIM(g.ganador_nombre))
+                AND en.empresa_norm = g.ganador_norm
             )
             WHERE g.empresa_nuestra IS NULL
-        """
-        cur2 = self.conn.execute(sql_exacta)
+        """)
         exactos = cur2.rowcount if cur2.rowcount is not None else 0
 
-        # 3) Asignación por COINCIDENCIA (contiene)
-        sql_like = f"""
+        # 2) Asignación por COINCIDENCIA: el nombre del ganador contiene, como
+        #    frase de tokens, el de una empresa nuestra (tokens_ganadores)
+        cur3 = self.conn.execute("""
             UPDATE licitacion_ganadores_lote AS g
             SET empresa_nuestra = (
-                SELECT en.{col_nombre}
-                FROM {tabla_en} en
+                SELECT en.empresa_nombre
+                FROM licitacion_empresas_nuestras en
                 WHERE en.licitacion_id = g.licitacion_id
-                AND INSTR(LOWER(g.ganador_nombre), LOWER(en.{col_nombre})) > 0
+                AND EXISTS (
+                    SELECT 1 FROM tokens_ganadores t
+                    WHERE tokens_ganadores MATCH '"' || REPLACE(en.empresa_nombre, '"', '""') || '"'
+                    AND t.licitacion_id = g.licitacion_id
+                    AND t.lote_numero = g.lote_numero
+                    AND t.ganador_nombre = g.ganador_nombre
+                )
                 LIMIT 1
             )
             WHERE g.empresa_nuestra IS NULL
-        """
-        cur3 = self.conn.execute(sql_like)
+        """)
         por_coincidencia = cur3.rowcount if cur3.rowcount is not None else 0
 
         self.conn.commit()
         return normalizados, exactos, por_coincidencia
 
     def _normalizar_nombre(self, s: str) -> str:
-        return (s or "").strip().lower().replace(" (nuestra oferta)", "")
+        """Misma normalización que las columnas *_norm (ver _sql_normalizar_nombre)."""
+        return (s or "").translate(_PLIEGUE_NOMBRE).replace(_SUFIJO_NUESTRA_OFERTA, "").strip(" ")
 
     def obtener_resumen_y_historial_empresa(self, nombre_empresa: str):
         """
         KPIs + historial para una empresa nuestra.
         Auto-detecta tabla/columna de empresas_nuestras y columnas de 'lotes'.
+        Lee desde el pool de lectura (apto para hilos de fondo).
         """
-        tabla_en, col_nombre = self._resolver_tabla_y_columna_empresas_nuestras()
-        col_num_lote, col_monto_lote = self._resolver_cols_lotes()
+        with self.lector() as conn:
+            return self._leer_resumen_y_historial_empresa(conn, nombre_empresa)
+
+    def _leer_resumen_y_historial_empresa(self, conn, nombre_empresa: str):
+        col_num_lote, col_monto_lote = self._resolver_cols_lotes(conn)
         nombre_emp_norm = self._normalizar_nombre(nombre_empresa)
 
         # --- Historial: lotes ganados por esta empresa ---
-        # g.empresa_nuestra preferida; si está NULL, caer a ganador_nombre normalizado o 'contiene'
+        # g.empresa_nuestra preferida; si está NULL, caer a ganador_nombre normalizado
+        # o a 'contiene' por tokens. Cada rama usa su índice (UNION en vez de OR).
         sql_hist = f"""
             WITH ganados AS (
-                SELECT
-                    g.licitacion_id,
-                    g.lote_numero,
-                    COALESCE(g.empresa_nuestra, g.ganador_nombre) AS ganador_resuelto
+                SELECT g.licitacion_id, g.lote_numero, g.ganador_nombre,
+                       COALESCE(g.empresa_nuestra, g.ganador_nombre) AS ganador_resuelto
+                FROM licitacion_ganadores_lote g
+                WHERE g.empresa_norm = :nombre
+                UNION
+                SELECT g.licitacion_id, g.lote_numero, g.ganador_nombre,
+                       COALESCE(g.empresa_nuestra, g.ganador_nombre)
                 FROM licitacion_ganadores_lote g
-                WHERE
-                    LOWER(TRIM(COALESCE(g.empresa_nuestra, ''))) = ?
-                    OR LOWER(TRIM(REPLACE(g.ganador_nombre, ' (Nuestra Oferta)', ''))) = ?
-                    OR INSTR(LOWER(g.ganador_nombre), ?) > 0
+                WHERE g.ganador_norm = :nombre
+                UNION
+                SELECT g.licitacion_id, g.lote_numero, g.ganador_nombre,
+                       COALESCE(g.empresa_nuestra, g.ganador_nombre)
+                FROM tokens_ganadores t
+                JOIN licitacion_ganadores_lote g
+                  ON g.licitacion_id = t.licitacion_id
+                 AND g.lote_numero = t.lote_numero
+                 AND g.ganador_nombre = t.ganador_nombre
+                WHERE tokens_ganadores MATCH :frase
             )
             SELECT
                 li.numero_proceso        AS proceso,
@@ -1755,7 +3140,7 @@ class DatabaseManager:
             AND CAST(lo.{col_num_lote} AS TEXT) = CAST(g.lote_numero AS TEXT)
             ORDER BY COALESCE(li.fecha_creacion, li.id) DESC
         """
-        cur = self.conn.execute(sql_hist, (nombre_emp_norm, nombre_emp_norm, nombre_emp_norm))
+        cur = conn.execute(sql_hist, {"nombre": nombre_emp_norm, "frase": _frase_fts(nombre_emp_norm)})
         historial = [{
             "proceso": r[0],
             "institucion": r[1],
@@ -1767,12 +3152,11 @@ class DatabaseManager:
         } for r in cur.fetchall()]
 
         # --- Participaciones: donde la empresa figura como participante ---
-        sql_part = f"""
+        cur = conn.execute("""
             SELECT COUNT(DISTINCT en.licitacion_id)
-            FROM {tabla_en} en
-            WHERE LOWER(TRIM(en.{col_nombre})) = ?
-        """
-        cur = self.conn.execute(sql_part, (nombre_emp_norm,))
+            FROM licitacion_empresas_nuestras en
+            WHERE en.empresa_norm = ?
+        """, (nombre_emp_norm,))
         participaciones = int(cur.fetchone()[0] or 0)
 
         lotes_ganados = len(historial)
@@ -1800,13 +3184,19 @@ class DatabaseManager:
         }
         return kpis, historial
 
-    def _resolver_tabla_y_columna_empresas_nuestras(self):
+    def _resolver_tabla_y_columna_empresas_nuestras(self, conn=None):
         """
         Devuelve (tabla_empresas, col_nombre) para la tabla que guarda
         las 'empresas_nuestras' por licitación.
         Busca entre nombres comunes y detecta la columna de 'nombre'.
-        Lanza ValueError si no encuentra nada razonable.
+        Lanza ValueError si no encuentra nada razonable. El resultado queda en
+        self.catalogo hasta la próxima migración.
         """
+        conn = conn or self.conn
+        return self.catalogo.derivado("empresas_nuestras",
+                                      lambda: self._detectar_tabla_y_columna_empresas_nuestras(conn))
+
+    def _detectar_tabla_y_columna_empresas_nuestras(self, conn):
         # Candidatos de nombre de tabla (ajusta si usas otro)
         posibles_tablas = [
             "licitacion_empresas_nuestras",
@@ -1816,8 +3206,7 @@ class DatabaseManager:
         ]
 
         # 1) Qué tablas existen en la BD
-        cur = self.conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        existentes = {r[0] for r in cur.fetchall()}
+        existentes = self.catalogo.tablas(conn)
 
         # 2) Elige la primera que exista
         tabla_ok = None
@@ -1829,8 +3218,7 @@ class DatabaseManager:
             raise ValueError("No se encontró la tabla de 'empresas_nuestras'. Revisa el nombre real en tu esquema.")
 
         # 3) Detectar la columna de 'nombre'
-        cur = self.conn.execute(f"PRAGMA table_info({tabla_ok})")
-        cols = [r[1] for r in cur.fetchall()]
+        cols = list(self.catalogo.columnas(conn, tabla_ok))
 
         # candidatos habituales para la columna "nombre de la empresa"
         candidatos_nombre = [
@@ -1855,15 +3243,18 @@ class DatabaseManager:
 
         return tabla_ok, col_nombre
 
-    def _resolver_cols_lotes(self):
+    def _resolver_cols_lotes(self, conn=None):
         """
         Detecta cómo se llaman las columnas clave en 'lotes':
         - numero del lote
         - monto adjudicado (o sus alternativas)
         Retorna: (col_numero, col_monto)
         """
-        cur = self.conn.execute("PRAGMA table_info(lotes)")
-        cols = {r[1] for r in cur.fetchall()}
+        conn = conn or self.conn
+        return self.catalogo.derivado("cols_lotes", lambda: self._detectar_cols_lotes(conn))
+
+    def _detectar_cols_lotes(self, conn):
+        cols = set(self.catalogo.columnas(conn, "lotes"))
 
         # posibles nombres para "numero de lote"
         cand_num = ["numero", "lote_numero", "num_lote", "lote", "nro", "nro_lote"]
@@ -1886,7 +3277,7 @@ class DatabaseManager:
             SELECT licitacion_id, lote_numero, ganador_nombre, empresa_nuestra
             FROM licitacion_ganadores_lote
             WHERE licitacion_id = ?
-            ORDER BY CAST(lote_numero AS INTEGER)
+            ORDER BY numero_orden, lote_numero
         """, (licitacion_id,))
         out["db"] = [dict(licitacion_id=r[0], lote_numero=str(r[1]), ganador_nombre=r[2], empresa_nuestra=r[3]) for r in cur.fetchall()]
         return out
@@ -0,0 +1,377 @@
+"""
+Fábrica única fila -> modelo para las dos interfaces.
+
+La app Tk (glicitaciones.py) y la PyQt (app/core/models.py) tienen sus propias
+clases Licitacion/Lote/Documento/Oferente/Empresa, pero ambas se cargan desde
+las mismas filas. FabricaModelos recibe las clases de cada interfaz y arma los
+objetos directamente desde las tuplas de DatabaseManager._leer_filas_licitaciones(),
+con la conversión de tipos (0/1 -> bool, NULL -> 0.0/"") hecha una sola vez y
+sin los dicts intermedios de get_all_data():
+
+    fabrica = FabricaModelos(Licitacion, Lote, Documento, Oferente, Empresa)
+    licitaciones = db.cargar_licitaciones(fabrica)
+
+Para listas y dashboards, db.cargar_resumenes(fabrica) arma filas de
+ResumenLicitacion (cabecera, lotes y conteos de documentos) sin hidratar
+documentos ni oferentes; la licitación completa se pide al abrir su detalle.
+"""
+import json
+
+from db_manager import COLS_FILA_FALLA
+
+# Columnas de cabecera que se pasan al constructor de Licitacion, con su conversión.
+_CABECERA_BOOL = ("fase_A_superada", "fase_B_superada", "adjudicada", "docs_completos_manual")
+_CABECERA_TEXTO = ("nombre_proceso", "numero_proceso", "institucion", "adjudicada_a",
+                   "motivo_descalificacion")
+
+# Columnas de 'documentos' que aceptan ambos Documento (las que falten en BD legadas se omiten).
+_DOC_BOOL = ("presentado", "revisado", "obligatorio", "requiere_subsanacion")
+_DOC_OTRAS = ("id", "codigo", "nombre", "categoria", "comentario", "subsanable", "ruta_archivo",
+              "empresa_nombre", "responsable", "orden_pliego")
+
+
+class ResumenLicitacion:
+    """
+    Fila de lista/dashboard: cabecera, empresas y lotes (con ganado_por_nosotros
+    resuelto) de una licitación, con los documentos reducidos a conteos.
+    Expone los mismos cálculos que Licitacion para las columnas de la lista;
+    para editar o ver el detalle hay que cargar la licitación completa por id.
+    """
+
+    def __init__(self, **campos):
+        self.id = None
+        self.numero_proceso = ""
+        self.nombre_proceso = ""
+        self.institucion = ""
+        self.estado = "Iniciada"
+        self.fase_A_superada = False
+        self.fase_B_superada = False
+        self.adjudicada = False
+        self.adjudicada_a = ""
+        self.motivo_descalificacion = ""
+        self.docs_completos_manual = False
+        self.last_modified = None
+        self.fecha_creacion = None
+        self.cronograma = {}
+        self.empresas_nuestras = []
+        self.lotes = []
+        self.cantidad_documentos = 0
+        self.documentos_completados = 0
+        self.documentos_subsanar = 0
+        for campo, valor in campos.items():
+            setattr(self, campo, valor)
+
+    def _lotes(self, solo_participados):
+        return [l for l in self.lotes if l.participamos] if solo_participados else self.lotes
+
+    def get_monto_base_total(self, solo_participados: bool = False) -> float:
+        return sum(float(l.monto_base or 0.0) for l in self._lotes(solo_participados))
+
+    def get_oferta_total(self, solo_participados: bool = False) -> float:
+        return sum(float(l.monto_ofertado or 0.0) for l in self._lotes(solo_participados))
+
+    def get_monto_base_personal_total(self, solo_participados: bool = False) -> float:
+        return sum(float(l.monto_base_personal or 0.0) or float(l.monto_base or 0.0)
+                   for l in self._lotes(solo_participados))
+
+    def get_diferencia_porcentual(self, solo_participados=False, usar_base_personal=True) -> float:
+        lotes = self.lotes
+        if solo_participados:
+            lotes = [l for l in lotes if l.participamos or float(l.monto_ofertado or 0) > 0]
+        base_total = 0.0
+        oferta_total = 0.0
+        for lote in lotes:
+            oferta_total += float(lote.monto_ofertado or 0)
+            if usar_base_personal:
+                base_total += float(lote.monto_base_personal or 0.0) or float(lote.monto_base or 0.0)
+            else:
+                base_total += float(lote.monto_base or 0.0)
+        if base_total == 0:
+            return 0.0
+        return ((oferta_total - base_total) / base_total) * 100.0
+
+    def get_porcentaje_completado(self) -> float:
+        if self.cantidad_documentos == 0:
+            return 100.0 if self.docs_completos_manual else 0.0
+        return (self.documentos_completados / self.cantidad_documentos) * 100
+
+    def tiene_subsanables(self) -> bool:
+        return self.documentos_subsanar > 0
+
+
+class FabricaModelos:
+    """Construye modelos de licitación de una interfaz a partir de filas crudas."""
+
+    def __init__(self, licitacion, lote, documento, oferente, empresa, resumen=ResumenLicitacion):
+        self.licitacion = licitacion
+        self.lote = lote
+        self.documento = documento
+        self.oferente = oferente
+        self.empresa = empresa
+        self.resumen = resumen
+
+    def construir(self, filas) -> list:
+        """Devuelve la lista de Licitacion (orden de la cabecera) con hijos y ganadores resueltos."""
+        licitaciones = {}
+        legado = {}
+        pos = {c: i for i, c in enumerate(filas.cols_cabecera)}
+        for row in filas.cabecera:
+            lic = self._licitacion(row, pos)
+            licitaciones[lic.id] = lic
+            emp = row[pos["empresa_nuestra"]] if "empresa_nuestra" in pos else None
+            if isinstance(emp, str) and emp:
+                legado[lic.id] = emp
+
+        lotes_idx = self._empresas_y_lotes(licitaciones, legado, filas)
+
+        cols = filas.cols_documentos
+        i_lic = cols.index("licitacion_id")
+        campos_bool = [(c, cols.index(c)) for c in _DOC_BOOL if c in cols]
+        campos = [(c, cols.index(c)) for c in _DOC_OTRAS if c in cols]
+        for row in filas.documentos:
+            lic = licitaciones.get(row[i_lic])
+            if lic is not None:
+                kwargs = {c: row[i] for c, i in campos}
+                for c, i in campos_bool:
+                    kwargs[c] = bool(row[i])
+                lic.documentos_solicitados.append(self.documento(**kwargs))
+
+        for row in filas.fallas:
+            lic = licitaciones.get(row[1])
+            if lic is not None:
+                lic.fallas_fase_a.append(dict(zip(COLS_FILA_FALLA, row)))
+
+        # Oferentes: las ofertas van directo a la TablaOfertas de cada uno
+        oferentes = {}
+        ofertas_idx = {}
+        for oferente_id, lic_id, nombre, comentario, lote_num, monto, paso_a in filas.ofertas:
+            lic = licitaciones.get(lic_id)
+            if lic is None:
+                continue
+            of = oferentes.get(oferente_id)
+            if of is None:
+                of = oferentes[oferente_id] = self.oferente(nombre=nombre, comentario=comentario,
+                                                            ofertas_por_lote=[])
+                lic.oferentes_participantes.append(of)
+            if lote_num is not None:
+                tabla = of.ofertas_por_lote
+                tabla.agregar(lote_num, float(monto or 0.0), bool(paso_a), False)
+                ofertas_idx.setdefault((lic_id, (nombre or "").strip(), str(lote_num)), []).append(
+                    (tabla, len(tabla) - 1))
+
+        self._propagar_ganadores(licitaciones, lotes_idx, ofertas_idx, filas.ganadores)
+
+        for lic in licitaciones.values():
+            lic.marcar_limpio()  # save_licitacion escribirá solo lo que se modifique
+        return list(licitaciones.values())
+
+    def construir_resumen(self, filas) -> list:
+        """Filas de resumen (self.resumen) desde DatabaseManager._leer_filas_resumen()."""
+        resumenes = {}
+        legado = {}
+        pos = {c: i for i, c in enumerate(filas.cols_cabecera)}
+        for row in filas.cabecera:
+            r = self.resumen(**self._cabecera(row, pos))
+            resumenes[r.id] = r
+            emp = row[pos["empresa_nuestra"]] if "empresa_nuestra" in pos else None
+            if isinstance(emp, str) and emp:
+                legado[r.id] = emp
+
+        lotes_idx = self._empresas_y_lotes(resumenes, legado, filas)
+
+        for lic_id, total, completados, subsanar in filas.documentos:
+            r = resumenes.get(lic_id)
+            if r is not None:
+                r.cantidad_documentos = total
+                r.documentos_completados = completados or 0
+                r.documentos_subsanar = subsanar or 0
+
+        self._propagar_ganadores(resumenes, lotes_idx, {}, filas.ganadores)
+        return list(resumenes.values())
+
+    def _empresas_y_lotes(self, licitaciones, legado, filas):
+        """Asigna empresas nuestras y lotes; devuelve el índice (lic_id, numero) -> lote."""
+        # Empresas nuestras: tabla relacional, con fallback a la columna legada
+        nombres = {}
+        for lic_id, nombre in filas.empresas:
+            if nombre:
+                nombres.setdefault(lic_id, set()).add(nombre.strip())
+        for lic_id, lic in licitaciones.items():
+            propias = nombres.get(lic_id) or ({legado[lic_id]} if lic_id in legado else ())
+            lic.empresas_nuestras = [self.empresa(n) for n in sorted(propias)]
+
+        lotes_idx = {}
+        for (id_, lic_id, numero, nombre, base, base_personal, ofertado,
+             participamos, fase_a, empresa_nuestra) in filas.lotes:
+            lic = licitaciones.get(lic_id)
+            if lic is None:
+                continue
+            lote = self.lote(
+                id=id_, numero=numero, nombre=nombre,
+                monto_base=float(base or 0.0), monto_base_personal=float(base_personal or 0.0),
+                monto_ofertado=float(ofertado or 0.0),
+                participamos=bool(participamos), fase_A_superada=bool(fase_a),
+                ganador_nombre="", ganado_por_nosotros=False,
+                empresa_nuestra=(empresa_nuestra or "").strip() or None,
+            )
+            lic.lotes.append(lote)
+            lotes_idx.setdefault((lic_id, str(numero)), lote)
+        return lotes_idx
+
+    def _licitacion(self, row, pos):
+        lic = self.licitacion(**self._cabecera(row, pos))
+        # El dataclass PyQt no recibe parametros_evaluacion por constructor; ambos tienen el setter
+        if "parametros_evaluacion" in pos:
+            lic.parametros_evaluacion = row[pos["parametros_evaluacion"]]
+        return lic
+
+    @staticmethod
+    def _cabecera(row, pos):
+        kwargs = {"id": row[pos["id"]], "estado": row[pos["estado"]] or "Iniciada"}
+        for c in _CABECERA_TEXTO:
+            if c in pos:
+                kwargs[c] = row[pos[c]] or ""
+        for c in _CABECERA_BOOL:
+            if c in pos:
+                kwargs[c] = bool(row[pos[c]])
+        if "last_modified" in pos:
+            kwargs["last_modified"] = row[pos["last_modified"]]
+        fecha = row[pos["fecha_creacion"]] if "fecha_creacion" in pos else None
+        if fecha:
+            kwargs["fecha_creacion"] = fecha
+        kwargs["cronograma"] = _json_dict(row[pos["cronograma"]] if "cronograma" in pos else None)
+        return kwargs
+
+    @staticmethod
+    def _propagar_ganadores(licitaciones, lotes_idx, ofertas_idx, ganador_rows):
+        """Misma regla que DatabaseManager._propagar_ganadores, sobre los modelos."""
+        nuestras_por_lic = {}
+        for lic_id, lote_num, ganador_nombre, empresa_nuestra in ganador_rows:
+            lic = licitaciones.get(lic_id)
+            if lic is None:
+                continue
+            loteno = str(lote_num)
+            ganador = (ganador_nombre or "").strip()
+
+            lote = lotes_idx.get((lic_id, loteno))
+            if lote is not None:
+                nuestras = nuestras_por_lic.get(lic_id)
+                if nuestras is None:
+                    nuestras = nuestras_por_lic[lic_id] = {str(e) for e in lic.empresas_nuestras}
+                emp_lote = (lote.empresa_nuestra or "").strip()
+                lote.ganador_nombre = ganador
+                lote.ganado_por_nosotros = (bool((empresa_nuestra or "").strip())
+                                            or bool(emp_lote and ganador and ganador == emp_lote)
+                                            or ganador in nuestras)
+
+            for tabla, i in ofertas_idx.get((lic_id, ganador, loteno), ()):
+                tabla[i]["ganador"] = True
+
+
+def _json_dict(valor):
+    if isinstance(valor, dict):
+        return valor
+    try:
+        return json.loads(valor or "{}")
+    except Exception:
+        return {}
+
+
+class MapaIdentidad:
+    """
+    Identity map de licitaciones por id para una FabricaModelos.
+
+    Cada pedido hace primero un sondeo barato (id, last_modified) y reutiliza
+    los objetos en caché cuyo last_modified coincide, que no tienen cambios
+    sin guardar y sobre los que no hubo escrituras locales por fuera de
+    save_licitacion (DatabaseManager.version_local); solo se recargan las
+    licitaciones nuevas o modificadas y se descartan las borradas.
+
+    Además lee DatabaseManager.changes_since() (registro_cambios): así también
+    se detectan cambios hechos desde otra máquina en tablas hijas, que no
+    tocan last_modified. Los guardados propios (save_licitacion en este
+    manager) no cuentan como cambios.
+
+    Si la BD se reemplaza en caliente (restauración, ver
+    DatabaseManager.reemplazar_archivo) cambia db.generacion: la caché y la
+    posición en el registro de cambios ya no valen y se empieza de cero.
+    """
+    # Si hay que recargar más de esta fracción, sale más barato una carga completa
+    FRACCION_CARGA_COMPLETA = 0.25
+
+    def __init__(self, db, fabrica):
+        self.db = db
+        self.fabrica = fabrica
+        self._cache = {}  # id -> (licitacion, version_local)
+        self._generacion = db.generacion
+        self._seq, _ = db.changes_since(None)
+
+    def todas(self) -> list:
+        """Todas las licitaciones (orden por id), recargando solo las que cambiaron."""
+        self.sincronizar()
+        sondeo = self.db.sondear_licitaciones()
+        pendientes = {lic_id for lic_id, ts in sondeo if not self._vigente(lic_id, ts)}
+        if pendientes:
+            if len(pendientes) > max(1, len(sondeo) * self.FRACCION_CARGA_COMPLETA):
+                cargadas = self.db.cargar_licitaciones(self.fabrica)
+            else:
+                cargadas = [self.db.cargar_licitacion(self.fabrica, lic_id) for lic_id in sorted(pendientes)]
+            for lic in cargadas:
+                if lic is not None and lic.id in pendientes:
+                    self._guardar(lic)
+        vivos = {lic_id for lic_id, _ in sondeo}
+        for lic_id in [i for i in self._cache if i not in vivos]:
+            del self._cache[lic_id]
+        return [self._cache[lic_id][0] for lic_id, _ in sondeo if lic_id in self._cache]
+
+    def obtener(self, licitacion_id):
+        """Una licitación por id (None si no existe), con el mismo criterio de reutilización."""
+        sondeo = self.db.sondear_licitaciones(licitacion_id)
+        if not sondeo:
+            self._cache.pop(licitacion_id, None)
+            return None
+        if not self._vigente(licitacion_id, sondeo[0][1]):
+            lic = self.db.cargar_licitacion(self.fabrica, licitacion_id)
+            if lic is None:
+                self._cache.pop(licitacion_id, None)
+                return None
+            self._guardar(lic)
+        return self._cache[licitacion_id][0]
+
+    def sincronizar(self) -> set:
+        """
+        Lee el registro de cambios desde el último sondeo y descarta de la caché
+        las licitaciones que cambiaron por fuera de este proceso. Devuelve esos
+        ids (vacío si no hubo), para que la interfaz refresque solo si hace falta.
+        """
+        if self._generacion != self.db.generacion:
+            # Archivo reemplazado: el seq del registro puede haber retrocedido
+            previos = set(self._cache)
+            self._cache.clear()
+            self._generacion = self.db.generacion
+            self._seq, _ = self.db.changes_since(None)
+            return previos
+        self._seq, cambios = self.db.changes_since(self._seq, solo_ajenos=True)
+        for lic_id in cambios:
+            self._cache.pop(lic_id, None)
+        return set(cambios)
+
+    def invalidar(self, licitacion_id=None):
+        """Descarta una licitación de la caché (o todas, sin argumento)."""
+        if licitacion_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(licitacion_id, None)
+
+    def _guardar(self, lic):
+        self._cache[lic.id] = (lic, self.db.version_local(lic.id))
+
+    def _vigente(self, lic_id, last_modified) -> bool:
+        entrada = self._cache.get(lic_id)
+        if entrada is None:
+            return False
+        lic, version = entrada
+        # save_licitacion actualiza lic.last_modified, así que un guardado propio no invalida
+        return (lic.last_modified == last_modified
+                and version == self.db.version_local(lic_id)
+                and not lic.esta_sucio())
@@ -1,6 +1,6 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
-import datetime, json, os, sys, subprocess, logging, shutil, traceback, io, platform
+import datetime, json, os, sys, subprocess, logging, traceback, io, platform
 from zipfile import ZipFile, ZIP_DEFLATED
 from collections import defaultdict, Counter # Counter solo se necesita una vez
 import numpy as np
@@ -382,13 +382,22 @@ OPENPYXL_AVAILABLE = True
 REPORTLAB_AVAILABLE = True
 
 from report_generator import ReportGenerator
+from seguimiento_cambios import SeguimientoCambios
+from tabla_ofertas import TablaOfertas
+from fabrica_modelos import FabricaModelos, MapaIdentidad, ResumenLicitacion
+from respaldos import AlmacenRespaldos, descartar_restauracion, politica_retencion, preparar_restauracion, respaldar
 
 # =================================================================================
 # 1. CLASES DE DATOS
 # =================================================================================
 
 
-class Lote:
+class Lote(SeguimientoCambios):
+    __slots__ = ("id", "numero", "nombre", "monto_base", "monto_base_personal", "monto_ofertado",
+                 "participamos", "fase_A_superada", "ganador_nombre", "ganado_por_nosotros", "empresa_nuestra")
+    CAMPOS_SEGUIDOS = ("numero", "nombre", "monto_base", "monto_base_personal", "monto_ofertado",
+                       "participamos", "fase_A_superada", "empresa_nuestra")
+
     def __init__(self, **kwargs):
         self.id = kwargs.get("id", None) # <-- LÍNEA NUEVA
         self.numero = kwargs.get("numero", "")
@@ -415,16 +424,25 @@ class Lote:
             "empresa_nuestra": self.empresa_nuestra
         }
 
-class Oferente:
+class Oferente(SeguimientoCambios):
+    __slots__ = ("nombre", "comentario", "ofertas_por_lote")
+    CAMPOS_SEGUIDOS = ("nombre", "comentario", "ofertas_por_lote")
+
     def __init__(self, **kwargs):
         self.nombre = kwargs.get("nombre", "")
         self.comentario = kwargs.get("comentario", "")
         self.ofertas_por_lote = kwargs.get("ofertas_por_lote", [])
 
+    def __setattr__(self, nombre, valor):
+        # Las ofertas se guardan siempre en forma columnar (ver tabla_ofertas)
+        if nombre == "ofertas_por_lote" and not isinstance(valor, TablaOfertas):
+            valor = TablaOfertas(valor or ())
+        object.__setattr__(self, nombre, valor)
+
     def to_dict(self):
         return {
             "nombre": self.nombre, "comentario": self.comentario,
-            "ofertas_por_lote": self.ofertas_por_lote,
+            "ofertas_por_lote": self.ofertas_por_lote.como_lista(),
         }
 
     def get_monto_total_ofertado(self, solo_habilitados=False):
@@ -434,7 +452,13 @@ class Oferente:
         return sum(oferta.get('monto', 0) for oferta in ofertas_a_sumar)
 
 
-class Documento:
+class Documento(SeguimientoCambios):
+    __slots__ = ("id", "codigo", "nombre", "categoria", "comentario", "presentado", "subsanable",
+                 "ruta_archivo", "empresa_nombre", "responsable", "revisado", "obligatorio",
+                 "orden_pliego", "requiere_subsanacion")
+    CAMPOS_SEGUIDOS = ("codigo", "nombre", "categoria", "comentario", "presentado", "subsanable",
+                       "ruta_archivo", "responsable", "revisado", "obligatorio", "orden_pliego",
+                       "requiere_subsanacion")
 
     def __init__(self, **kwargs):
         self.id = kwargs.get("id")
@@ -481,7 +505,15 @@ class Empresa:
         return self.nombre
 
 
-class Licitacion:
+class Licitacion(SeguimientoCambios):
+    # Columnas de cabecera en 'licitaciones' + relaciones guardadas aparte
+    CAMPOS_SEGUIDOS = ("nombre_proceso", "numero_proceso", "institucion", "estado",
+                       "fase_A_superada", "fase_B_superada", "adjudicada", "adjudicada_a",
+                       "motivo_descalificacion", "fecha_creacion", "cronograma",
+                       "docs_completos_manual", "parametros_evaluacion",
+                       "empresas_nuestras", "fallas_fase_a")
+    LISTAS_HIJAS = ("lotes", "documentos_solicitados", "oferentes_participantes")
+
     def __init__(self, **kwargs):
         self.id = kwargs.get("id")
         self.nombre_proceso = kwargs.get("nombre_proceso", "")
@@ -538,6 +570,11 @@ class Licitacion:
             else:
                 self.cronograma[evento] = {"fecha_limite": None, "estado": "Pendiente"}
 
+    def _valor_seguido(self, campo):
+        if campo == "empresas_nuestras":
+            return [str(e) for e in self.empresas_nuestras]
+        return getattr(self, campo, None)
+
     # Dict para uso en la APP (NO serializa a texto)
     def to_dict(self):
         return {
@@ -646,13 +683,15 @@ class Licitacion:
                                if doc.presentado and not doc.requiere_subsanacion)
         
         return (docs_completados / total_docs) * 100
+
+    def tiene_subsanables(self):
+        return any(getattr(doc, 'requiere_subsanacion', False) for doc in self.documentos_solicitados)
           
     def get_dias_restantes(self):
         hoy = datetime.date.today()
         
         # 1. Prioridad a Subsanación
-        tiene_subsanables = any(getattr(doc, 'requiere_subsanacion', False) for doc in self.documentos_solicitados)
-        if tiene_subsanables:
+        if self.tiene_subsanables():
             datos_subsanacion = self.cronograma.get("Entrega de Subsanaciones")
             if datos_subsanacion and datos_subsanacion.get("estado") == "Pendiente" and datos_subsanacion.get("fecha_limite"):
                 try:
@@ -743,6 +782,17 @@ class Licitacion:
         # Pase lo que pase (dict/str/None), guardamos SIEMPRE un dict
         self._parametros_evaluacion = _as_dict(value)
 
+
+class LicitacionResumen(ResumenLicitacion):
+    """Fila de la lista principal con los mismos textos y totales que Licitacion."""
+    _lotes_elegibles_para_porcentaje = Licitacion._lotes_elegibles_para_porcentaje
+    get_oferta_total = Licitacion.get_oferta_total
+    get_dias_restantes = Licitacion.get_dias_restantes
+
+
+# Carga fila -> modelo compartida con la app PyQt (ver fabrica_modelos.py)
+FABRICA_MODELOS = FabricaModelos(Licitacion, Lote, Documento, Oferente, Empresa, resumen=LicitacionResumen)
+
 # =================================================================================
 # 2. VENTANAS SECUNDARIAS
 # =================================================================================
@@ -4589,12 +4639,12 @@ class VentanaDetalles(tk.Toplevel):
         dialogo = DialogoSeleccionarLicitacion(
             self,
             "Seleccionar Licitación de Origen para Importar Competidores",
-            self.parent_app.gestor_licitaciones,
+            self.parent_app.resumen_licitaciones,
             self.licitacion.numero_proceso
         )
         if not dialogo.result:
             return
-        lic_origen = next((l for l in self.parent_app.gestor_licitaciones if l.numero_proceso == dialogo.result), None)
+        lic_origen = self.parent_app._licitacion_por_numero(dialogo.result)
         if not lic_origen:
             messagebox.showerror("Error", "No se pudo encontrar la licitación de origen.", parent=self)
             return
@@ -5084,7 +5134,7 @@ class VentanaDetalles(tk.Toplevel):
             callback=self.actualizar_info_docs,
             documentos_maestros=self.documentos_maestros,
             categorias=self.categorias_documentos,
-            todas_las_licitaciones=self.parent_app.gestor_licitaciones,
+            todas_las_licitaciones=self.parent_app.resumen_licitaciones,
             lista_responsables=self.parent_app.responsables_maestros
         )
 
@@ -5765,7 +5815,7 @@ class VentanaMaestroKits(tk.Toplevel):
             return
 
         # 1) Filtrar licitaciones por institución
-        licitaciones_filtradas = [l for l in self.parent_app.gestor_licitaciones if l.institucion == institucion]
+        licitaciones_filtradas = [l for l in self.parent_app.resumen_licitaciones if l.institucion == institucion]
         if not licitaciones_filtradas:
             messagebox.showinfo("Información", f"No se encontraron licitaciones para la institución '{institucion}'.", parent=self)
             return
@@ -5774,7 +5824,7 @@ class VentanaMaestroKits(tk.Toplevel):
         if not dialogo.result:
             return
 
-        lic_origen = next((l for l in licitaciones_filtradas if l.numero_proceso == dialogo.result), None)
+        lic_origen = self.parent_app._licitacion_por_numero(dialogo.result)
         if not (lic_origen and lic_origen.documentos_solicitados):
             messagebox.showinfo("Información", "La licitación seleccionada no tiene documentos para importar.", parent=self)
             return
@@ -8053,7 +8103,7 @@ class VentanaGestionDocumentos(tk.Toplevel):
     def importar_desde_licitacion(self):
         dialogo = DialogoSeleccionarLicitacion(self, "Importar Documentos", self.todas_las_licitaciones, self.licitacion.numero_proceso)
         if dialogo.result:
-            origen = next((l for l in self.todas_las_licitaciones if l.numero_proceso == dialogo.result), None)
+            origen = self.parent_app._licitacion_por_numero(dialogo.result)
             if not origen: return
             codigos_existentes = {d.codigo for d in self.licitacion.documentos_solicitados}
             for d_o in getattr(origen, "documentos_solicitados", []):
@@ -8804,7 +8854,7 @@ class VentanaMaestroEntidades(tk.Toplevel):
 
         # ¿Está en uso?
         en_uso = False
-        for lic in getattr(self.parent_app, "gestor_licitaciones", []):
+        for lic in getattr(self.parent_app, "resumen_licitaciones", []):
             if entity_type == 'institucion':
                 if str(getattr(lic, "institucion", "")) == selected_name:
                     en_uso = True
@@ -8988,7 +9038,7 @@ class VentanaReporte(tk.Toplevel):
         nuestras_empresas = {_norm(str(e)) for e in getattr(self.licitacion, "empresas_nuestras", [])}
 
         # Participantes + nuestra fila
-        participantes = [o.__dict__ for o in getattr(self.licitacion, "oferentes_participantes", [])]
+        participantes = [o.to_dict() for o in getattr(self.licitacion, "oferentes_participantes", [])]
         nuestras = ", ".join(str(e) for e in getattr(self.licitacion, "empresas_nuestras", [])) or "Nuestras Empresas"
         nuestras_ofertas = [
             {'lote_numero': l.numero, 'monto': l.monto_ofertado, 'paso_fase_A': l.fase_A_superada}
@@ -9122,11 +9172,13 @@ class VentanaRestauracion(tk.Toplevel):
         self.title("Restaurar desde Copia de Seguridad")
         self.geometry("800x400")
         self.grab_set()
+        self._tarea = None
+        self.protocol("WM_DELETE_WINDOW", self._cerrar)
 
         main_frame = ttk.Frame(self, padding="15")
         main_frame.pack(fill=tk.BOTH, expand=True)
 
-        ttk.Label(main_frame, text="Seleccione una copia de seguridad para restaurar. La aplicación se reiniciará.",
+        ttk.Label(main_frame, text="Seleccione una copia de seguridad para restaurar. Se verifica antes de reemplazar la base de datos actual.",
                   wraplength=750, justify=tk.LEFT).pack(pady=(0, 10))
 
         cols = ('fecha', 'comentario', 'ruta')
@@ -9168,7 +9220,7 @@ class VentanaRestauracion(tk.Toplevel):
 
     def _restore_manual(self):
         ruta_backup = filedialog.askopenfilename(parent=self, title="Seleccionar Copia de Seguridad Manualmente",
-                                                 filetypes=[("DB files", "*.db")])
+                                                 filetypes=[("DB files", "*.db"), ("Instantáneas", "*.json")])
         if ruta_backup:
             self._proceder_restauracion(ruta_backup)
 
@@ -9176,15 +9228,42 @@ class VentanaRestauracion(tk.Toplevel):
         if messagebox.askyesno("¡ADVERTENCIA!",
                                  "Se reemplazarán TODOS los datos actuales con los del respaldo.\n\nEsta acción no se puede deshacer. ¿Desea continuar?",
                                  icon='warning', parent=self):
-            try:
-                self.parent_app.db.close()
-                shutil.copyfile(ruta_backup, self.parent_app.db_path)
-                messagebox.showinfo("Éxito", "Base de datos restaurada. La aplicación se reiniciará.", parent=self)
-                self.parent_app._reiniciar_app()
-            except Exception as e:
-                messagebox.showerror("Error", f"Falló la restauración:\n{e}", parent=self)
-                # Intentar reconectar a la BD original si la restauración falla
-                self.parent_app._conectar_a_db(self.parent_app.db_path)
+            # Copia + quick_check + esquema en segundo plano; la BD actual no se toca hasta validar
+            self.config(cursor="watch")
+            self._tarea = preparar_restauracion(self.db, ruta_backup)
+            self._esperar_restauracion(self._tarea)
+
+    def _esperar_restauracion(self, tarea):
+        if not self.winfo_exists():
+            descartar_restauracion(tarea)  # ventana destruida sin pasar por _cerrar
+            return
+        if not tarea.terminada:
+            self.title(f"Restaurar desde Copia de Seguridad - verificando... {tarea.fraccion:.0%}")
+            self.after(self.parent_app.INTERVALO_RESPALDO_MS, self._esperar_restauracion, tarea)
+            return
+        self._tarea = None
+        self.config(cursor="")
+        self.title("Restaurar desde Copia de Seguridad")
+        if tarea.error is not None:
+            messagebox.showerror("Respaldo no válido",
+                                 f"No se restauró; la base de datos actual no se modificó.\n\n{tarea.error}", parent=self)
+            return
+        try:
+            # Renombre atómico y reapertura en caliente: sin reiniciar la aplicación
+            self.db.reemplazar_archivo(tarea.destino)
+        except Exception as e:
+            descartar_restauracion(tarea)
+            messagebox.showerror("Error", f"Falló la restauración:\n{e}", parent=self)
+            return
+        self.parent_app.cargar_datos_desde_db()
+        messagebox.showinfo("Éxito", "Base de datos restaurada.", parent=self.parent_app)
+        self.destroy()
+
+    def _cerrar(self):
+        # Cerrar a mitad de la verificación abandona la restauración sin dejar el candidato en disco
+        if self._tarea is not None:
+            descartar_restauracion(self._tarea)
+        self.destroy()
 
 
 
@@ -9195,6 +9274,9 @@ class VentanaSanityCheck(tk.Toplevel):
         self.parent_app = parent
         self.db = parent.db
         self.issues_found = {}
+        self._tarea = None
+        self._mostrados = 0
+        self._fts_estado = None
 
         self.title("Diagnóstico y Reparación de Base de Datos")
         self.geometry("700x500")
@@ -9207,9 +9289,18 @@ class VentanaSanityCheck(tk.Toplevel):
         controls_frame = ttk.Frame(main_frame)
         controls_frame.pack(fill=tk.X, pady=(0, 10))
 
-        ttk.Button(controls_frame, text="🔎 Ejecutar Diagnóstico", command=self.run_checks).pack(side=tk.LEFT)
+        self.btn_check = ttk.Button(controls_frame, text="🔎 Ejecutar Diagnóstico", command=self.run_checks)
+        self.btn_check.pack(side=tk.LEFT)
+        self.btn_full = ttk.Button(controls_frame, text="🧪 Verificación Completa",
+                                   command=lambda: self.run_checks(completo=True))
+        self.btn_full.pack(side=tk.LEFT, padx=(10, 0))
         self.btn_repair = ttk.Button(controls_frame, text="🛠️ Aplicar Correcciones", state="disabled", command=self.apply_fixes)
         self.btn_repair.pack(side=tk.LEFT, padx=10)
+        ttk.Button(controls_frame, text="🔁 Reconstruir Índice de Búsqueda",
+                   command=self.rebuild_search_index).pack(side=tk.LEFT)
+        self.progress = ttk.Progressbar(controls_frame, mode="determinate", maximum=1.0, length=150)
+        self.progress.pack(side=tk.RIGHT)
+        self.protocol("WM_DELETE_WINDOW", self._cerrar)
 
         # --- Ventana de Reporte ---
         report_frame = ttk.LabelFrame(main_frame, text="Reporte de Diagnóstico", padding=10)
@@ -9220,19 +9311,67 @@ class VentanaSanityCheck(tk.Toplevel):
         self.report_text.insert(tk.END, "Presione 'Ejecutar Diagnóstico' para comenzar...")
         self.report_text.config(state="disabled")
 
-    def run_checks(self):
+    def run_checks(self, completo=False, forzar=False):
+        """Lanza el diagnóstico en segundo plano (rápido, o completo con integrity_check)."""
+        if self._tarea is not None and not self._tarea.terminada:
+            return
         self.report_text.config(state="normal")
         self.report_text.delete("1.0", tk.END)
-        self.report_text.insert(tk.END, "Ejecutando diagnóstico, por favor espere...\n\n")
-        self.update_idletasks() # Forzar actualización de la UI
-
-        self.issues_found = self.db.run_sanity_checks()
+        self.report_text.insert(tk.END, "Ejecutando diagnóstico" + (" completo" if completo else "") + "...\n\n")
+        self.report_text.config(state="disabled")
+        for btn in (self.btn_check, self.btn_full, self.btn_repair):
+            btn.config(state="disabled")
+        self.issues_found = {}
+        self._mostrados = 0
+        self._tarea = self.db.diagnosticar(completo=completo, forzar=forzar)
+        self._seguir_diagnostico()
+
+    def _seguir_diagnostico(self):
+        """Vuelca al reporte las etapas nuevas del diagnóstico mientras corre."""
+        if not self.winfo_exists():
+            return
+        tarea = self._tarea
+        nuevos = tarea.mensajes[self._mostrados:]
+        self._mostrados += len(nuevos)
+        self.progress['value'] = tarea.fraccion
+        if nuevos:
+            self.report_text.config(state="normal")
+            self.report_text.insert(tk.END, "".join(m + "\n" for m in nuevos))
+            self.report_text.config(state="disabled")
+        if not tarea.terminada:
+            self.after(100, self._seguir_diagnostico)
+            return
+        self.btn_check.config(state="normal")
+        self.btn_full.config(state="normal")
+        if tarea.error is not None:
+            messagebox.showerror("Error", f"Falló el diagnóstico:\n{tarea.error}", parent=self)
+        elif tarea.resultado is not None:
+            self.issues_found = tarea.resultado
+            self._mostrar_resultado()
+
+    def _mostrar_resultado(self):
+        self.report_text.config(state="normal")
+        self.report_text.insert(tk.END, "\n")
 
         has_orphans = bool(self.issues_found.get('orphans'))
         has_missing_indexes = bool(self.issues_found.get('missing_indexes'))
+        integridad = self.issues_found.get('integridad') or []
+        rotas = self.issues_found.get('referencias_rotas') or {}
+
+        if integridad:
+            self.report_text.insert(tk.END, "❌ La verificación de integridad encontró daños en el archivo:\n")
+            for linea in integridad[:20]:
+                self.report_text.insert(tk.END, f"  - {linea}\n")
+            self.report_text.insert(tk.END, "  Se recomienda restaurar una copia de seguridad.\n\n")
+        if rotas:
+            self.report_text.insert(tk.END, "--- Referencias a Maestros Inexistentes (no se corrigen automáticamente) ---\n")
+            for table, n in rotas.items():
+                self.report_text.insert(tk.END, f"  - Tabla '{table}': {n} referencia(s).\n")
+            self.report_text.insert(tk.END, "\n")
 
         if not (has_orphans or has_missing_indexes):
-            self.report_text.insert(tk.END, "✅ ¡Excelente! No se encontraron problemas de integridad en la base de datos.")
+            if not integridad:
+                self.report_text.insert(tk.END, "✅ ¡Excelente! No se encontraron problemas de integridad en la base de datos.")
             self.btn_repair.config(state="disabled")
         else:
             self.report_text.insert(tk.END, "⚠️ Se encontraron los siguientes problemas:\n\n")
@@ -9270,6 +9409,41 @@ class VentanaSanityCheck(tk.Toplevel):
             else:
                 messagebox.showerror("Error", message, parent=self)
 
+    def rebuild_search_index(self):
+        """Reconstruye el índice FTS en segundo plano; las búsquedas siguen usando el actual."""
+        if self._fts_estado is not None or self.db.reconstruyendo_fts:
+            messagebox.showinfo("En curso", "Ya se está reconstruyendo el índice de búsqueda.", parent=self)
+            return
+        estado = self._fts_estado = {"hechas": 0, "total": 0, "fin": None}
+        self.db.reconstruir_fts(al_progresar=lambda hechas, total: estado.update(hechas=hechas, total=total),
+                                al_terminar=lambda ok, detalle: estado.update(fin=(ok, detalle)))
+        self.report_text.config(state="normal")
+        self.report_text.insert(tk.END, "\n\nReconstruyendo el índice de búsqueda (la búsqueda sigue disponible)...\n")
+        self.report_text.config(state="disabled")
+        self._seguir_reconstruccion()
+
+    def _seguir_reconstruccion(self):
+        if not self.winfo_exists():
+            return
+        estado = self._fts_estado
+        if estado["total"]:
+            self.progress['value'] = estado["hechas"] / estado["total"]
+        if estado["fin"] is None:
+            self.after(200, self._seguir_reconstruccion)
+            return
+        self._fts_estado = None
+        ok, detalle = estado["fin"]
+        self.progress['value'] = 1.0 if ok else 0.0
+        self.report_text.config(state="normal")
+        self.report_text.insert(tk.END, f"✅ Índice reconstruido: {detalle} registros indexados.\n" if ok
+                                else f"❌ No se pudo reconstruir el índice: {detalle}\n")
+        self.report_text.config(state="disabled")
+
+    def _cerrar(self):
+        if self._tarea is not None and not self._tarea.terminada:
+            self._tarea.cancelar()
+        self.destroy()
+
 def seleccionar_o_crear_db_inicial():
     """
     Usa una ventana raíz temporal para manejar la selección de la base de datos
@@ -9304,6 +9478,10 @@ def seleccionar_o_crear_db_inicial():
 
 
 class AppLicitacionesGUI(ThemedTk):
+    # Cada cuánto se sondea el registro de cambios de la BD (ms)
+    INTERVALO_CAMBIOS_MS = 5000
+    # Cada cuánto se consulta el avance de una copia de seguridad en curso
+    INTERVALO_RESPALDO_MS = 200
 
     def __init__(self, db_path):
             super().__init__()
@@ -9321,7 +9499,7 @@ class AppLicitacionesGUI(ThemedTk):
             self._guardar_configuracion(db_path=self.db_path) 
             
             # Inicialización de atributos
-            self.gestor_licitaciones = []
+            self.resumen_licitaciones = []  # filas de la lista (ver cargar_datos_desde_db)
             self.empresas_registradas = []
             self.instituciones_registradas = []
             self.documentos_maestros = []
@@ -9360,6 +9538,7 @@ class AppLicitacionesGUI(ThemedTk):
             # Carga de datos
             self.cargar_datos_desde_db()
             self._realizar_backup_automatico()
+            self.after(self.INTERVALO_CAMBIOS_MS, self._vigilar_cambios)
             self.reporter = ReportGenerator()
 
     def _cargar_configuracion(self):
@@ -9408,7 +9587,7 @@ class AppLicitacionesGUI(ThemedTk):
         total_lotes_ganados = 0
         estados_perdida_directa = ["Descalificado Fase A", "Descalificado Fase B", "Desierta", "Cancelada"]
 
-        for lic in self.gestor_licitaciones:
+        for lic in self.resumen_licitaciones:
             if lic.estado == "Adjudicada":
                 lotes_ganados_en_esta_lic = sum(1 for lote in lic.lotes if getattr(lote, "ganado_por_nosotros", False))
                 if lotes_ganados_en_esta_lic > 0:
@@ -9419,9 +9598,9 @@ class AppLicitacionesGUI(ThemedTk):
             elif lic.estado in estados_perdida_directa:
                 total_perdidas += 1
 
-        total_activas = len(self.gestor_licitaciones) - total_ganadas - total_perdidas
+        total_activas = len(self.resumen_licitaciones) - total_ganadas - total_perdidas
         
-        self.status_label_total.config(text=f"Datos Cargados. {len(self.gestor_licitaciones)} Licitaciones en Total")
+        self.status_label_total.config(text=f"Datos Cargados. {len(self.resumen_licitaciones)} Licitaciones en Total")
         self.status_label_activas.config(text=f"Activas: {total_activas}")
         self.status_label_ganadas.config(text=f"Ganadas: {total_ganadas}")
         self.status_label_lotes_ganados.config(text=f"Lotes Ganados: {total_lotes_ganados}")
@@ -9440,31 +9619,47 @@ class AppLicitacionesGUI(ThemedTk):
                     return # Ya se hizo un backup hoy
             
             print("INFO: Realizando backup automático...")
-            timestamp_str = datetime.datetime.now().strftime("%Y-%m-%d")
             backup_folder = os.path.join(os.path.dirname(self.db_path), "Backups")
-            os.makedirs(backup_folder, exist_ok=True)
-            
-            base_filename = os.path.basename(self.db_path).replace('.db', '')
-            backup_filename = f"{base_filename}_auto_{timestamp_str}.db"
-            backup_path = os.path.join(backup_folder, backup_filename)
-
-            # Pausar, copiar, reconectar
-            self.db.close()
-            shutil.copyfile(self.db_path, backup_path)
-            self._conectar_a_db(self.db_path)
 
-            self.db.cursor.execute(
-                "INSERT INTO backups_log (timestamp, ruta_archivo, comentario) VALUES (?, ?, ?)",
-                (datetime.datetime.now().isoformat(), backup_path, "Backup Automático")
-            )
-            self.db.conn.commit()
-            print(f"INFO: Backup automático creado en {backup_path}")
+            # Instantánea incremental (solo los bloques que cambiaron) con poda
+            # según la política de retención guardada en config_app (ver respaldos.py)
+            almacen = AlmacenRespaldos(os.path.join(backup_folder, "almacen"))
+            retencion = politica_retencion(self.db.get_setting('retencion_respaldos'))
+            tarea = almacen.crear_instantanea(self.db, "Backup Automático", retencion=retencion)
+            self._seguir_respaldo(tarea, "Backup Automático")
 
         except Exception as e:
             print(f"ERROR: Falló el backup automático: {e}")
-            # Asegurarse de reconectar si algo falla
-            if not getattr(self.db, 'conn', None):
-                self._conectar_a_db(self.db_path)
+
+    def _seguir_respaldo(self, tarea, comentario, al_terminar=None):
+        """
+        Sondea desde el hilo de Tk un respaldo en segundo plano: muestra el
+        avance en la barra de estado y, al terminar bien, lo registra en
+        backups_log. al_terminar(tarea) se llama siempre al final.
+        """
+        if not tarea.terminada:
+            if hasattr(self, 'status_label_total'):
+                self.status_label_total.config(text=f"Creando copia de seguridad... {tarea.fraccion:.0%}")
+            self.after(self.INTERVALO_RESPALDO_MS, self._seguir_respaldo, tarea, comentario, al_terminar)
+            return
+        if tarea.error is None:
+            try:
+                self.db.cursor.execute(
+                    "INSERT INTO backups_log (timestamp, ruta_archivo, comentario) VALUES (?, ?, ?)",
+                    (datetime.datetime.now().isoformat(), tarea.destino, comentario)
+                )
+                if tarea.podadas:
+                    self.db.cursor.executemany("DELETE FROM backups_log WHERE ruta_archivo = ?",
+                                               [(ruta,) for ruta in tarea.podadas])
+                self.db.conn.commit()
+                print(f"INFO: Copia de seguridad creada en {tarea.destino}")
+            except Exception as e:
+                print(f"ERROR: No se pudo registrar la copia de seguridad: {e}")
+        else:
+            print(f"ERROR: Falló la copia de seguridad: {tarea.error}")
+        self._actualizar_contadores_barra_estado()
+        if al_terminar:
+            al_terminar(tarea)
 
     def _get_tooltip_text(self):
         try:
@@ -9665,7 +9860,7 @@ class AppLicitacionesGUI(ThemedTk):
         # <-- CORRECCIÓN: Índice cambiado a [1] para obtener el código del proceso
         numero_proceso_sel = self.tree.item(selection[0], 'values')[0]
 
-        if licitacion := next((lic for lic in self.gestor_licitaciones if lic.numero_proceso == numero_proceso_sel), None):
+        if licitacion := self._resumen_por_numero(numero_proceso_sel):
             self._update_status_display(licitacion)
 
     def _update_status_display(self, licitacion):
@@ -9704,25 +9899,17 @@ class AppLicitacionesGUI(ThemedTk):
             backup_filename = f"{base_filename}_backup_{timestamp_str}.db"
             backup_path = os.path.join(backup_folder, backup_filename)
 
-            # Pausamos la conexión a la BD actual para copiar el archivo de forma segura
-            self.db.close()
-            shutil.copyfile(self.db_path, backup_path)
-
-            # Nos reconectamos y guardamos el registro del backup
-            self._conectar_a_db(self.db_path)
-            self.db.cursor.execute(
-                "INSERT INTO backups_log (timestamp, ruta_archivo, comentario) VALUES (?, ?, ?)",
-                (datetime.datetime.now().isoformat(), backup_path, comentario)
-            )
-            self.db.conn.commit()
+            # Copia en caliente en segundo plano; la app sigue usable mientras tanto
+            def _avisar(tarea):
+                if tarea.error is None:
+                    messagebox.showinfo("Éxito", f"Copia de seguridad creada con éxito en:\n{tarea.destino}", parent=self)
+                else:
+                    messagebox.showerror("Error", f"No se pudo crear la copia de seguridad:\n{tarea.error}", parent=self)
 
-            messagebox.showinfo("Éxito", f"Copia de seguridad creada con éxito en:\n{backup_path}", parent=self)
+            self._seguir_respaldo(respaldar(self.db, backup_path), comentario, _avisar)
 
         except Exception as e:
             messagebox.showerror("Error", f"No se pudo crear la copia de seguridad:\n{e}", parent=self)
-            # Intentar reconectar incluso si falla
-            if not self.db.conn:
-                self._conectar_a_db(self.db_path)
 
 
     def _restaurar_desde_copia(self):
@@ -9732,7 +9919,7 @@ class AppLicitacionesGUI(ThemedTk):
     def aplicar_filtros(self):
         criterios = { 'estado': self.filtro_estado_var.get(), 'empresa': self.filtro_empresa_var.get(),
                       'busqueda': self.filtro_busqueda_var.get().lower(), 'lote': self.filtro_lote_var.get().lower() }
-        lista_filtrada = self.gestor_licitaciones[:]
+        lista_filtrada = self.resumen_licitaciones[:]
         if criterios['estado']: lista_filtrada = [l for l in lista_filtrada if l.estado == criterios['estado']]
         if criterios['empresa']: lista_filtrada = [l for l in lista_filtrada if str(l.empresa_nuestra) == criterios['empresa']]
         if criterios['busqueda']: lista_filtrada = [l for l in lista_filtrada if criterios['busqueda'] in f"{l.nombre_proceso} {l.numero_proceso} {l.institucion}".lower()]
@@ -9744,10 +9931,10 @@ class AppLicitacionesGUI(ThemedTk):
         self.aplicar_filtros()
 
     def actualizar_combos_filtros(self):
-        self.filtro_estado_combo['values'] = [""] + sorted({l.estado for l in self.gestor_licitaciones})
+        self.filtro_estado_combo['values'] = [""] + sorted({l.estado for l in self.resumen_licitaciones})
         # Reunir todas las empresas de todas las licitaciones
         todas_empresas = set()
-        for l in self.gestor_licitaciones:
+        for l in self.resumen_licitaciones:
             for e in l.empresas_nuestras:
                 todas_empresas.add(str(e))
 
@@ -9755,55 +9942,55 @@ class AppLicitacionesGUI(ThemedTk):
 
 # EN LA CLASE AppLicitacionesGUI, DENTRO DE gestor_licitaciones_db.py
 
-    def cargar_datos_desde_db(self):
-        lic_data, emp_data, inst_data, docs_data, comp_maestros, resp_maestros = self.db.get_all_data()
-        self.gestor_licitaciones = [Licitacion(**data) for data in lic_data]
-        for lic in self.gestor_licitaciones:
-            if not getattr(lic, 'id', None):
-                continue
-            # --- Inyectar ganadores por lote desde la BD (ESQUEMA NUEVO) ---
-            try:
-                filas = self.db.get_ganadores_por_lote(lic.id)  # devuelve dicts con ganador_nombre y empresa_nuestra (si aplica)
-                by_lote = {str(r.get("lote_numero")): r for r in filas}
-
-                # Conjunto con nombres de nuestras empresas para comparar rápido
-                nuestras_empresas = {str(e).strip() for e in getattr(lic, "empresas_nuestras", [])}
+    def _mapa_licitaciones(self):
+        """Mapa de identidad de la conexión actual (se recrea si cambia self.db)."""
+        mapa = getattr(self, "_mapa", None)
+        if mapa is None or mapa.db is not self.db:
+            mapa = self._mapa = MapaIdentidad(self.db, FABRICA_MODELOS)
+        return mapa
 
-                for lote in lic.lotes:
-                    key = str(getattr(lote, "numero", ""))
-                    info = by_lote.get(key)
-
-                    if not info:
-                        # limpiar por si venía algo colgado
-                        lote.ganador_nombre = ""
-                        lote.ganado_por_nosotros = False
-                        continue
-
-                    ganador = (info.get("ganador_nombre") or "").strip()
-                    emp_nuestra_row = (info.get("empresa_nuestra") or "").strip()
-                    emp_nuestra_lote = (getattr(lote, "empresa_nuestra", "") or "").strip()
-
-                    lote.ganador_nombre = ganador
+    @property
+    def gestor_licitaciones(self):
+        """
+        Todas las licitaciones completas (reportes, perfiles, análisis). Se
+        hidratan recién cuando alguien las pide y el mapa de identidad las
+        reutiliza; la lista principal trabaja con self.resumen_licitaciones.
+        """
+        return self._mapa_licitaciones().todas()
 
-                    # Regla: es nuestro si (a) la fila tiene empresa_nuestra, o
-                    # (b) la empresa_nuestra del lote coincide con el ganador, o
-                    # (c) el ganador es alguna de nuestras empresas cargadas en la licitación.
-                    es_nuestro = bool(emp_nuestra_row) \
-                                or (emp_nuestra_lote and ganador and emp_nuestra_lote == ganador) \
-                                or (ganador in nuestras_empresas)
+    def _resumen_por_numero(self, numero_proceso):
+        return next((r for r in self.resumen_licitaciones if r.numero_proceso == numero_proceso), None)
 
-                    lote.ganado_por_nosotros = bool(es_nuestro)
+    def _licitacion_por_numero(self, numero_proceso):
+        """Carga completa de UNA licitación de la lista (la que se va a abrir/editar)."""
+        resumen = self._resumen_por_numero(numero_proceso)
+        lic_id = resumen.id if resumen else self.db.get_licitacion_id_por_numero(numero_proceso)
+        return self._mapa_licitaciones().obtener(lic_id) if lic_id is not None else None
 
-                    # (Opcional) marca 'ganador' en las ofertas de competidores para este lote
-                    if hasattr(lic, "oferentes_participantes") and lic.oferentes_participantes:
-                        for comp in lic.oferentes_participantes:
-                            for o in comp.ofertas_por_lote:
-                                if str(o.get("lote_numero")) == key:
-                                    o["ganador"] = (comp.nombre.strip() == ganador)
+    def _vigilar_cambios(self):
+        """
+        Sondea el registro de cambios (guardados de otras ventanas o de otra
+        máquina sobre la misma BD) y, si hubo, descarta esas licitaciones del
+        mapa de identidad y refresca la lista desde el resumen.
+        """
+        try:
+            if self._mapa_licitaciones().sincronizar():
+                self.resumen_licitaciones = self.db.cargar_resumenes(FABRICA_MODELOS)
+                self.aplicar_filtros()
+        except Exception as e:
+            print(f"[WARN] No se pudo sondear cambios en la BD: {e}")
+        finally:
+            self.after(self.INTERVALO_CAMBIOS_MS, self._vigilar_cambios)
 
-            except Exception as e:
-                print("[WARN] No se pudo inyectar ganadores por lote al cargar:", e)
-            # --- fin bloque de inyección ---
+    def cargar_datos_desde_db(self):
+        # La lista solo necesita el resumen (cabecera, lotes y conteos de documentos);
+        # cada licitación se carga completa al abrirla (_licitacion_por_numero), y el
+        # mapa de identidad solo recarga las que cambiaron.
+        self.resumen_licitaciones = self.db.cargar_resumenes(FABRICA_MODELOS)
+        if self.resumen_licitaciones:
+            emp_data, inst_data, docs_data, comp_maestros, resp_maestros = self.db.get_datos_maestros()
+        else:
+            emp_data, inst_data, docs_data, comp_maestros, resp_maestros = [], [], [], [], []
 
         self.empresas_registradas = emp_data
         self.instituciones_registradas = inst_data
@@ -10037,7 +10224,7 @@ class AppLicitacionesGUI(ThemedTk):
         return ", ".join(emps) if emps else "(Sin Asignar)"
 
     def actualizar_tabla_gui(self, lista_a_mostrar=None):
-        lista_para_usar = lista_a_mostrar if lista_a_mostrar is not None else self.gestor_licitaciones
+        lista_para_usar = lista_a_mostrar if lista_a_mostrar is not None else self.resumen_licitaciones
         self.tree.delete(*self.tree.get_children())
 
         estados_finalizados = ["Adjudicada", "Descalificado Fase A", "Descalificado Fase B", "Desierta", "Cancelada"]
@@ -10047,7 +10234,7 @@ class AppLicitacionesGUI(ThemedTk):
         def obtener_clave_ordenamiento(licitacion):
             hoy = datetime.date.today()
             # Si tiene subsanables, es la máxima prioridad
-            if any(getattr(doc, 'requiere_subsanacion', False) for doc in licitacion.documentos_solicitados):
+            if licitacion.tiene_subsanables():
                 datos_sub = licitacion.cronograma.get("Entrega de Subsanaciones", {})
                 if datos_sub.get("fecha_limite"):
                     try: return datetime.datetime.strptime(datos_sub["fecha_limite"], "%Y-%m-%d").date()
@@ -10155,7 +10342,7 @@ class AppLicitacionesGUI(ThemedTk):
         # 2) Obtener la licitación original desde el Treeview
         #    Tomamos el número de proceso (columna 0 de values)
         numero_original = self.tree.item(iid, 'values')[0]
-        original = next((l for l in self.gestor_licitaciones if l.numero_proceso == numero_original), None)
+        original = self._licitacion_por_numero(numero_original)
         if not original:
             messagebox.showerror("Error", "No se encontró la licitación original.")
             return
@@ -10184,7 +10371,7 @@ class AppLicitacionesGUI(ThemedTk):
         sufijo = ("".join(filter(str.isalnum, nueva_empresa_nombre))[:10]).upper()
         propuesto = f"{base_code}-{sufijo}"
 
-        existentes = {l.numero_proceso for l in self.gestor_licitaciones}
+        existentes = {l.numero_proceso for l in self.resumen_licitaciones}
         nuevo_codigo = propuesto
         contador = 2
         while nuevo_codigo in existentes:
@@ -10239,7 +10426,7 @@ class AppLicitacionesGUI(ThemedTk):
         try:
             # <-- CORRECCIÓN: Índice cambiado a [1] para obtener el código del proceso
             numero_proceso_sel = self.tree.item(iid, 'values')[0]
-            licitacion = next((l for l in self.gestor_licitaciones if l.numero_proceso == numero_proceso_sel), None)
+            licitacion = self._licitacion_por_numero(numero_proceso_sel)
             if licitacion:
                 VentanaVistaLotes(self, licitacion)
         except (IndexError, StopIteration):
@@ -10250,7 +10437,7 @@ class AppLicitacionesGUI(ThemedTk):
     def abrir_ventana_detalles(self):
         if not (iid := self.tree.focus()): messagebox.showwarning("Sin Selección", "Selecciona una licitación."); return
         if iid == "finalizadas_parent": return
-        if licitacion := next((l for l in self.gestor_licitaciones if l.numero_proceso == self.tree.item(iid, 'values')[0]), None):
+        if licitacion := self._licitacion_por_numero(self.tree.item(iid, 'values')[0]):
             # --- AÑADE self.instituciones_registradas AL FINAL ---
             VentanaDetalles(self, licitacion, self.cargar_datos_desde_db, self.documentos_maestros, self.categorias_documentos, self.db, self.instituciones_registradas)
     
@@ -10260,7 +10447,7 @@ class AppLicitacionesGUI(ThemedTk):
         if not (iid := self.tree.focus()): messagebox.showwarning("Sin Selección", "Selecciona una licitación."); return
         if iid == "finalizadas_parent": return
         # <-- CORRECCIÓN: Índice cambiado a [1] para obtener el código del proceso
-        if licitacion := next((l for l in self.gestor_licitaciones if l.numero_proceso == self.tree.item(iid, 'values')[0]), None):
+        if licitacion := self._licitacion_por_numero(self.tree.item(iid, 'values')[0]):
             VentanaReporte(self, licitacion)
             
     def abrir_ventana_reportes_globales(self):
@@ -10271,7 +10458,7 @@ class AppLicitacionesGUI(ThemedTk):
             messagebox.showinfo("Éxito", f"Reporte guardado en:\n{file_path}", parent=self)
             
     def abrir_dashboard_global(self):
-        if not self.gestor_licitaciones: messagebox.showinfo("Sin Datos", "No hay licitaciones para generar un dashboard."); return
+        if not self.resumen_licitaciones: messagebox.showinfo("Sin Datos", "No hay licitaciones para generar un dashboard."); return
         VentanaDashboardGlobal(self, self.gestor_licitaciones)
         
     def abrir_ventana_maestro_docs(self): VentanaMaestroDocumentos(self, self.documentos_maestros, self.categorias_documentos, self.db)
@@ -10300,9 +10487,11 @@ class AppLicitacionesGUI(ThemedTk):
         """Se activa cuando el perfil de entorno cambia y lo guarda en la BD."""
         nuevo_perfil = self.perfil_entorno.get()
         self.db.set_setting('env_profile', nuevo_perfil)
+        self.db.aplicar_perfil_conexion(nuevo_perfil)
         messagebox.showinfo("Perfil Actualizado",
                             f"Se ha cambiado el perfil a '{nuevo_perfil}'.\n\n"
-                            "Se recomienda reiniciar la aplicación para que todos los ajustes surtan efecto.",
+                            "Los ajustes de conexión ya están activos; si la base de datos estaba "
+                            "abierta en otro equipo, se completarán al reiniciar la aplicación.",
                             parent=self)
 
     # Pega estos 5 nuevos métodos dentro de la clase AppLicitacionesGUI
@@ -10377,7 +10566,7 @@ class AppLicitacionesGUI(ThemedTk):
         if iid == "finalizadas_parent": return
 
         numero_proceso_sel = self.tree.item(iid, 'values')[0]
-        licitacion = next((l for l in self.gestor_licitaciones if l.numero_proceso == numero_proceso_sel), None)
+        licitacion = self._licitacion_por_numero(numero_proceso_sel)
 
         if licitacion:
             self.debug_log("Eliminación Licitación (Inicio)", licitacion.to_summary_dict())
@@ -10609,7 +10798,7 @@ class AppLicitacionesGUI(ThemedTk):
             for widget in self.dashboard_content.winfo_children():
                 widget.destroy()
 
-            if not self.gestor_licitaciones:
+            if not self.resumen_licitaciones:
                 ttk.Label(self.dashboard_content, text="No hay datos para mostrar.", font=("Helvetica", 14)).pack(pady=50)
                 return
 
@@ -10630,7 +10819,7 @@ class AppLicitacionesGUI(ThemedTk):
         stats = {"Ganada": 0, "Perdida": 0, "En Proceso": 0}
         estados_finalizados = ["Adjudicada", "Descalificado Fase A", "Descalificado Fase B", "Desierta", "Cancelada"]
 
-        for lic in self.gestor_licitaciones:
+        for lic in self.resumen_licitaciones:
             if lic.estado == "Adjudicada":
                 if any(l.ganado_por_nosotros for l in lic.lotes):
                     stats["Ganada"] += 1
@@ -10670,7 +10859,7 @@ class AppLicitacionesGUI(ThemedTk):
         frame = ttk.LabelFrame(parent, text="Rendimiento por Empresa")
         
         stats = defaultdict(lambda: {'participaciones': 0, 'ganadas': 0})
-        for lic in self.gestor_licitaciones:
+        for lic in self.resumen_licitaciones:
             empresas_participantes = self._nuestras_empresas_de(lic)
             if not empresas_participantes: continue
 
@@ -10711,11 +10900,11 @@ class AppLicitacionesGUI(ThemedTk):
         """Crea una tabla con el top 5 de instituciones."""
         frame = ttk.LabelFrame(parent, text="Top 5 Instituciones por Participación")
         
-        if not self.gestor_licitaciones:
+        if not self.resumen_licitaciones:
             ttk.Label(frame, text="No hay datos.").pack()
             return frame
 
-        conteo = Counter(lic.institucion for lic in self.gestor_licitaciones)
+        conteo = Counter(lic.institucion for lic in self.resumen_licitaciones)
         
         tree = ttk.Treeview(frame, columns=("institucion", "cantidad"), show="headings", height=5)
         tree.heading("institucion", text="Institución")
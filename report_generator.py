@@ -153,7 +153,7 @@ class ReportGenerator:
         winners_by_lot = self._map_ganadores_por_lote(licitacion)
         nuestras_empresas = {self._norm(str(e)) for e in getattr(licitacion, "empresas_nuestras", [])}
 
-        participantes = [o.__dict__ for o in getattr(licitacion, "oferentes_participantes", [])]
+        participantes = [o.to_dict() for o in getattr(licitacion, "oferentes_participantes", [])]
         nuestras = ", ".join(str(e) for e in getattr(licitacion, "empresas_nuestras", [])) or "Nuestras Empresas"
         nuestras_ofertas = [
             {'lote_numero': l.numero, 'monto': l.monto_ofertado, 'paso_fase_A': l.fase_A_superada}
@@ -274,7 +274,7 @@ class ReportGenerator:
         winners_by_lot = self._map_ganadores_por_lote(lic)
         nuestras_empresas = {self._norm(str(e)) for e in getattr(lic, "empresas_nuestras", [])}
 
-        participantes = [o.__dict__ for o in getattr(lic, "oferentes_participantes", [])]
+        participantes = [o.to_dict() for o in getattr(lic, "oferentes_participantes", [])]
         nuestras = ", ".join(str(e) for e in getattr(lic, "empresas_nuestras", [])) or "Nuestras Empresas"
         nuestras_ofertas = [
             {'lote_numero': l.numero, 'monto': l.monto_ofertado, 'paso_fase_A': l.fase_A_superada}
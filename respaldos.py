@@ -0,0 +1,487 @@
+"""
+Respaldos en caliente de la base de datos con la API de backup de SQLite.
+
+En lugar de cerrar la conexión, copiar el archivo y reconectar (lo que volvía
+a pasar por las migraciones y el arranque de DatabaseManager), la copia se
+hace página a página desde una conexión del pool de lectura y en un hilo
+aparte; la conexión escritora sigue abierta y la interfaz no se congela.
+sqlite3.Connection.backup() garantiza una copia consistente: si otra conexión
+escribe a mitad de camino, el respaldo se reinicia solo.
+
+    tarea = respaldar(db, "Backups/licitaciones_2024-05-01.db")
+    ...
+    if tarea.terminada and tarea.error is None:
+        print(tarea.destino)
+
+Para restaurar, preparar_restauracion() copia y valida el respaldo en un
+candidato junto a la BD (sin tocar la que está en uso) y
+DatabaseManager.reemplazar_archivo() lo pone en su lugar y reabre en caliente.
+
+Los respaldos automáticos van a un AlmacenRespaldos: la instantánea se parte
+en bloques de tamaño fijo direccionados por su SHA-256 y solo se guardan los
+bloques nuevos, más un manifiesto JSON por instantánea. Como la carpeta de
+Backups está en Dropbox, lo que se sube (y lo que ocupa) crece con lo que
+cambió entre respaldos y no con el tamaño de la BD:
+
+    Backups/almacen/bloques/3f/3fa4...   (bloque comprimido con zlib)
+    Backups/almacen/manifiestos/20240501-120000-000000.json
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.request
+import zlib
+
+# Páginas copiadas por paso (con páginas de 4 KiB, 1 MiB por paso); entre
+# pasos el escritor puede seguir trabajando.
+PAGINAS_POR_PASO = 256
+
+
+class TareaRespaldo:
+    """Estado de un respaldo en curso; se puede consultar desde cualquier hilo."""
+    __slots__ = ("destino", "copiadas", "total", "error", "podadas", "_descartada", "_hecho")
+
+    def __init__(self, destino):
+        self.destino = destino
+        self.copiadas = 0
+        self.total = 0
+        self.error = None
+        self.podadas = []  # manifiestos eliminados por la retención (solo AlmacenRespaldos)
+        self._descartada = False  # ver descartar_restauracion
+        self._hecho = threading.Event()
+
+    @property
+    def terminada(self) -> bool:
+        return self._hecho.is_set()
+
+    @property
+    def fraccion(self) -> float:
+        """Avance entre 0 y 1."""
+        if self.terminada:
+            return 1.0
+        return self.copiadas / self.total if self.total else 0.0
+
+    def esperar(self, timeout=None) -> bool:
+        """Bloquea hasta que termine (o venza timeout). Devuelve True si terminó."""
+        return self._hecho.wait(timeout)
+
+
+def respaldar(db, destino, al_progresar=None, al_terminar=None,
+              paginas_por_paso=PAGINAS_POR_PASO, en_segundo_plano=True) -> TareaRespaldo:
+    """
+    Copia la BD de 'db' (DatabaseManager) a 'destino' sin cerrar su conexión.
+
+    - al_progresar(copiadas, total) y al_terminar(tarea) se llaman desde el
+      hilo del respaldo: una interfaz debe pasar el aviso a su propio hilo
+      (o sondear la TareaRespaldo con un temporizador).
+    - Se escribe en 'destino.parcial' y se renombra al terminar, así nunca
+      queda un respaldo a medias con el nombre definitivo.
+    - Los errores no se lanzan: quedan en tarea.error.
+    """
+    tarea = TareaRespaldo(destino)
+
+    def _trabajo():
+        with db.lector() as origen:
+            _copiar(origen, destino, tarea, al_progresar, paginas_por_paso)
+
+    _lanzar(tarea, _trabajo, al_terminar, _en_hilo(db, en_segundo_plano))
+    return tarea
+
+
+def _lanzar(tarea, trabajo, al_terminar, en_hilo, nombre="db-respaldo", accion="el respaldo a"):
+    """Corre trabajo() (en un hilo aparte si en_hilo), dejando el error (si hay) en la tarea."""
+    def _ejecutar():
+        try:
+            trabajo()
+        except Exception as e:
+            tarea.error = e
+            logging.warning(f"[DB] Falló {accion} {tarea.destino}: {e}")
+        finally:
+            tarea._hecho.set()
+            if al_terminar is not None:
+                al_terminar(tarea)
+
+    if en_hilo:
+        threading.Thread(target=_ejecutar, name=nombre, daemon=True).start()
+    else:
+        _ejecutar()
+
+
+def _en_hilo(db, en_segundo_plano):
+    # Con ':memory:' el lector es la propia conexión escritora: no se puede usar desde otro hilo
+    return en_segundo_plano and db.db_path != ":memory:"
+
+
+def _copiar(origen, destino, tarea, al_progresar, paginas_por_paso):
+    carpeta = os.path.dirname(destino)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+    parcial = destino + ".parcial"
+    if os.path.exists(parcial):
+        os.remove(parcial)
+
+    def _progreso(_estado, restantes, total):
+        tarea.copiadas, tarea.total = total - restantes, total
+        if al_progresar is not None:
+            al_progresar(tarea.copiadas, total)
+
+    copia = sqlite3.connect(parcial)
+    try:
+        origen.backup(copia, pages=paginas_por_paso, progress=_progreso)
+        # El respaldo es un archivo suelto: sin WAL (la cabecera copiada conserva el modo del origen)
+        copia.execute("PRAGMA journal_mode = DELETE")
+    except BaseException:
+        copia.close()
+        os.remove(parcial)
+        raise
+    copia.close()
+    os.replace(parcial, destino)
+
+
+# --- Restauración ------------------------------------------------------------
+
+# Ordena el final de la verificación contra descartar_restauracion().
+_CANDADO_RESTAURACION = threading.Lock()
+
+def preparar_restauracion(db, origen, al_progresar=None, al_terminar=None,
+                          paginas_por_paso=PAGINAS_POR_PASO, en_segundo_plano=True) -> TareaRespaldo:
+    """
+    Primera mitad de una restauración, sin tocar la BD en uso: copia 'origen'
+    (un respaldo .db o el manifiesto .json de un AlmacenRespaldos) a un
+    candidato junto a la BD y lo valida (validar_respaldo). Al terminar bien,
+    tarea.destino es el candidato y el hilo de la interfaz completa con
+    db.reemplazar_archivo(tarea.destino), que lo renombra y reabre en caliente.
+    Si falla, tarea.error explica por qué y no queda candidato.
+    """
+    candidato = os.path.abspath(db.db_path) + ".restaurando"
+    tarea = TareaRespaldo(candidato)
+
+    def _trabajo():
+        try:
+            if origen.endswith(".json"):
+                # Los bloques se verifican por hash al rearmar
+                restaurar_instantanea(origen, candidato)
+            else:
+                if not os.path.isfile(origen):
+                    raise FileNotFoundError(f"No existe el respaldo {origen}")
+                fuente = sqlite3.connect(origen)  # no ro: un respaldo en modo WAL sin -shm no abriría
+                try:
+                    _copiar(fuente, candidato, tarea, al_progresar, paginas_por_paso)
+                finally:
+                    fuente.close()
+            validar_respaldo(candidato, db)
+            with _CANDADO_RESTAURACION:
+                if tarea._descartada:
+                    raise RuntimeError("Restauración descartada antes de terminar la verificación.")
+        except BaseException:
+            if os.path.exists(candidato):
+                os.remove(candidato)
+            raise
+
+    # A diferencia de respaldar(), no lee de 'db': puede ir en segundo plano también con ':memory:'
+    _lanzar(tarea, _trabajo, al_terminar, en_segundo_plano, "db-restauracion", "la preparación de")
+    return tarea
+
+
+def descartar_restauracion(tarea):
+    """
+    Abandona una restauración preparada con preparar_restauracion (p. ej. si
+    se cierra la ventana): si todavía se está verificando, el hilo borra el
+    candidato al terminar; si ya terminó bien, se borra aquí. Así no queda un
+    '.restaurando' junto a la BD (en la carpeta sincronizada).
+    """
+    with _CANDADO_RESTAURACION:
+        tarea._descartada = True
+        listo = tarea.terminada and tarea.error is None
+    if listo and os.path.exists(tarea.destino):
+        os.remove(tarea.destino)
+
+
+def validar_respaldo(ruta, db):
+    """
+    PRAGMA quick_check y verificación de esquema (db.verificar_esquema) sobre
+    el archivo 'ruta'. Lanza ValueError con el motivo si no se puede restaurar.
+    """
+    conn = sqlite3.connect(f"file:{urllib.request.pathname2url(os.path.abspath(ruta))}?mode=ro", uri=True)
+    try:
+        resultado = [r[0] for r in conn.execute("PRAGMA quick_check")]
+        if resultado != ["ok"]:
+            raise ValueError("El respaldo está dañado (quick_check): " + "; ".join(resultado[:5]))
+        db.verificar_esquema(conn)
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"El respaldo no es una base de datos válida: {e}") from e
+    finally:
+        conn.close()
+
+
+# --- Almacén incremental -----------------------------------------------------
+
+# Múltiplo de cualquier page_size de SQLite (512 B a 64 KiB): un bloque nunca
+# parte una página. Más chico deduplica mejor pero multiplica los archivos que
+# Dropbox tiene que sincronizar.
+TAMANO_BLOQUE = 64 * 1024
+
+# Instantáneas a conservar: la más reciente de cada uno de los últimos N días,
+# N semanas ISO y N meses que tengan alguna (además de la última de todas).
+RETENCION_POR_DEFECTO = {"diarios": 7, "semanales": 4, "mensuales": 12}
+
+# Un bloque sin referencias más nuevo que esto no se borra: puede ser de una
+# instantánea que otra máquina todavía está escribiendo (carpeta compartida).
+GRACIA_RECOLECCION_S = 3600
+
+# Serializa creación y poda dentro del proceso (la poda no debe ver bloques
+# de una instantánea cuyo manifiesto todavía no se escribió).
+_CANDADO_ALMACEN = threading.Lock()
+
+
+def politica_retencion(texto=None) -> dict:
+    """
+    Política de retención a partir del JSON guardado en config_app
+    ('retencion_respaldos'), p. ej. '{"diarios": 14, "mensuales": 24}'.
+    Las claves que falten (o un valor ilegible) toman RETENCION_POR_DEFECTO.
+    """
+    politica = dict(RETENCION_POR_DEFECTO)
+    if texto:
+        try:
+            datos = json.loads(texto)
+            for clave in politica:
+                if clave in datos:
+                    politica[clave] = max(0, int(datos[clave]))
+        except (ValueError, TypeError, AttributeError) as e:
+            logging.warning(f"[DB] Política de retención inválida ({texto!r}): {e}; se usa la por defecto.")
+    return politica
+
+
+class AlmacenRespaldos:
+    """Almacén de instantáneas deduplicadas por bloque en la carpeta 'carpeta'."""
+
+    def __init__(self, carpeta, tamano_bloque=TAMANO_BLOQUE):
+        self.carpeta = carpeta
+        self.tamano_bloque = tamano_bloque
+        self.dir_bloques = os.path.join(carpeta, "bloques")
+        self.dir_manifiestos = os.path.join(carpeta, "manifiestos")
+
+    # --- creación ---
+
+    def crear_instantanea(self, db, comentario="", retencion=None, al_progresar=None, al_terminar=None,
+                          paginas_por_paso=PAGINAS_POR_PASO, en_segundo_plano=True) -> TareaRespaldo:
+        """
+        Toma una instantánea de 'db' (DatabaseManager) y la guarda en el almacén.
+
+        La copia consistente se hace como en respaldar() a un archivo temporal
+        fuera de la carpeta sincronizada; después se parte en bloques y solo se
+        escriben los que el almacén no tiene. Si se pasa 'retencion' (ver
+        politica_retencion), al terminar se podan las instantáneas que quedan
+        fuera de la política y los bloques que ya nadie referencia.
+        Al terminar, tarea.destino es la ruta del manifiesto.
+        """
+        tarea = TareaRespaldo(None)
+
+        def _trabajo():
+            fd, temporal = tempfile.mkstemp(suffix=".db", prefix="instantanea_")
+            os.close(fd)
+            try:
+                with db.lector() as origen:
+                    _copiar(origen, temporal, tarea, al_progresar, paginas_por_paso)
+                with _CANDADO_ALMACEN:
+                    tarea.destino = self.guardar_archivo(temporal, comentario)
+                    if retencion is not None:
+                        tarea.podadas = self.aplicar_retencion(retencion)
+            finally:
+                if os.path.exists(temporal):
+                    os.remove(temporal)
+
+        _lanzar(tarea, _trabajo, al_terminar, _en_hilo(db, en_segundo_plano))
+        return tarea
+
+    def guardar_archivo(self, ruta, comentario="") -> str:
+        """Agrega al almacén el archivo 'ruta' (ya consistente) y devuelve la ruta del manifiesto."""
+        ahora = datetime.datetime.now()
+        bloques, nuevos = [], 0
+        tamano = 0
+        with open(ruta, "rb") as f:
+            while True:
+                datos = f.read(self.tamano_bloque)
+                if not datos:
+                    break
+                tamano += len(datos)
+                resumen = hashlib.sha256(datos).hexdigest()
+                nuevos += self._escribir_bloque(resumen, datos)
+                bloques.append(resumen)
+
+        manifiesto = {
+            "version": 1,
+            "id": ahora.strftime("%Y%m%d-%H%M%S-%f"),
+            "creado": ahora.isoformat(timespec="seconds"),
+            "comentario": comentario,
+            "origen": os.path.basename(ruta),
+            "tamano": tamano,
+            "tamano_bloque": self.tamano_bloque,
+            "bloques": bloques,
+        }
+        os.makedirs(self.dir_manifiestos, exist_ok=True)
+        destino = os.path.join(self.dir_manifiestos, manifiesto["id"] + ".json")
+        _escribir_atomico(destino, json.dumps(manifiesto, indent=1).encode("utf-8"))
+        logging.info(f"[DB] Instantánea {manifiesto['id']}: {len(bloques)} bloques, {nuevos} nuevos.")
+        return destino
+
+    def _ruta_bloque(self, resumen):
+        return os.path.join(self.dir_bloques, resumen[:2], resumen)
+
+    def _escribir_bloque(self, resumen, datos) -> int:
+        """Escribe el bloque si no existe; devuelve 1 si era nuevo."""
+        ruta = self._ruta_bloque(resumen)
+        try:
+            # Al reutilizarlo se renueva su fecha: recolectar() en otra máquina solo borra
+            # bloques sin referencias más viejos que el período de gracia, y este todavía
+            # no figura en ningún manifiesto.
+            os.utime(ruta)
+            return 0
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        _escribir_atomico(ruta, zlib.compress(datos, 6))
+        return 1
+
+    # --- consulta y restauración ---
+
+    def instantaneas(self) -> list:
+        """Manifiestos del almacén (dicts con 'ruta' agregada), del más reciente al más antiguo."""
+        if not os.path.isdir(self.dir_manifiestos):
+            return []
+        resultado = []
+        for nombre in os.listdir(self.dir_manifiestos):
+            if not nombre.endswith(".json"):
+                continue
+            ruta = os.path.join(self.dir_manifiestos, nombre)
+            try:
+                manifiesto = leer_manifiesto(ruta)
+            except (OSError, ValueError) as e:
+                logging.warning(f"[DB] Manifiesto ilegible {ruta}: {e}")
+                continue
+            manifiesto["ruta"] = ruta
+            resultado.append(manifiesto)
+        resultado.sort(key=lambda m: m["id"], reverse=True)
+        return resultado
+
+    def restaurar(self, manifiesto, destino) -> str:
+        """
+        Rearma la instantánea 'manifiesto' (ruta o dict) en 'destino', verificando
+        el hash de cada bloque y el tamaño total. Escribe en 'destino.parcial' y
+        renombra al final; si falta o está dañado un bloque lanza ValueError y
+        'destino' queda intacto.
+        """
+        if isinstance(manifiesto, str):
+            manifiesto = leer_manifiesto(manifiesto)
+        parcial = destino + ".parcial"
+        try:
+            with open(parcial, "wb") as f:
+                for resumen in manifiesto["bloques"]:
+                    try:
+                        with open(self._ruta_bloque(resumen), "rb") as b:
+                            datos = zlib.decompress(b.read())
+                    except (OSError, zlib.error) as e:
+                        raise ValueError(f"Bloque {resumen} faltante o ilegible: {e}") from e
+                    if hashlib.sha256(datos).hexdigest() != resumen:
+                        raise ValueError(f"Bloque {resumen} dañado (el hash no coincide).")
+                    f.write(datos)
+                if f.tell() != manifiesto["tamano"]:
+                    raise ValueError(f"Tamaño rearmado {f.tell()} != {manifiesto['tamano']} del manifiesto.")
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            if os.path.exists(parcial):
+                os.remove(parcial)
+            raise
+        os.replace(parcial, destino)
+        return destino
+
+    # --- retención ---
+
+    def aplicar_retencion(self, politica=None) -> list:
+        """
+        Borra los manifiestos que la política no conserva y recolecta los
+        bloques huérfanos. Devuelve las rutas de los manifiestos borrados
+        (para quitarlos de backups_log).
+        """
+        politica = politica_retencion() if politica is None else politica
+        todas = self.instantaneas()
+        conservar = self._conservadas(todas, politica)
+        podadas = []
+        for manifiesto in todas:
+            if manifiesto["id"] not in conservar:
+                os.remove(manifiesto["ruta"])
+                podadas.append(manifiesto["ruta"])
+        if podadas:
+            self.recolectar([m for m in todas if m["id"] in conservar])
+        return podadas
+
+    @staticmethod
+    def _conservadas(instantaneas, politica) -> set:
+        """Ids a conservar: la más reciente por período (abuelo-padre-hijo)."""
+        if not instantaneas:
+            return set()
+        conservar = {instantaneas[0]["id"]}
+        periodos = (
+            ("diarios", lambda f: f.date()),
+            ("semanales", lambda f: f.isocalendar()[:2]),
+            ("mensuales", lambda f: (f.year, f.month)),
+        )
+        for clave, periodo in periodos:
+            limite = politica.get(clave, 0)
+            vistos = set()
+            for manifiesto in instantaneas:  # de la más reciente a la más antigua
+                p = periodo(datetime.datetime.fromisoformat(manifiesto["creado"]))
+                if p in vistos:
+                    continue
+                if len(vistos) >= limite:
+                    break
+                vistos.add(p)
+                conservar.add(manifiesto["id"])
+        return conservar
+
+    def recolectar(self, vigentes=None) -> int:
+        """Borra los bloques que ningún manifiesto referencia; devuelve cuántos borró."""
+        vigentes = self.instantaneas() if vigentes is None else vigentes
+        referenciados = {r for m in vigentes for r in m["bloques"]}
+        if not os.path.isdir(self.dir_bloques):
+            return 0
+        limite = time.time() - GRACIA_RECOLECCION_S
+        borrados = 0
+        for sub in os.listdir(self.dir_bloques):
+            carpeta = os.path.join(self.dir_bloques, sub)
+            if not os.path.isdir(carpeta):
+                continue
+            for nombre in os.listdir(carpeta):
+                ruta = os.path.join(carpeta, nombre)
+                if nombre in referenciados or os.path.getmtime(ruta) > limite:
+                    continue
+                os.remove(ruta)
+                borrados += 1
+        return borrados
+
+
+def leer_manifiesto(ruta) -> dict:
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def restaurar_instantanea(ruta_manifiesto, destino) -> str:
+    """Atajo: rearma en 'destino' el manifiesto de un almacén (su carpeta es la del manifiesto/..)."""
+    carpeta = os.path.dirname(os.path.dirname(os.path.abspath(ruta_manifiesto)))
+    manifiesto = leer_manifiesto(ruta_manifiesto)
+    almacen = AlmacenRespaldos(carpeta, manifiesto.get("tamano_bloque", TAMANO_BLOQUE))
+    return almacen.restaurar(manifiesto, destino)
+
+
+def _escribir_atomico(ruta, datos: bytes):
+    parcial = ruta + ".parcial"
+    with open(parcial, "wb") as f:
+        f.write(datos)
+    os.replace(parcial, ruta)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: propagación de ganadores por lote sobre licitaciones hidratadas.
+
+Compara el merge anterior de get_all_data() (barrido de lotes y oferentes por
+cada fila de licitacion_ganadores_lote) contra DatabaseManager._propagar_ganadores
+(índices por (licitacion_id, lote_numero) y (licitacion_id, oferente)).
+
+Uso:
+    python scripts/bench_ganadores_merge.py --procesos 20 --lotes 60 --oferentes 35
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_manager import DatabaseManager  # noqa: E402
+
+
+def construir_datos(procesos: int, lotes: int, oferentes: int):
+    """Licitaciones sintéticas con el mismo shape que produce get_all_data()."""
+    licitaciones = {}
+    ganadores = []
+    for lic_id in range(1, procesos + 1):
+        lic = {
+            "id": lic_id,
+            "empresas_nuestras": [{"nombre": "ZOEC CIVIL"}],
+            "lotes": [],
+            "oferentes_participantes": [],
+        }
+        for n in range(1, lotes + 1):
+            lic["lotes"].append({"numero": str(n), "empresa_nuestra": "ZOEC CIVIL",
+                                 "ganador_nombre": "", "ganado_por_nosotros": False})
+        for o in range(oferentes):
+            lic["oferentes_participantes"].append({
+                "nombre": f"Competidor {o}",
+                "ofertas_por_lote": [
+                    {"lote_numero": str(n), "monto": 1000.0 + o + n, "paso_fase_A": True, "ganador": False}
+                    for n in range(1, lotes + 1)
+                ],
+            })
+        for n in range(1, lotes + 1):
+            nombre = "ZOEC CIVIL" if n % 5 == 0 else f"Competidor {n % oferentes}"
+            ganadores.append((lic_id, str(n), nombre, nombre if n % 5 == 0 else None))
+        licitaciones[lic_id] = lic
+    return licitaciones, ganadores
+
+
+def merge_cuadratico(licitaciones_dict, ganador_rows):
+    """Réplica del merge anterior de get_all_data() (referencia)."""
+    gan_por_lic = {}
+    for lic_id, lote_num, ganador_nombre, empresa_nuestra in ganador_rows:
+        gan_por_lic.setdefault(lic_id, []).append({
+            "lote_numero": lote_num,
+            "ganador_nombre": (ganador_nombre or "").strip(),
+            "empresa_nuestra": (empresa_nuestra or "").strip(),
+        })
+    for lic_id, lic in licitaciones_dict.items():
+        if lic_id not in gan_por_lic:
+            continue
+        nuestras = {e["nombre"] for e in lic["empresas_nuestras"]}
+        for g in gan_por_lic[lic_id]:
+            loteno = str(g.get("lote_numero"))
+            ganador = g["ganador_nombre"]
+            for L in lic["lotes"]:
+                if str(L.get("numero")) != loteno:
+                    continue
+                L["ganador_nombre"] = ganador
+                emp_lote = (L.get("empresa_nuestra") or "").strip()
+                L["ganado_por_nosotros"] = bool(g["empresa_nuestra"]) or bool(emp_lote and ganador == emp_lote) or (ganador in nuestras)
+                break
+        for g in gan_por_lic[lic_id]:
+            loteno = str(g.get("lote_numero"))
+            ganador = g["ganador_nombre"]
+            for comp in lic["oferentes_participantes"]:
+                if (comp.get("nombre") or "").strip() == ganador:
+                    for o in comp.get("ofertas_por_lote", []):
+                        if str(o.get("lote_numero")) == loteno:
+                            o["ganador"] = True
+                else:
+                    for o in comp.get("ofertas_por_lote", []):
+                        o.setdefault("ganador", False)
+
+
+def medir(fn, datos, ganadores, repeticiones):
+    mejores = []
+    resultado = None
+    for _ in range(repeticiones):
+        copia = copy.deepcopy(datos)
+        t0 = time.perf_counter()
+        fn(copia, ganadores)
+        mejores.append(time.perf_counter() - t0)
+        resultado = copia
+    return min(mejores), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del merge de ganadores por lote")
+    parser.add_argument("--procesos", type=int, default=20)
+    parser.add_argument("--lotes", type=int, default=60)
+    parser.add_argument("--oferentes", type=int, default=35)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    datos, ganadores = construir_datos(args.procesos, args.lotes, args.oferentes)
+    print(f"Procesos: {args.procesos} | lotes/proceso: {args.lotes} | oferentes/proceso: {args.oferentes} "
+          f"| filas ganadores: {len(ganadores)}")
+
+    t_viejo, r_viejo = medir(merge_cuadratico, datos, ganadores, args.repeticiones)
+    t_nuevo, r_nuevo = medir(DatabaseManager._propagar_ganadores, datos, ganadores, args.repeticiones)
+
+    if r_viejo != r_nuevo:
+        print("ERROR: los resultados de ambos merges difieren.", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Merge cuadrático : {t_viejo * 1000:9.2f} ms")
+    print(f"Merge indexado   : {t_nuevo * 1000:9.2f} ms")
+    print(f"Aceleración      : {t_viejo / t_nuevo if t_nuevo else float('inf'):9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
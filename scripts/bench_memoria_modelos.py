@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de memoria: modelos con __dict__ + ofertas como dicts (forma anterior)
+contra los modelos con __slots__ y ofertas columnares (TablaOfertas).
+
+Mide con tracemalloc la memoria retenida y la cantidad de bloques asignados
+(objetos pequeños que el GC y el allocator deben gestionar) para un historial
+sintético de licitaciones, más el tiempo de recorrer todas las ofertas y de
+una pasada completa del GC. Los modelos con seguimiento de cambios llaman a
+marcar_limpio() tras crearse, igual que al cargarlos con FabricaModelos, así
+que la foto del seguimiento entra en la medición.
+
+Uso:
+    python scripts/bench_memoria_modelos.py --procesos 300 --lotes 40 --oferentes 12 --documentos 60
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.core.models import Documento, Lote, Oferente  # noqa: E402
+
+
+# --- Forma anterior (referencia): dataclasses con __dict__ y ofertas en dicts ---
+@dataclass
+class LoteDict:
+    id: Optional[int] = None
+    numero: str = ""
+    nombre: str = ""
+    monto_base: float = 0.0
+    monto_base_personal: float = 0.0
+    monto_ofertado: float = 0.0
+    participamos: bool = True
+    fase_A_superada: bool = True
+    ganador_nombre: str = ""
+    ganado_por_nosotros: bool = False
+    empresa_nuestra: Optional[str] = None
+
+
+@dataclass
+class OferenteDict:
+    nombre: str = ""
+    comentario: str = ""
+    ofertas_por_lote: List[Dict[str, Any]] = field(default_factory=list)
+
+
+@dataclass
+class DocumentoDict:
+    id: Optional[int] = None
+    codigo: str = ""
+    nombre: str = ""
+    categoria: str = ""
+    comentario: str = ""
+    presentado: bool = False
+    subsanable: str = "Subsanable"
+    ruta_archivo: str = ""
+    empresa_nombre: Optional[str] = None
+    responsable: str = "Sin Asignar"
+    revisado: bool = False
+    obligatorio: bool = False
+    orden_pliego: Optional[int] = None
+    requiere_subsanacion: bool = False
+
+
+def construir(clases, procesos: int, lotes: int, oferentes: int, documentos: int):
+    cls_lote, cls_oferente, cls_doc = clases
+    historial = []
+    for p in range(procesos):
+        proceso = (
+            [cls_lote(id=p * lotes + n, numero=str(n), nombre=f"Lote {n}", monto_base=1000.0 + n,
+                      monto_ofertado=950.0 + n, empresa_nuestra="ZOEC CIVIL")
+             for n in range(1, lotes + 1)],
+            [cls_oferente(nombre=f"Competidor {o}",
+                          ofertas_por_lote=[{"lote_numero": str(n), "monto": 900.0 + o + n, "paso_fase_A": True,
+                                             "plazo_entrega": 30, "garantia_meses": 12, "ganador": False}
+                                            for n in range(1, lotes + 1)])
+             for o in range(oferentes)],
+            [cls_doc(id=p * documentos + k, codigo=f"DOC-{k}", nombre=f"Documento {k}", presentado=k % 2 == 0)
+             for k in range(documentos)],
+        )
+        # Como FabricaModelos.construir: los modelos con seguimiento quedan con su foto tomada
+        for hijos in proceso:
+            for hijo in hijos:
+                if hasattr(hijo, "marcar_limpio"):
+                    hijo.marcar_limpio()
+        historial.append(proceso)
+    return historial
+
+
+def medir(nombre, clases, args):
+    # El tiempo de creación se mide sin tracemalloc (que encarece cada asignación)
+    gc.collect()
+    t0 = time.perf_counter()
+    historial = construir(clases, args.procesos, args.lotes, args.oferentes, args.documentos)
+    t_construir = time.perf_counter() - t0
+    del historial
+
+    gc.collect()
+    tracemalloc.start()
+    historial = construir(clases, args.procesos, args.lotes, args.oferentes, args.documentos)
+    foto = tracemalloc.take_snapshot()
+    actual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    bloques = sum(s.count for s in foto.statistics("filename"))
+
+    t0 = time.perf_counter()
+    total = sum(o.get("monto", 0) for _, ofs, _ in historial for of in ofs for o in of.ofertas_por_lote)
+    t_recorrer = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    gc.collect()
+    t_gc = time.perf_counter() - t0
+
+    print(f"{nombre:<28}{actual / 1048576:>12.1f}{bloques:>14,}{t_construir * 1000:>14.0f}"
+          f"{t_recorrer * 1000:>14.0f}{t_gc * 1000:>12.1f}")
+    del historial
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de memoria de los modelos")
+    parser.add_argument("--procesos", type=int, default=300)
+    parser.add_argument("--lotes", type=int, default=40)
+    parser.add_argument("--oferentes", type=int, default=12)
+    parser.add_argument("--documentos", type=int, default=60)
+    args = parser.parse_args()
+
+    ofertas = args.procesos * args.lotes * args.oferentes
+    print(f"Procesos: {args.procesos} | lotes: {args.lotes} | oferentes: {args.oferentes} "
+          f"| documentos: {args.documentos} | ofertas: {ofertas:,}\n")
+    print(f"{'Forma':<28}{'MiB':>12}{'bloques':>14}{'crear (ms)':>14}{'sumar (ms)':>14}{'gc (ms)':>12}")
+    a = medir("__dict__ + dicts", (LoteDict, OferenteDict, DocumentoDict), args)
+    b = medir("__slots__ + TablaOfertas", (Lote, Oferente, Documento), args)
+    if a != b:
+        print("ERROR: los totales de ofertas difieren.", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: latencia de guardado/carga de licitaciones según el perfil de conexión.
+
+Crea una BD temporal por perfil (PERFILES_CONEXION de db_manager), guarda N
+licitaciones sintéticas con save_licitacion() y luego mide load_licitacion_full()
+y get_all_data(). Se incluye también la conexión sin ajustar (valores por defecto
+de SQLite) como referencia.
+
+Uso:
+    python scripts/bench_perfiles_conexion.py --procesos 40 --lotes 20 --oferentes 8
+    python scripts/bench_perfiles_conexion.py --dir /ruta/a/carpeta/de/red
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_manager import DatabaseManager, PERFILES_CONEXION  # noqa: E402
+from app.core.models import Documento, Empresa, Licitacion, Lote, Oferente  # noqa: E402
+
+SIN_AJUSTES = "Sin ajustes (por defecto)"
+
+
+def construir_licitacion(i: int, lotes: int, oferentes: int, documentos: int) -> Licitacion:
+    return Licitacion(
+        nombre_proceso=f"Proceso {i}",
+        numero_proceso=f"BENCH-{i:05d}",
+        institucion="Institución de prueba",
+        empresas_nuestras=[Empresa("ZOEC CIVIL")],
+        lotes=[Lote(numero=str(n), nombre=f"Lote {n}", monto_base=1000.0 + n,
+                    monto_ofertado=950.0 + n, empresa_nuestra="ZOEC CIVIL")
+               for n in range(1, lotes + 1)],
+        documentos_solicitados=[Documento(codigo=f"DOC-{k}", nombre=f"Documento {k}", presentado=k % 2 == 0)
+                                for k in range(documentos)],
+        oferentes_participantes=[
+            Oferente(nombre=f"Competidor {o}",
+                     ofertas_por_lote=[{"lote_numero": str(n), "monto": 900.0 + o + n, "paso_fase_A": True}
+                                       for n in range(1, lotes + 1)])
+            for o in range(oferentes)
+        ],
+    )
+
+
+def abrir(path: str, perfil: str) -> DatabaseManager:
+    db = DatabaseManager(path)
+    if perfil == SIN_AJUSTES:
+        # Vuelve a los valores por defecto de SQLite
+        for pragma, valor in (("journal_mode", "DELETE"), ("synchronous", "FULL"),
+                              ("cache_size", -2000), ("mmap_size", 0), ("temp_store", "DEFAULT")):
+            db.conn.execute(f"PRAGMA {pragma} = {valor}")
+    else:
+        db.aplicar_perfil_conexion(perfil)
+    return db
+
+
+def resumen(tiempos):
+    tiempos = sorted(tiempos)
+    p95 = tiempos[max(0, int(round(len(tiempos) * 0.95)) - 1)]
+    return statistics.median(tiempos) * 1000, p95 * 1000
+
+
+def medir_perfil(directorio: str, perfil: str, args) -> dict:
+    path = os.path.join(directorio, f"bench_{abs(hash(perfil))}.db")
+    for suf in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suf):
+            os.remove(path + suf)
+
+    db = abrir(path, perfil)
+    if db._fts_thread:
+        db._fts_thread.join()
+    try:
+        guardados = []
+        ids = []
+        for i in range(args.procesos):
+            lic = construir_licitacion(i, args.lotes, args.oferentes, args.documentos)
+            t0 = time.perf_counter()
+            db.save_licitacion(lic)
+            guardados.append(time.perf_counter() - t0)
+            ids.append(lic.id)
+
+        cargas = []
+        for lic_id in ids:
+            t0 = time.perf_counter()
+            db.load_licitacion_full(lic_id)
+            cargas.append(time.perf_counter() - t0)
+
+        todo = []
+        for _ in range(args.repeticiones):
+            t0 = time.perf_counter()
+            db.get_all_data()
+            todo.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        db.checkpoint()
+        t_checkpoint = time.perf_counter() - t0
+        modo = db.conn.execute("PRAGMA journal_mode").fetchone()[0]
+    finally:
+        db.close()
+
+    return {
+        "modo": modo,
+        "guardar": resumen(guardados),
+        "cargar": resumen(cargas),
+        "todo": min(todo) * 1000,
+        "checkpoint": t_checkpoint * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de perfiles de conexión SQLite")
+    parser.add_argument("--procesos", type=int, default=40)
+    parser.add_argument("--lotes", type=int, default=20)
+    parser.add_argument("--oferentes", type=int, default=8)
+    parser.add_argument("--documentos", type=int, default=15)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--dir", default=None,
+                        help="Carpeta donde crear las BD (p.ej. una unidad de red). Por defecto, un temporal.")
+    args = parser.parse_args()
+
+    directorio = args.dir or tempfile.mkdtemp(prefix="bench_perfiles_")
+    print(f"BD en: {directorio}")
+    print(f"Procesos: {args.procesos} | lotes: {args.lotes} | oferentes: {args.oferentes} "
+          f"| documentos: {args.documentos}\n")
+    print(f"{'Perfil':<28}{'journal':>8}{'guardar p50/p95 (ms)':>24}{'cargar p50/p95 (ms)':>23}"
+          f"{'get_all_data (ms)':>19}{'checkpoint (ms)':>17}")
+    try:
+        for perfil in (SIN_AJUSTES, *PERFILES_CONEXION):
+            r = medir_perfil(directorio, perfil, args)
+            print(f"{perfil:<28}{r['modo']:>8}"
+                  f"{r['guardar'][0]:>14.2f} / {r['guardar'][1]:<7.2f}"
+                  f"{r['cargar'][0]:>13.2f} / {r['cargar'][1]:<7.2f}"
+                  f"{r['todo']:>19.2f}{r['checkpoint']:>17.2f}")
+    finally:
+        if not args.dir:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chequeo de planes de consulta (apto para CI): falla si alguna consulta caliente
+de DatabaseManager recorre una tabla completa en lugar de usar un índice.
+
+Crea una BD temporal con todas las migraciones, ejecuta las operaciones de uso
+frecuente (guardar/cargar una licitación, ganadores por lote, subsanaciones,
+expedientes, registro de cambios, borrado con sus ON DELETE CASCADE...) y
+captura con el trace callback las sentencias reales que emiten. Después corre
+EXPLAIN QUERY PLAN sobre cada una y reporta los "SCAN <tabla>" (incluye los
+recorridos que hacen los CASCADE sobre tablas hijas sin índice).
+
+Las consultas que recorren todo a propósito (carga completa, listados, maestros)
+no se ejecutan aquí; las tablas pequeñas de configuración están en PERMITIDAS.
+
+Uso:
+    python scripts/check_query_plans.py            # sale con código 1 si hay recorridos completos
+    python scripts/check_query_plans.py --verbose  # muestra el plan de cada sentencia
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_manager import DatabaseManager  # noqa: E402
+from app.core.models import Documento, Empresa, Licitacion, Lote, Oferente  # noqa: E402
+from fabrica_modelos import FabricaModelos  # noqa: E402
+
+FABRICA = FabricaModelos(Licitacion, Lote, Documento, Oferente, Empresa)
+
+# Tablas en las que un recorrido completo es aceptable (catálogo / configuración).
+PERMITIDAS = {"sqlite_master", "sqlite_schema", "schema_migrations", "config_app"}
+# Tablas internas de FTS5 (fts_*_config, _data...): sus lecturas las emite SQLite
+# (p. ej. releer _config después de un cambio de esquema).
+PREFIJOS_PERMITIDOS = ("fts_", "tokens_ganadores_")
+
+_SCAN = re.compile(r"^SCAN (?:\w+\.)?(\w+)")
+
+
+def construir_licitacion(numero: str, lotes: int = 5, oferentes: int = 3, documentos: int = 6) -> Licitacion:
+    return Licitacion(
+        nombre_proceso=f"Proceso {numero}",
+        numero_proceso=numero,
+        institucion="Institución de prueba",
+        empresas_nuestras=[Empresa("ZOEC CIVIL")],
+        lotes=[Lote(numero=str(n), nombre=f"Lote {n}", monto_base=1000.0 + n,
+                    monto_ofertado=950.0 + n, empresa_nuestra="ZOEC CIVIL")
+               for n in range(1, lotes + 1)],
+        documentos_solicitados=[Documento(codigo=f"DOC-{k}", nombre=f"Documento {k}", presentado=k % 2 == 0)
+                                for k in range(documentos)],
+        oferentes_participantes=[
+            Oferente(nombre=f"Competidor {o}",
+                     ofertas_por_lote=[{"lote_numero": str(n), "monto": 900.0 + o + n, "paso_fase_A": True}
+                                       for n in range(1, lotes + 1)])
+            for o in range(oferentes)
+        ],
+    )
+
+
+def operaciones_calientes(db: DatabaseManager):
+    """Ejecuta el recorrido típico de la app sobre una licitación."""
+    lic = construir_licitacion("PLAN-00001")
+    db.save_licitacion(lic)
+    db.save_licitacion(construir_licitacion("PLAN-00002"))
+    lic_id = lic.id
+
+    # Modificaciones que pasan por el diff de hijos (update, alta y baja)
+    lic.lotes[0].monto_ofertado += 1
+    lic.oferentes_participantes[0].ofertas_por_lote[0]["monto"] = 1.0
+    del lic.oferentes_participantes[1].ofertas_por_lote[-1]
+    lic.documentos_solicitados[0].presentado = True
+    lic.documentos_solicitados.pop()
+    db.save_licitacion(lic)
+
+    db.load_licitacion_full(lic_id)
+    db.sondear_licitaciones(lic_id)
+    db.get_last_modified(lic_id)
+    db.changes_since(0)
+
+    with db.conn:
+        db.conn.executemany("INSERT INTO licitacion_ganadores_lote VALUES (?, ?, ?, ?)",
+                            [(lic_id, "1", "Competidor 0", None), (lic_id, "2", "ZOEC CIVIL", "ZOEC CIVIL")])
+    db.get_ganadores_por_lote(lic_id)
+    db.ganador_de_competidor_en_licitacion(lic_id, "Competidor 0")
+    db.cantidad_lotes_ganados_por_competidor(lic_id, "Competidor 0")
+
+    doc_ids = [d["id"] for d in db.obtener_documentos_de_licitacion(lic_id)]
+    db.registrar_eventos_subsanacion(lic_id, [(doc_ids[0], "2030-01-01", "prueba")])
+    db.existe_evento_subsanacion_pendiente(lic_id, doc_ids[0])
+    db.obtener_historial_subsanacion(lic_id)
+    db.completar_evento_subsanacion(lic_id, -1, doc_codigo="DOC-0")
+
+    exp_id = db.crear_expediente(lic_id, "Expediente", "ci")
+    db.agregar_items_expediente(exp_id, [(1, doc_ids[0], "Doc 0"), (2, doc_ids[1], "Doc 1")])
+    db.obtener_expediente(exp_id)
+
+    # Baja de un documento y de la licitación completa: recorren los CASCADE
+    lic = db.cargar_licitacion(FABRICA, lic_id)
+    lic.documentos_solicitados.pop(0)
+    db.save_licitacion(lic)
+    db.delete_licitacion("PLAN-00001")
+
+
+def capturar(db: DatabaseManager) -> list:
+    sentencias = []
+
+    def registrar(sql):
+        sql = sql.strip()
+        # Las sentencias internas de los triggers llegan como comentario "-- ..."
+        if re.match(r"(SELECT|INSERT|UPDATE|DELETE|WITH|REPLACE)\b", sql, re.I) and sql not in sentencias:
+            sentencias.append(sql)
+
+    db.conn.set_trace_callback(registrar)
+    try:
+        operaciones_calientes(db)
+    finally:
+        db.conn.set_trace_callback(None)
+    return sentencias
+
+
+def recorridos_completos(db: DatabaseManager, sql: str):
+    """(plan, [tablas recorridas completas]) de una sentencia."""
+    plan = [fila[3] for fila in db.conn.execute("EXPLAIN QUERY PLAN " + sql)]
+    tablas = []
+    for paso in plan:
+        m = _SCAN.match(paso)
+        if (m and "VIRTUAL TABLE" not in paso and m.group(1) not in PERMITIDAS
+                and not m.group(1).startswith(PREFIJOS_PERMITIDOS)):
+            tablas.append(m.group(1))
+    return plan, tablas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chequeo de planes de consulta de las operaciones calientes")
+    parser.add_argument("--verbose", action="store_true", help="muestra el plan de cada sentencia")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, "planes.db"))
+        # La población inicial del FTS corre en segundo plano: esperarla para que
+        # la captura sea siempre la misma
+        while db.reconstruyendo_fts:
+            time.sleep(0.05)
+        try:
+            sentencias = capturar(db)
+            fallas = 0
+            for sql in sentencias:
+                plan, tablas = recorridos_completos(db, sql)
+                if tablas or args.verbose:
+                    print(("RECORRIDO COMPLETO " + ", ".join(tablas) if tablas else "OK") + ": " + " ".join(sql.split())[:150])
+                    for paso in plan:
+                        print(f"    {paso}")
+                fallas += bool(tablas)
+        finally:
+            db.close()
+
+    print(f"\n{len(sentencias)} sentencias revisadas, {fallas} con recorrido completo.")
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,11 @@ from datetime import datetime
 
 MIGRATION_RE = re.compile(r"^(\d{4})_([a-zA-Z0-9_]+)\.(sql|py)$")
 
+# schema_migrations is shared with the app: DatabaseManager records its built-in
+# migrations there with ids from 1000 up (DatabaseManager.ID_MIGRACIONES_INTEGRADAS).
+# Migration files must use ids 0001-0999.
+RESERVED_FROM = 1000
+
 def sha256_bytes(b: bytes) -> str:
     return hashlib.sha256(b).hexdigest()
 
@@ -28,6 +33,24 @@ def ensure_schema_migrations(conn: sqlite3.Connection):
     """)
     conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_schema_migrations_id ON schema_migrations(id)")
 
+def move_legacy_builtin_rows(conn: sqlite3.Connection):
+    """
+    Databases created before the reserved range recorded the app's built-in
+    migrations with ids 1, 2, ... Their checksum is sha256("<id:04d>_<name>")
+    instead of a file hash; move them to RESERVED_FROM + id like the app does
+    on open, so they do not collide with migration files.
+    """
+    rows = conn.execute("SELECT id, name, checksum FROM schema_migrations WHERE id < ?", (RESERVED_FROM,)).fetchall()
+    legacy = [(mig_id, name) for mig_id, name, checksum in rows
+              if checksum == sha256_bytes(f"{mig_id:04d}_{name}".encode("utf-8"))]
+    if not legacy:
+        return
+    with conn:
+        for mig_id, name in legacy:
+            new_id = RESERVED_FROM + mig_id
+            conn.execute("UPDATE schema_migrations SET id=?, checksum=? WHERE id=?",
+                         (new_id, sha256_bytes(f"{new_id:04d}_{name}".encode("utf-8")), mig_id))
+
 def list_migration_files(dir_path: str):
     entries = []
     for fname in os.listdir(dir_path):
@@ -35,6 +58,8 @@ def list_migration_files(dir_path: str):
         if not m:
             continue
         mig_id = int(m.group(1))
+        if mig_id >= RESERVED_FROM:
+            raise RuntimeError(f"{fname}: ids {RESERVED_FROM} and up are reserved for the app's built-in migrations.")
         name = m.group(2)
         kind = m.group(3)
         entries.append((mig_id, name, kind, os.path.join(dir_path, fname), fname))
@@ -111,8 +136,13 @@ def main():
     conn = sqlite3.connect(args.db)
     conn.execute("PRAGMA foreign_keys = ON")
     ensure_schema_migrations(conn)
+    move_legacy_builtin_rows(conn)
 
-    files = list_migration_files(args.migrations)
+    try:
+        files = list_migration_files(args.migrations)
+    except RuntimeError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(2)
     if args.target is not None:
         files = [f for f in files if f[0] <= args.target]
 
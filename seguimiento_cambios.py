@@ -0,0 +1,125 @@
+"""
+Seguimiento de cambios (dirty-tracking) opcional para los modelos de licitación.
+
+Lo usan tanto las clases de glicitaciones.py como los dataclasses de
+app/core/models.py. El seguimiento se activa al llamar marcar_limpio()
+(típicamente justo después de cargar desde la BD o de guardar); mientras no
+esté activo, todo se considera modificado y DatabaseManager.save_licitacion
+guarda el objeto completo como siempre.
+"""
+import copy
+import json
+
+from tabla_ofertas import TablaOfertas
+
+# Valores que se guardan en la foto tal cual (no pueden cambiar in situ)
+_INMUTABLES = (str, int, float, bool, bytes, type(None))
+
+
+def _foto(valor):
+    """
+    Foto barata de un valor seguido: los escalares van tal cual, de TablaOfertas
+    se guarda solo su huella() y los dicts/listas se reducen a su JSON ordenado
+    (junto con el tipo). Solo lo que no se serializa cae a deepcopy.
+    """
+    if isinstance(valor, _INMUTABLES):
+        return valor
+    if isinstance(valor, TablaOfertas):
+        return valor.huella()
+    if isinstance(valor, (dict, list, tuple)):
+        try:
+            return (type(valor), json.dumps(valor, sort_keys=True))
+        except (TypeError, ValueError):
+            pass
+    return copy.deepcopy(valor)
+
+
+def _difiere(valor, foto) -> bool:
+    """Compara un valor actual con su foto (los escalares, sin pasar por _foto)."""
+    if isinstance(valor, _INMUTABLES):
+        return valor != foto
+    return _foto(valor) != foto
+
+
+class SeguimientoCambios:
+    """
+    Mixin: compara el estado actual contra una foto tomada en marcar_limpio().
+
+    - CAMPOS_SEGUIDOS: atributos cuyo valor se compara contra una foto (ver
+      _foto), así que también se detectan cambios in situ en dicts/listas.
+    - LISTAS_HIJAS: listas de objetos hijos; se detectan altas y bajas por
+      identidad y modificaciones a través del seguimiento propio de cada hijo.
+    """
+    __slots__ = ("_foto_campos", "_foto_hijos")  # permite subclases con __slots__
+
+    CAMPOS_SEGUIDOS = ()
+    LISTAS_HIJAS = ()
+
+    def _valor_seguido(self, campo):
+        return getattr(self, campo, None)
+
+    def marcar_limpio(self):
+        """Toma la foto del estado actual (y de los hijos) y activa el seguimiento."""
+        # Tupla alineada con CAMPOS_SEGUIDOS (un dict por objeto pesaría más que la foto misma)
+        self._foto_campos = tuple(_foto(self._valor_seguido(c)) for c in self.CAMPOS_SEGUIDOS)
+        self._foto_hijos = {n: list(getattr(self, n, None) or []) for n in self.LISTAS_HIJAS}
+        for hijos in self._foto_hijos.values():
+            for hijo in hijos:
+                if isinstance(hijo, SeguimientoCambios):
+                    hijo.marcar_limpio()
+
+    @property
+    def seguimiento_activo(self) -> bool:
+        return getattr(self, "_foto_campos", None) is not None
+
+    def campos_sucios(self) -> set:
+        """Campos de CAMPOS_SEGUIDOS que cambiaron (todos si no hay seguimiento)."""
+        if not self.seguimiento_activo:
+            return set(self.CAMPOS_SEGUIDOS)
+        return {c for c, f in zip(self.CAMPOS_SEGUIDOS, self._foto_campos) if _difiere(self._valor_seguido(c), f)}
+
+    def hijos_agregados(self, lista: str) -> list:
+        actuales = getattr(self, lista, None) or []
+        if not self.seguimiento_activo:
+            return list(actuales)
+        previos = {id(h) for h in self._foto_hijos.get(lista, [])}
+        return [h for h in actuales if id(h) not in previos]
+
+    def hijos_eliminados(self, lista: str) -> list:
+        if not self.seguimiento_activo:
+            return []
+        actuales = {id(h) for h in getattr(self, lista, None) or []}
+        return [h for h in self._foto_hijos.get(lista, []) if id(h) not in actuales]
+
+    def hijos_modificados(self, lista: str) -> list:
+        """Hijos que ya estaban en la foto y tienen cambios propios."""
+        actuales = getattr(self, lista, None) or []
+        if not self.seguimiento_activo:
+            return list(actuales)
+        previos = {id(h) for h in self._foto_hijos.get(lista, [])}
+        return [h for h in actuales
+                if id(h) in previos and (not isinstance(h, SeguimientoCambios) or h.esta_sucio())]
+
+    def lista_sucia(self, lista: str) -> bool:
+        if not self.seguimiento_activo:
+            return True
+        return bool(self.hijos_agregados(lista) or self.hijos_eliminados(lista)
+                    or self.hijos_modificados(lista))
+
+    def esta_sucio(self) -> bool:
+        """Como campos_sucios()/lista_sucia() pero corta en el primer cambio (lo usa MapaIdentidad)."""
+        if not self.seguimiento_activo:
+            return True
+        if any(_difiere(self._valor_seguido(c), f) for c, f in zip(self.CAMPOS_SEGUIDOS, self._foto_campos)):
+            return True
+        for lista in self.LISTAS_HIJAS:
+            actuales = getattr(self, lista, None) or []
+            previos = self._foto_hijos.get(lista, [])
+            if len(actuales) != len(previos):
+                return True
+            if any(a is not b for a, b in zip(actuales, previos)) and \
+                    {id(h) for h in actuales} != {id(h) for h in previos}:
+                return True
+            if any(isinstance(h, SeguimientoCambios) and h.esta_sucio() for h in actuales):
+                return True
+        return False
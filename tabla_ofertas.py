@@ -0,0 +1,264 @@
+"""
+Representación columnar de las ofertas por lote de un oferente.
+
+Antes cada oferta era un dict propio ({'lote_numero', 'monto', 'paso_fase_A',
+'plazo_entrega', 'garantia_meses', 'ganador'}); con todo el historial cargado
+esos dicts pequeños dominaban la memoria y el trabajo del GC. TablaOfertas
+guarda las mismas ofertas en arreglos paralelos y expone cada fila como una
+vista OfertaLote que se comporta como el dict de siempre (o['monto'],
+o.get('paso_fase_A', True), o.update(...), dict(o), ...), así que el código
+existente no cambia.
+"""
+import sys
+from array import array
+from collections.abc import MutableMapping, MutableSequence
+
+# Claves con columna propia, en el orden de las columnas de TablaOfertas.
+CLAVES = ("lote_numero", "monto", "paso_fase_A", "plazo_entrega", "garantia_meses", "ganador")
+_INDICE_CLAVE = {c: i for i, c in enumerate(CLAVES)}
+_LOTE, _MONTO, _PASO_A, _PLAZO, _GARANTIA, _GANADOR = range(len(CLAVES))
+_BOOLEANAS = (_PASO_A, _GANADOR)
+
+
+def _es_entero(v):
+    return type(v) is int and -2**31 <= v < 2**31
+
+
+# Qué valores caben en cada columna (el resto va a los extras de la fila)
+_CABE = (
+    lambda v: type(v) is str,
+    lambda v: type(v) is float,
+    lambda v: type(v) is bool,
+    _es_entero,
+    _es_entero,
+    lambda v: type(v) is bool,
+)
+_VACIO = (None, 0.0, 0, 0, 0, 0)
+# Claves presentes en las ofertas que arma la carga desde la BD
+_BITS_CARGA = (1 << _LOTE) | (1 << _MONTO) | (1 << _PASO_A) | (1 << _GANADOR)
+
+
+class OfertaLote(MutableMapping):
+    """Vista de una fila de TablaOfertas con interfaz de dict (escribe en la tabla)."""
+    __slots__ = ("_tabla", "_i")
+
+    def __init__(self, tabla, i):
+        self._tabla = tabla
+        self._i = i
+
+    def __getitem__(self, clave):
+        return self._tabla._leer(self._i, clave)
+
+    def __setitem__(self, clave, valor):
+        self._tabla._escribir(self._i, clave, valor)
+
+    def __delitem__(self, clave):
+        self._tabla._borrar_clave(self._i, clave)
+
+    def __iter__(self):
+        return iter(self._tabla._claves(self._i))
+
+    def __len__(self):
+        return len(self._tabla._claves(self._i))
+
+    def get(self, clave, default=None):
+        try:
+            return self._tabla._leer(self._i, clave)
+        except KeyError:
+            return default
+
+    def copy(self):
+        return dict(self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class TablaOfertas(MutableSequence):
+    """
+    Ofertas de un oferente en columnas paralelas:
+      lote_numero -> list (cadenas internadas, compartidas entre oferentes)
+      monto -> array('d'); plazo/garantía -> array('i')
+      paso_fase_A/ganador -> bytearray (0/1)
+    Qué claves tiene cada fila se guarda como bits en otro bytearray; valores
+    que no encajan en su columna (None, textos, claves nuevas) van a un dict
+    por fila. Las vistas OfertaLote apuntan a una posición: tras borrar o
+    insertar filas hay que volver a pedirlas a la tabla.
+    """
+    __slots__ = ("_cols", "_presentes", "_extras")
+
+    def __init__(self, ofertas=()):
+        self._cols = ([], array("d"), bytearray(), array("i"), array("i"), bytearray())
+        self._presentes = bytearray()
+        self._extras = []
+        for oferta in ofertas:
+            self.append(oferta)
+
+    # ----- secuencia -----
+    def __len__(self):
+        return len(self._presentes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [OfertaLote(self, j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("índice de oferta fuera de rango")
+        return OfertaLote(self, i)
+
+    def __iter__(self):
+        for i in range(len(self._presentes)):
+            yield OfertaLote(self, i)
+
+    def __setitem__(self, i, oferta):
+        if isinstance(i, slice):
+            raise TypeError("TablaOfertas no admite asignación por rebanadas")
+        del self[i]
+        self.insert(i if i >= 0 else i + len(self) + 1, oferta)
+
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            for j in sorted(range(*i.indices(len(self))), reverse=True):
+                del self[j]
+            return
+        if i < 0:
+            i += len(self)
+        for col in self._cols:
+            del col[i]
+        del self._presentes[i]
+        del self._extras[i]
+
+    def insert(self, i, oferta):
+        n = len(self)
+        if i < 0:
+            i = max(0, i + n)
+        i = min(i, n)
+        for col, vacio in zip(self._cols, _VACIO):
+            col.insert(i, vacio)
+        self._presentes.insert(i, 0)
+        self._extras.insert(i, None)
+        for clave, valor in (oferta.items() if hasattr(oferta, "items") else dict(oferta).items()):
+            self._escribir(i, clave, valor)
+
+    def append(self, oferta):
+        """Agrega al final armando la fila de una vez (sin desplazar columnas ni pasar por _escribir)."""
+        valores = list(_VACIO)
+        bits = 0
+        extras = None
+        for clave, valor in (oferta.items() if hasattr(oferta, "items") else dict(oferta).items()):
+            k = _INDICE_CLAVE.get(clave)
+            if k is not None and _CABE[k](valor):
+                valores[k] = sys.intern(valor) if k == _LOTE else valor
+                bits |= 1 << k
+            else:
+                if extras is None:
+                    extras = {}
+                extras[clave] = valor
+        for col, valor in zip(self._cols, valores):
+            col.append(valor)
+        self._presentes.append(bits)
+        self._extras.append(extras)
+
+    def agregar(self, lote_numero, monto, paso_fase_A, ganador):
+        """Agrega una oferta ya tipada directo a las columnas (carga desde la BD)."""
+        if type(lote_numero) is not str or type(monto) is not float:
+            self.append({"lote_numero": lote_numero, "monto": monto,
+                         "paso_fase_A": paso_fase_A, "ganador": ganador})
+            return
+        lote, montos, paso, plazos, garantias, ganadores = self._cols
+        lote.append(sys.intern(lote_numero))
+        montos.append(monto)
+        paso.append(1 if paso_fase_A else 0)
+        plazos.append(0)
+        garantias.append(0)
+        ganadores.append(1 if ganador else 0)
+        self._presentes.append(_BITS_CARGA)
+        self._extras.append(None)
+
+    def __eq__(self, otra):
+        if isinstance(otra, TablaOfertas):
+            return self._cols == otra._cols and self._presentes == otra._presentes and self._extras == otra._extras
+        if isinstance(otra, list):
+            return len(otra) == len(self) and all(dict(a) == b for a, b in zip(self, otra))
+        return NotImplemented
+
+    def __copy__(self):
+        nueva = TablaOfertas()
+        nueva._cols = tuple(type(col)(col) if not isinstance(col, array) else array(col.typecode, col)
+                            for col in self._cols)
+        nueva._presentes = bytearray(self._presentes)
+        # Casi ninguna fila tiene extras: solo se recorren si hay alguno
+        nueva._extras = ([dict(e) if e else None for e in self._extras] if any(self._extras)
+                         else list(self._extras))
+        return nueva
+
+    def __deepcopy__(self, memo):
+        return self.__copy__()
+
+    def huella(self) -> int:
+        """Resumen del contenido para el seguimiento de cambios (evita guardar una copia de la tabla)."""
+        lotes, montos, paso, plazos, garantias, ganadores = self._cols
+        return hash((tuple(lotes), montos.tobytes(), bytes(paso), plazos.tobytes(), garantias.tobytes(),
+                     bytes(ganadores), bytes(self._presentes),
+                     repr(self._extras) if any(self._extras) else None))
+
+    def como_lista(self):
+        """Lista de dicts independientes (para JSON o para copiar)."""
+        return [dict(o) for o in self]
+
+    def __repr__(self):
+        return repr(self.como_lista())
+
+    # ----- acceso por celda (lo usa OfertaLote) -----
+    def _leer(self, i, clave):
+        extras = self._extras[i]
+        if extras is not None and clave in extras:
+            return extras[clave]
+        k = _INDICE_CLAVE.get(clave)
+        if k is None or not (self._presentes[i] >> k) & 1:
+            raise KeyError(clave)
+        valor = self._cols[k][i]
+        return valor == 1 if k in _BOOLEANAS else valor
+
+    def _escribir(self, i, clave, valor):
+        k = _INDICE_CLAVE.get(clave)
+        extras = self._extras[i]
+        if k is None or not _CABE[k](valor):
+            # No encaja en la columna: se guarda tal cual en los extras de la fila
+            if extras is None:
+                extras = self._extras[i] = {}
+            extras[clave] = valor
+            if k is not None:
+                self._vaciar_celda(i, k)
+            return
+        if extras is not None and clave in extras:
+            del extras[clave]
+            if not extras:
+                self._extras[i] = None
+        self._presentes[i] |= 1 << k
+        self._cols[k][i] = sys.intern(valor) if k == _LOTE else valor
+
+    def _borrar_clave(self, i, clave):
+        extras = self._extras[i]
+        if extras is not None and clave in extras:
+            del extras[clave]
+            if not extras:
+                self._extras[i] = None
+            return
+        k = _INDICE_CLAVE.get(clave)
+        if k is None or not (self._presentes[i] >> k) & 1:
+            raise KeyError(clave)
+        self._vaciar_celda(i, k)
+
+    def _vaciar_celda(self, i, k):
+        """Marca la clave como ausente y deja el valor neutro (así __eq__ compara columnas tal cual)."""
+        self._presentes[i] &= ~(1 << k) & 0xFF
+        self._cols[k][i] = _VACIO[k]
+
+    def _claves(self, i):
+        presentes = self._presentes[i]
+        claves = [c for k, c in enumerate(CLAVES) if (presentes >> k) & 1]
+        if self._extras[i]:
+            claves.extend(self._extras[i])
+        return claves